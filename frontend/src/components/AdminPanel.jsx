@@ -20,18 +20,29 @@ const formatDateTime = (isoString) => {
 
 export default function AdminPanel() {
   const [rows, setRows] = useState([]);
+  const [next, setNext] = useState(null);
   const [loading, setLoading] = useState(false);
   const [busca, setBusca] = useState("");
+  const [filtro, setFiltro] = useState("");
 
-  // Carga lista
-  const load = async () => {
+  // La búsqueda la hace el backend (?q= en nombre, alumno y folio), no la tabla
+  const listaUrl = (q) => {
+    const texto = (q || "").trim();
+    return `${API_BASE}/participants/` + (texto ? `?q=${encodeURIComponent(texto)}` : "");
+  };
+
+  // Carga lista (paginada por cursor; "Cargar más" sigue el enlace next, que ya trae q).
+  // El backend manda ETag, así que el navegador revalida y recibe 304 si no hubo cambios.
+  const load = async (url = listaUrl(filtro), append = false) => {
     setLoading(true);
     try {
-      const res = await axios.get(`${API_BASE}/participants/`, {
+      const res = await axios.get(url, {
         validateStatus: () => true,
       });
       if (res.status === 200) {
-        setRows(res.data || []);
+        const page = res.data?.results || [];
+        setRows((prev) => (append ? [...prev, ...page] : page));
+        setNext(res.data?.next || null);
       } else {
         alert("Error listando participantes");
       }
@@ -112,12 +123,24 @@ const onDownloadCSV = async () => {
 
 
       <div style={{ display: "flex", gap: 8, marginBottom: 12 }}>
-        <button onClick={load} disabled={loading}>
+        <button onClick={() => load()} disabled={loading}>
           {loading ? "Cargando..." : "Actualizar lista"}
         </button>
 
         <button onClick={onDownloadCSV}>Descargar CSV</button>
 
+        <input
+          placeholder="Buscar nombre, alumno o folio"
+          value={filtro}
+          onChange={(e) => setFiltro(e.target.value)}
+          onKeyDown={(e) => e.key === "Enter" && load()}
+          style={{ flex: 1, padding: "8px 10px" }}
+        />
+        <button onClick={() => load()} disabled={loading}>Buscar</button>
+      </div>
+
+      <div style={{ display: "flex", gap: 8, marginBottom: 12 }}>
+
         <input
           placeholder="Folio (p.ej. Primaria0007) o ID"
           value={busca}
@@ -166,6 +189,12 @@ const onDownloadCSV = async () => {
         </table>
       </div>
 
+      {next && (
+        <button onClick={() => load(next, true)} disabled={loading} style={{ marginTop: 8 }}>
+          {loading ? "Cargando..." : "Cargar más"}
+        </button>
+      )}
+
       <p style={{ marginTop: 12, color: "#666" }}>
         Tip: escribe un <b>ID</b> (número) o un <b>Folio</b> (p.ej. <i>Primaria0007</i>) y pulsa “Reimprimir PDF”.
       </p>
@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useRef, useState } from "react";
 import axios from "axios";
 import "../form.css";
 
@@ -6,6 +6,27 @@ const API_BASE = "https://maraton-lma-backend.onrender.com/api";
 
 
 
+// Revisa el estado del gafete hasta que esté listo y lo descarga
+async function descargarCuandoEsteListo(job) {
+  for (let intento = 0; intento < 60; intento++) {
+    const res = await axios.get(job.status_url, { validateStatus: () => true });
+    if (res.data?.status === "LISTO") {
+      const a = document.createElement("a");
+      a.href = job.pdf_url;
+      a.download = `${job.clave || "credencial"}.pdf`;
+      document.body.appendChild(a);
+      a.click();
+      a.remove();
+      return;
+    }
+    if (res.data?.status === "ERROR") {
+      throw new Error(res.data.error || "No se pudo generar el gafete");
+    }
+    await new Promise((r) => setTimeout(r, 1500));
+  }
+  throw new Error("El gafete tardó demasiado en generarse");
+}
+
 function RegistroForm() {
   const [formData, setFormData] = useState({
     full_name: "",
@@ -16,6 +37,9 @@ function RegistroForm() {
   });
 
   const [statusMsg, setStatusMsg] = useState("");
+  // Misma llave mientras no cambien los datos: si se vuelve a presionar
+  // "Registrar", el backend devuelve el mismo folio en lugar de crear otro
+  const intento = useRef({ payload: null, key: null });
 
   const handleChange = (e) => {
     setFormData({
@@ -36,11 +60,20 @@ function RegistroForm() {
       role: ((formData.role || "").toUpperCase()).trim(),
     };
   
+    const payloadJson = JSON.stringify(payload);
+    if (intento.current.payload !== payloadJson) {
+      intento.current = {
+        payload: payloadJson,
+        key: window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random()}`,
+      };
+    }
+
     try {
       const response = await axios.post(
         `${API_BASE}/register/`,
         payload,
         {
+          headers: { "Idempotency-Key": intento.current.key },
           responseType: "arraybuffer",
           validateStatus: () => true,
           timeout: 90000,
@@ -49,6 +82,15 @@ function RegistroForm() {
       
   
       const ct = response.headers["content-type"] || "";
+
+      // ⏳ Modo asíncrono: el backend devuelve el folio y el PDF se genera aparte
+      if (response.status === 202) {
+        const job = JSON.parse(new TextDecoder().decode(response.data));
+        setStatusMsg(`Registro recibido (folio ${job.clave}). Generando gafete...`);
+        await descargarCuandoEsteListo(job);
+        setStatusMsg(`Listo ✅ Se descargó tu gafete (folio ${job.clave}).`);
+        return;
+      }
   
       // ✅ Si el backend devolvió un PDF correcto
       if (
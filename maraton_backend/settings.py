@@ -4,6 +4,7 @@ import os
 from datetime import timedelta
 from django.utils.log import DEFAULT_LOGGING
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 # -------------------------
 # BASE
@@ -38,9 +39,12 @@ INSTALLED_APPS = [
     "registro",  # ← tu app
 ]
 MIDDLEWARE = [
+    "registro.middleware.MetricasMiddleware",  # primero: mide el request completo
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "registro.middleware.EstaticosMiddleware",  # WhiteNoise compatible con vistas async
     "corsheaders.middleware.CorsMiddleware",
+    "registro.middleware.AdmisionMiddleware",  # después de CORS: el 503/429 lleva sus headers
+    "registro.middleware.ReplicaMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -74,6 +78,12 @@ WSGI_APPLICATION = "maraton_backend.wsgi.application"
 DEFAULT_SQLITE = {
     "ENGINE": "django.db.backends.sqlite3",
     "NAME": BASE_DIR / "db.sqlite3",
+    # BEGIN IMMEDIATE: el contador de folios toma el candado de escritura
+    # al iniciar la transacción y los demás esperan (hasta `timeout` s)
+    "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 20},
+    # Las pruebas de concurrencia necesitan candados de archivo reales
+    # (la base en memoria compartida falla con "table is locked")
+    "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
 }
 
 DATABASE_URL = os.environ.get("DATABASE_URL", "").strip()
@@ -89,6 +99,30 @@ if DATABASE_URL:
 else:
     DATABASES = {"default": DEFAULT_SQLITE}
 
+# Réplica de lectura opcional (registro/replica.py): listado, CSV y
+# estadísticas leen de ahí; escrituras y folios siempre van a "default"
+REPLICA_DATABASE_URL = os.environ.get("REPLICA_DATABASE_URL", "").strip()
+if REPLICA_DATABASE_URL:
+    DATABASES["replica"] = dj_database_url.parse(
+        REPLICA_DATABASE_URL,
+        conn_max_age=600,
+        ssl_require=REPLICA_DATABASE_URL.startswith("postgres"),
+    )
+    if DATABASES["replica"]["ENGINE"].endswith("sqlite3"):
+        DATABASES["replica"]["TEST"] = {"NAME": BASE_DIR / "test_replica.sqlite3"}
+
+DATABASE_ROUTERS = ["registro.replica.RouterReplica"]
+# export_csv no: se lee mientras se transmite (replica.SOLO_PRIMARIA_RUTAS)
+MARATON_REPLICA_RUTAS = {
+    r.strip() for r in os.environ.get(
+        "MARATON_REPLICA_RUTAS", "participants_list,participants_stats"
+    ).split(",") if r.strip()
+}
+# Tras escribir, el cliente lee de la primaria estos segundos (atraso de la réplica)
+MARATON_REPLICA_FIJAR_S = int(os.environ.get("MARATON_REPLICA_FIJAR_S", "5"))
+# Cada cuánto se vuelve a probar la réplica (y cuánto se ignora si falló)
+MARATON_REPLICA_REVISAR_S = int(os.environ.get("MARATON_REPLICA_REVISAR_S", "10"))
+
 # -------------------------
 # AUTENTICACIÓN / PASSWORDS
 # -------------------------
@@ -122,13 +156,135 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 os.makedirs(MEDIA_ROOT, exist_ok=True)
+
+# "gafetes": donde se guardan los PDFs (pdf_storage.py). En disco local por
+# defecto (MEDIA_ROOT); con MARATON_PDF_STORAGE=s3 en un bucket S3 o
+# compatible (MinIO, R2...) vía django-storages.
+if os.environ.get("MARATON_PDF_STORAGE", "local") == "s3":
+    GAFETES_STORAGE = {
+        "BACKEND": "storages.backends.s3.S3Storage",
+        "OPTIONS": {
+            "bucket_name": os.environ.get("MARATON_PDF_S3_BUCKET", "maraton-gafetes"),
+            "endpoint_url": os.environ.get("MARATON_PDF_S3_ENDPOINT") or None,
+            "region_name": os.environ.get("MARATON_PDF_S3_REGION") or None,
+            "location": "gafetes",
+            "file_overwrite": True,  # mismo nombre = misma huella = mismo PDF
+            "querystring_expire": 300,
+        },
+    }
+else:
+    GAFETES_STORAGE = {"BACKEND": "registro.pdf_storage.AlmacenLocal"}
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    "gafetes": GAFETES_STORAGE,
+}
+# -------------------------
+# GAFETES (PDF)
+# -------------------------
+# MARATON_PDF_ASYNC=1: el registro responde con el folio y el PDF se genera
+# en segundo plano (pool local de MARATON_PDF_WORKERS hilos; con 0 solo lo
+# procesa `manage.py procesar_gafetes`). Por defecto se responde el PDF.
+MARATON_PDF_ASYNC = os.environ.get("MARATON_PDF_ASYNC", "0") == "1"
+MARATON_PDF_WORKERS = int(os.environ.get("MARATON_PDF_WORKERS", "2"))
+# Un trabajo en PROCESANDO por más de estos segundos se da por perdido (el
+# proceso murió a medias) y procesar_gafetes lo regresa a la cola
+MARATON_PDF_JOB_TIMEOUT_S = int(os.environ.get("MARATON_PDF_JOB_TIMEOUT_S", "300"))
+# Registro síncrono: el PDF se dibuja en memoria y se responde sin pasar por
+# disco; con MARATON_PDF_PERSISTIR=1 se sube a la caché tras la respuesta
+MARATON_PDF_EN_MEMORIA = os.environ.get("MARATON_PDF_EN_MEMORIA", "1") == "1"
+MARATON_PDF_PERSISTIR = os.environ.get("MARATON_PDF_PERSISTIR", "1") == "1"
+# Vistas async (servidor ASGI): /api/register/ y /api/participants/reprint/
+# usan las versiones async; las rutas /api/async/... existen siempre.
+# El gafete se dibuja en un pool acotado (pdf_pool.py): "thread" o "process"
+MARATON_VISTAS_ASYNC = os.environ.get("MARATON_VISTAS_ASYNC", "0") == "1"
+MARATON_PDF_POOL = os.environ.get("MARATON_PDF_POOL", "thread")
+MARATON_PDF_POOL_WORKERS = int(os.environ.get("MARATON_PDF_POOL_WORKERS", str(os.cpu_count() or 2)))
+# Resolución a la que se reducen logo/zorro/marca de agua (pdf_assets.py)
+MARATON_PDF_IMAGE_DPI = int(os.environ.get("MARATON_PDF_IMAGE_DPI", "150"))
+# Streams de los PDFs en ASCII85 (texto) además de zlib. Apagado: la
+# codificación de ReportLab es Python puro y se llevaba más de la mitad del
+# tiempo de cada gafete (registro/apps.py lo aplica a rl_config)
+MARATON_PDF_ASCII85 = os.environ.get("MARATON_PDF_ASCII85", "0") == "1"
+# Diseño del gafete (parte fija, posiciones y fuentes) en un archivo de datos
+MARATON_GAFETE_PLANTILLA = os.environ.get(
+    "MARATON_GAFETE_PLANTILLA", str(BASE_DIR / "registro" / "plantillas" / "gafete.json")
+)
+# QR con el folio en cada gafete; con MARATON_QR_FIRMADO=1 lleva firma
+# (django.core.signing) y el check-in rechaza los QRs alterados y los
+# folios sin firma (tecleados o de QRs hechos a mano)
+MARATON_BADGE_QR = os.environ.get("MARATON_BADGE_QR", "1") == "1"
+MARATON_QR_FIRMADO = os.environ.get("MARATON_QR_FIRMADO", "0") == "1"
+# Entrega de PDFs: "django" (el worker transmite el archivo), "redirect"
+# (302 a la URL del storage), "x-accel" (nginx) o "x-sendfile" (Apache)
+MARATON_PDF_ENTREGA = os.environ.get("MARATON_PDF_ENTREGA", "django")
+# Con x-accel: location interna de nginx que apunta a MEDIA_ROOT
+MARATON_PDF_XACCEL_PREFIX = os.environ.get("MARATON_PDF_XACCEL_PREFIX", "/protected-media/")
+# Caché de reimpresiones en credenciales/cache del storage (pdf_cache.py)
+MARATON_PDF_CACHE_MAX_MB = float(os.environ.get("MARATON_PDF_CACHE_MAX_MB", "500"))
+MARATON_PDF_CACHE_MAX_DIAS = float(os.environ.get("MARATON_PDF_CACHE_MAX_DIAS", "30"))
+
+# Check-in del evento: folios recientes en memoria por proceso (checkin.py)
+MARATON_CHECKIN_LRU_SIZE = int(os.environ.get("MARATON_CHECKIN_LRU_SIZE", "5000"))
+
+# -------------------------
+# MÉTRICAS (/metrics, registro/middleware.py)
+# -------------------------
+MARATON_METRICAS = os.environ.get("MARATON_METRICAS", "1") == "1"
+# Si se define, /metrics exige "Authorization: Bearer <token>"
+MARATON_METRICAS_TOKEN = os.environ.get("MARATON_METRICAS_TOKEN", "")
+# > 0: registra en el log "registro.lentos" (con su SQL) los requests más lentos
+MARATON_SLOW_REQUEST_MS = int(os.environ.get("MARATON_SLOW_REQUEST_MS", "0"))
+
+# -------------------------
+# ADMISIÓN (registro/admision.py)
+# -------------------------
+# En las rutas que dibujan gafetes y en la cola asíncrona: como máximo
+# MARATON_ADMISION_RENDERS a la vez, cola de MARATON_ADMISION_COLA lugares con espera máxima de
+# MARATON_ADMISION_ESPERA_MS; si no alcanza, 503 con Retry-After
+MARATON_ADMISION = os.environ.get("MARATON_ADMISION", "1") == "1"
+MARATON_ADMISION_RUTAS = {
+    r.strip() for r in os.environ.get(
+        "MARATON_ADMISION_RUTAS", "register,register_async,reprint_pdf,reprint_pdf_async,batch_badges"
+    ).split(",") if r.strip()
+}
+MARATON_ADMISION_RENDERS = int(os.environ.get("MARATON_ADMISION_RENDERS", "4"))
+MARATON_ADMISION_COLA = int(os.environ.get("MARATON_ADMISION_COLA", "16"))
+MARATON_ADMISION_ESPERA_MS = int(os.environ.get("MARATON_ADMISION_ESPERA_MS", "2000"))
+MARATON_ADMISION_RETRY_AFTER = int(os.environ.get("MARATON_ADMISION_RETRY_AFTER", "2"))
+# Token bucket por IP (429). 0 = sin límite: varias familias pueden salir
+# por la misma IP (la red de la escuela)
+MARATON_ADMISION_TASA = float(os.environ.get("MARATON_ADMISION_TASA", "0"))
+MARATON_ADMISION_RAFAGA = int(os.environ.get("MARATON_ADMISION_RAFAGA", "10"))
+# Proxies propios delante de la app (1 en Render, ver Procfile): la IP del
+# cliente sale de X-Forwarded-For solo si hay proxies; con 0, REMOTE_ADDR
+MARATON_PROXIES_CONFIABLES = int(os.environ.get("MARATON_PROXIES_CONFIABLES", "0"))
+# BackendLocal: límites por proceso. BackendCache: compartidos entre
+# workers en el cache MARATON_ADMISION_CACHE (configurar CACHES con Redis)
+MARATON_ADMISION_BACKEND = os.environ.get("MARATON_ADMISION_BACKEND", "registro.admision.BackendLocal")
+MARATON_ADMISION_CACHE = os.environ.get("MARATON_ADMISION_CACHE", "default")
+
+# -------------------------
+# ESTADÍSTICAS EN VIVO (registro/difusion.py, SSE)
+# -------------------------
+MARATON_SSE_MAX_CLIENTES = int(os.environ.get("MARATON_SSE_MAX_CLIENTES", "500"))
+# Comentario de latido sin novedades (proxies cierran conexiones calladas)
+MARATON_SSE_LATIDO_S = float(os.environ.get("MARATON_SSE_LATIDO_S", "15"))
+# Estadísticas completas otra vez (una lectura por worker, no por tablero)
+MARATON_SSE_RESYNC_S = int(os.environ.get("MARATON_SSE_RESYNC_S", "60"))
+# Espera tras un cambio para juntar una ráfaga en un solo evento
+MARATON_SSE_AGRUPAR_MS = int(os.environ.get("MARATON_SSE_AGRUPAR_MS", "250"))
+
 # -------------------------
 # DRF
 # -------------------------
 REST_FRAMEWORK = {
+    # La API navegable solo en desarrollo: en producción cada GET desde un
+    # navegador renderizaría la plantilla HTML completa
     "DEFAULT_RENDERER_CLASSES": [
         "rest_framework.renderers.JSONRenderer",
-        "rest_framework.renderers.BrowsableAPIRenderer",
+        *(["rest_framework.renderers.BrowsableAPIRenderer"] if DEBUG else []),
     ],
     "DEFAULT_PARSER_CLASSES": [
         "rest_framework.parsers.JSONParser",
@@ -145,6 +301,9 @@ CORS_ALLOWED_ORIGINS = [
     "https://maraton.orgullosamenteliceo.com.mx",
     "https://maraton-lma-frontend.onrender.com",  # si tienes un front en Render
 ]
+# Idempotency-Key lo manda RegistroForm.jsx; los otros los lee el frontend
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+CORS_EXPOSE_HEADERS = ["Content-Disposition", "Idempotent-Replay", "X-Posible-Duplicado", "Retry-After"]
 CSRF_TRUSTED_ORIGINS = [
     "https://maraton.orgullosamenteliceo.com.mx",
     "https://maraton-lma-backend.onrender.com",
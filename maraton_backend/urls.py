@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from registro.views import MetricsView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("registro.urls")),  # <--- aquí conectamos tu app
+    path("metrics", MetricsView.as_view(), name="metrics"),
 ]
@@ -0,0 +1,280 @@
+# registro/admision.py
+"""
+Control de admisión para las rutas que dibujan gafetes (register, reprint, lote).
+
+Cuando abre el registro llegan todos a la vez. En lugar de aceptar todo y
+dejar que los requests se venzan por timeout:
+
+1. Token bucket por cliente (MARATON_ADMISION_TASA tokens/s con ráfaga de
+   MARATON_ADMISION_RAFAGA). Sin token → 429 con Retry-After.
+2. Máximo MARATON_ADMISION_RENDERS renders a la vez. Cada request de
+   MARATON_ADMISION_RUTAS ocupa un lugar aunque su PDF salga de la caché
+   (el lote, batch_badges, ocupa uno solo). Si no hay lugar se espera en
+   una cola corta (MARATON_ADMISION_COLA lugares, hasta
+   MARATON_ADMISION_ESPERA_MS). Con la cola llena o la espera vencida
+   → 503 inmediato con Retry-After. Los gafetes de la cola asíncrona
+   (jobs.procesar_job) también ocupan lugar, pero esperan sin límite en
+   lugar de rechazarse. regenerar_gafetes no cuenta: es un comando fuera
+   de horario con sus propios procesos.
+
+El estado vive en un backend (MARATON_ADMISION_BACKEND). BackendLocal, el
+default, lo guarda en memoria del proceso: el límite es por worker.
+BackendCache lo comparte entre procesos en un cache de Django
+(MARATON_ADMISION_CACHE: Redis/Memcached en producción, LocMemCache en
+pruebas). Ahí las operaciones son incr/decr y get/set, así que el token
+bucket puede dejar pasar alguno de más con clientes muy concurrentes. El
+contador de lugares ocupados expira (TTL_EN_CURSO) para que un worker
+que muere sin liberar no lo deje inflado para siempre.
+
+La cola de espera siempre es del proceso: cada worker limita sus propios
+requests en espera. Las vistas async esperan en el event loop (aentrar),
+sin ocupar un hilo: si el cliente se desconecta mientras espera, la
+cancelación no deja ningún lugar tomado.
+"""
+import asyncio
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from . import metricas
+
+# Lo que dura el contador compartido sin actividad antes de reiniciarse
+TTL_EN_CURSO = 300
+# Cada cuánto revisa un request en cola si ya hay lugar (BackendCache y aentrar)
+INTERVALO_SONDEO = 0.02
+# Clientes recordados por BackendLocal antes de limpiar los inactivos
+MAX_CLIENTES = 10_000
+
+
+def _gcra(tat: float, ahora: float, tasa: float, rafaga: int) -> tuple[float, float]:
+    """
+    Token bucket como GCRA: `tat` es el "tiempo teórico de llegada" del
+    cliente. Devuelve (nuevo tat, 0) si pasa o (tat sin cambio, segundos
+    hasta el siguiente token) si no.
+    """
+    intervalo = 1 / tasa
+    nuevo = max(tat, ahora) + intervalo
+    exceso = nuevo - ahora - rafaga * intervalo
+    if exceso > 0:
+        return tat, exceso
+    return nuevo, 0.0
+
+
+class BackendLocal:
+    """Estado en memoria de este proceso (default)."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._en_curso = 0
+        self._tats = {}
+
+    def tomar_token(self, cliente: str, tasa: float, rafaga: int) -> float:
+        ahora = time.monotonic()
+        with self._cond:
+            if len(self._tats) > MAX_CLIENTES:
+                self._tats = {c: t for c, t in self._tats.items() if t > ahora}
+            self._tats[cliente], espera = _gcra(self._tats.get(cliente, ahora), ahora, tasa, rafaga)
+        return espera
+
+    def entrar(self, limite: int) -> bool:
+        with self._cond:
+            if self._en_curso >= limite:
+                return False
+            self._en_curso += 1
+            return True
+
+    def salir(self) -> None:
+        with self._cond:
+            self._en_curso -= 1
+            self._cond.notify()
+
+    def esperar(self, segundos: float) -> None:
+        with self._cond:
+            self._cond.wait(min(segundos, 0.25))
+
+
+class BackendCache:
+    """Estado compartido entre procesos en el cache MARATON_ADMISION_CACHE."""
+    CLAVE_EN_CURSO = "admision:en_curso"
+
+    def __init__(self):
+        self.cache = caches[settings.MARATON_ADMISION_CACHE]
+
+    def tomar_token(self, cliente: str, tasa: float, rafaga: int) -> float:
+        clave = f"admision:cliente:{cliente}"
+        ahora = time.time()
+        tat, espera = _gcra(self.cache.get(clave, ahora), ahora, tasa, rafaga)
+        if not espera:
+            self.cache.set(clave, tat, timeout=math.ceil(tat - ahora) + 1)
+        return espera
+
+    def entrar(self, limite: int) -> bool:
+        self.cache.add(self.CLAVE_EN_CURSO, 0, timeout=TTL_EN_CURSO)
+        try:
+            n = self.cache.incr(self.CLAVE_EN_CURSO)
+        except ValueError:  # expiró entre add e incr
+            self.cache.add(self.CLAVE_EN_CURSO, 1, timeout=TTL_EN_CURSO)
+            return True
+        if n > limite:
+            self.salir()
+            return False
+        return True
+
+    def salir(self) -> None:
+        try:
+            self.cache.decr(self.CLAVE_EN_CURSO)
+        except ValueError:
+            pass
+
+    def esperar(self, segundos: float) -> None:
+        time.sleep(min(segundos, INTERVALO_SONDEO))
+
+
+class Rechazo(Exception):
+    def __init__(self, motivo: str, reintentar: float):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.reintentar = reintentar
+
+
+class Compuerta:
+    """Cola de espera del proceso sobre el backend configurado."""
+
+    def __init__(self, backend, ruta: str = ""):
+        self.backend = backend
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._en_cola = 0
+
+    def pedir_token(self, cliente: str) -> None:
+        tasa = settings.MARATON_ADMISION_TASA
+        if tasa <= 0:
+            return
+        espera = self.backend.tomar_token(cliente, tasa, max(1, settings.MARATON_ADMISION_RAFAGA))
+        if espera:
+            raise Rechazo("cliente", espera)
+
+    def entrar_sin_esperar(self) -> bool:
+        if self.backend.entrar(settings.MARATON_ADMISION_RENDERS):
+            self._admitido(0.0)
+            return True
+        return False
+
+    def entrar(self) -> None:
+        """Ocupa un lugar, esperando en la cola si hace falta. Rechazo si no se puede."""
+        if self.entrar_sin_esperar():
+            return
+        inicio, limite = self._formarse()
+        try:
+            while (restante := limite - time.monotonic()) > 0:
+                self.backend.esperar(restante)
+                if self._intentar(inicio):
+                    return
+            raise Rechazo("espera", settings.MARATON_ADMISION_RETRY_AFTER)
+        finally:
+            self._dejar_cola()
+
+    async def aentrar(self) -> None:
+        """
+        entrar() para vistas async: la espera es un asyncio.sleep. El lugar
+        se toma sin ningún await de por medio, así que si el request se
+        cancela (cliente desconectado) o no lo tiene o ya regresó con él.
+        """
+        if self.entrar_sin_esperar():
+            return
+        inicio, limite = self._formarse()
+        try:
+            while (restante := limite - time.monotonic()) > 0:
+                await asyncio.sleep(min(restante, INTERVALO_SONDEO))
+                if self._intentar(inicio):
+                    return
+            raise Rechazo("espera", settings.MARATON_ADMISION_RETRY_AFTER)
+        finally:
+            self._dejar_cola()
+
+    def ocupar(self) -> None:
+        """Para los renders en segundo plano: espera lo necesario, sin cola ni rechazo."""
+        inicio = time.monotonic()
+        while not self._intentar(inicio):
+            self.backend.esperar(1.0)
+
+    def _formarse(self) -> tuple[float, float]:
+        with self._lock:
+            if self._en_cola >= settings.MARATON_ADMISION_COLA:
+                raise Rechazo("cola_llena", settings.MARATON_ADMISION_RETRY_AFTER)
+            self._en_cola += 1
+        metricas.ADMISION_COLA.sumar(n=1)
+        inicio = time.monotonic()
+        return inicio, inicio + settings.MARATON_ADMISION_ESPERA_MS / 1000
+
+    def _dejar_cola(self) -> None:
+        with self._lock:
+            self._en_cola -= 1
+        metricas.ADMISION_COLA.sumar(n=-1)
+
+    def _intentar(self, inicio: float) -> bool:
+        if self.backend.entrar(settings.MARATON_ADMISION_RENDERS):
+            self._admitido(time.monotonic() - inicio)
+            return True
+        return False
+
+    def salir(self) -> None:
+        self.backend.salir()
+        metricas.ADMISION_EN_CURSO.sumar(n=-1)
+
+    def _admitido(self, espera: float) -> None:
+        metricas.ADMISION_EN_CURSO.sumar(n=1)
+        metricas.ADMISION_ESPERA.observar(espera)
+
+
+_compuerta = None
+_compuerta_lock = threading.Lock()
+
+
+def compuerta() -> Compuerta:
+    """La del proceso; se vuelve a crear si cambia MARATON_ADMISION_BACKEND."""
+    global _compuerta
+    ruta = settings.MARATON_ADMISION_BACKEND
+    with _compuerta_lock:
+        if _compuerta is None or _compuerta.ruta != ruta:
+            _compuerta = Compuerta(import_string(ruta)(), ruta)
+        return _compuerta
+
+
+def cliente(request) -> str:
+    """
+    IP del cliente. Detrás de MARATON_PROXIES_CONFIABLES proxies propios (1
+    en Render) es la n-ésima de derecha a izquierda de X-Forwarded-For: cada
+    proxy agrega la IP de quien le habló y lo que viene antes lo escribe el
+    cliente. Sin proxies, o si faltan entradas, REMOTE_ADDR.
+    """
+    n = settings.MARATON_PROXIES_CONFIABLES
+    if n > 0:
+        ips = [ip.strip() for ip in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if ip.strip()]
+        if len(ips) >= n:
+            return ips[-n]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+@contextmanager
+def render_en_segundo_plano():
+    """Ocupa un lugar de render mientras dura el bloque (gafetes de la cola asíncrona)."""
+    if not settings.MARATON_ADMISION:
+        yield
+        return
+    c = compuerta()
+    c.ocupar()
+    try:
+        yield
+    finally:
+        c.salir()
+
+
+def aplica(nombre_ruta: str | None) -> bool:
+    """¿La ruta (url_name) está en MARATON_ADMISION_RUTAS?"""
+    return settings.MARATON_ADMISION and nombre_ruta in settings.MARATON_ADMISION_RUTAS
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class RegistroConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'registro'
+
+    def ready(self):
+        from reportlab import rl_config
+
+        from . import signals  # noqa: F401
+
+        # ReportLab lee useA85 de su configuración global al escribir cada
+        # stream (no hay opción por canvas), así que se fija aquí una vez
+        rl_config.useA85 = int(settings.MARATON_PDF_ASCII85)
@@ -0,0 +1,290 @@
+# registro/benchmarks.py
+"""
+Benchmarks del pipeline de registro (`manage.py medir_rendimiento`).
+
+1. Micro: generar_clave, validación de ParticipantSerializer y el render
+   del gafete en cada modo (archivo, memoria, sin QR, página de un lote).
+   lectura compara el listado con ParticipantSerializer + JSONRenderer
+   contra la ruta rápida (.values() + orjson) sobre un padrón grande, en
+   filas/seg, y revisa que los bytes sean idénticos. Los dos escriben
+   (folios, 20k filas) dentro de una transacción que se revierte, pero
+   mientras corren tienen tomado el candado de escritura de SQLite y
+   frenarían los registros reales: por eso el comando los corre en una
+   BD desechable (bd_desechable) salvo que se pida lo contrario.
+2. Carga: N hilos con conexión HTTP persistente contra un servidor ya
+   levantado (gunicorn/runserver) que reparten los requests entre
+   register, participants, export_csv y reprint según una mezcla.
+   Reporta p50/p95/p99 y requests/seg por endpoint. comparar_async corre
+   la misma carga dos veces: con las vistas síncronas y con las async.
+   Los folios para reprint se piden al mismo servidor, no a la BD local.
+
+Todo se devuelve como dict para guardarlo en JSON y comparar commits.
+"""
+import http.client
+import io
+import json
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlencode, urlsplit
+
+from django.db import connection, transaction
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from . import semilla
+from .folios import asignar_folio
+from .models import Participant
+from .pdf_generator import generar_credencial_bytes, generar_credencial_pdf
+from .pdf_lote import generar_lote_pdf
+from .renderers import ORJSONRenderer
+from .serializers import ParticipantSerializer, campos_lectura, consulta_lectura, representar_filas
+
+MEZCLA_DEFAULT = {"register": 1, "participants": 4, "export_csv": 1, "reprint": 4}
+
+RUTAS = {
+    "register": "/api/register/",
+    "participants": "/api/participants/",
+    "export_csv": "/api/participants/export_csv/",
+    "reprint": "/api/participants/reprint/",
+    "register_async": "/api/async/register/",
+    "reprint_async": "/api/async/participants/reprint/",
+}
+# Endpoint síncrono → su versión async (comparar_async)
+VERSION_ASYNC = {"register": "register_async", "reprint": "reprint_async"}
+
+PLANTELES = list(semilla.PLANTELES)
+fila_aleatoria = semilla.fila
+
+
+def resumen(tiempos: list[float], segundos_totales: float | None = None) -> dict:
+    """Estadísticos en milisegundos de una lista de duraciones en segundos."""
+    if not tiempos:
+        return {"n": 0}
+    ms = sorted(t * 1000 for t in tiempos)
+    cortes = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    out = {
+        "n": len(ms),
+        "min_ms": round(ms[0], 3),
+        "media_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(cortes[49], 3),
+        "p95_ms": round(cortes[94], 3),
+        "p99_ms": round(cortes[98], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+    total = segundos_totales if segundos_totales is not None else sum(tiempos)
+    out["por_seg"] = round(len(ms) / total, 2) if total else None
+    return out
+
+
+def medir(fn, repeticiones: int, calentamiento: int = 1) -> dict:
+    for _ in range(calentamiento):
+        fn()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - inicio)
+    return resumen(tiempos)
+
+
+@contextmanager
+def bd_desechable():
+    """
+    Una BD nueva y migrada, como la de `manage.py test`, mientras dura el
+    bloque; al salir se destruye y la conexión vuelve a la de siempre.
+    """
+    nombre = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nombre, verbosity=0)
+
+
+# =======================
+# Micro
+# =======================
+
+def micro(repeticiones: int = 50) -> dict:
+    rnd = random.Random(1)
+    resultados = {}
+    with transaction.atomic():
+        resultados["generar_clave"] = medir(lambda: asignar_folio("Primaria"), repeticiones * 10)
+
+        filas = [fila_aleatoria(rnd) for _ in range(100)]
+        resultados["serializer_validar"] = medir(
+            lambda: ParticipantSerializer(data=rnd.choice(filas)).is_valid(), repeticiones * 10)
+        resultados["serializer_validar_100"] = medir(
+            lambda: ParticipantSerializer(data=filas, many=True).is_valid(), repeticiones)
+
+        p = Participant.objects.create(**fila_aleatoria(rnd))
+        with tempfile.TemporaryDirectory() as tmp:
+            resultados["pdf_archivo"] = medir(
+                lambda: generar_credencial_pdf(p, pdf_path=f"{tmp}/bench.pdf"), repeticiones)
+        resultados["pdf_memoria"] = medir(lambda: generar_credencial_bytes(p), repeticiones)
+        with override_settings(MARATON_BADGE_QR=False):
+            resultados["pdf_memoria_sin_qr"] = medir(lambda: generar_credencial_bytes(p), repeticiones)
+
+        lote = [Participant(**fila_aleatoria(rnd), clave=f"Bench{i:04d}") for i in range(50)]
+        por_lote = medir(lambda: generar_lote_pdf(lote, io.BytesIO()), max(1, repeticiones // 10))
+        resultados["pdf_lote_por_pagina"] = {
+            k: (round(v / len(lote), 3) if k.endswith("_ms") else v) for k, v in por_lote.items()
+        }
+        transaction.set_rollback(True)
+    return resultados
+
+
+def lectura(filas: int = 20_000, repeticiones: int = 5) -> dict:
+    """Listado completo de `filas` participantes: serializer contra ruta rápida."""
+    campos = campos_lectura([])
+    resultados = {"filas": filas}
+    with transaction.atomic():
+        semilla.sembrar(filas, seed=7)
+        qs = Participant.objects.order_by("-created_at", "-id")
+
+        def con_serializer():
+            return JSONRenderer().render(ParticipantSerializer(list(qs), many=True).data)
+
+        def rapida():
+            return ORJSONRenderer().render(representar_filas(list(consulta_lectura(qs, campos)), campos))
+
+        resultados["identico"] = con_serializer() == rapida()
+        for nombre, fn in (("serializer", con_serializer), ("rapida", rapida)):
+            r = medir(fn, repeticiones)
+            r["filas_por_seg"] = round(filas / (r["p50_ms"] / 1000))
+            resultados[nombre] = r
+        resultados["aceleracion"] = round(resultados["serializer"]["p50_ms"] / resultados["rapida"]["p50_ms"], 2)
+        transaction.set_rollback(True)
+    return resultados
+
+
+# =======================
+# Carga
+# =======================
+
+def sembrar(n: int, seed: int = 1) -> int:
+    """Agrega n participantes aleatorios (ver registro/semilla.py, sin PDFs)."""
+    return semilla.sembrar(n, seed=seed)
+
+
+class _Cliente:
+    """Conexión HTTP persistente por hilo (keep-alive, como un navegador)."""
+
+    def __init__(self, url: str):
+        partes = urlsplit(url)
+        self.https = partes.scheme == "https"
+        self.host = partes.netloc
+        self.conn = None
+
+    def pedir(self, metodo: str, ruta: str, cuerpo: bytes | None = None, headers=None) -> tuple[int, int]:
+        for intento in range(2):
+            if self.conn is None:
+                clase = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+                self.conn = clase(self.host, timeout=60)
+            try:
+                self.conn.request(metodo, ruta, body=cuerpo, headers=headers or {})
+                r = self.conn.getresponse()
+                return r.status, len(r.read())
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if intento:
+                    raise
+        raise RuntimeError("inalcanzable")
+
+
+def folios_del_servidor(url: str) -> list[str]:
+    """Hasta 500 folios del listado de `url` (el servidor bajo carga, sea local o no)."""
+    partes = urlsplit(url)
+    clase = http.client.HTTPSConnection if partes.scheme == "https" else http.client.HTTPConnection
+    conn = clase(partes.netloc, timeout=60)
+    try:
+        conn.request("GET", RUTAS["participants"] + "?" + urlencode({"fields": "clave", "page_size": 500}))
+        r = conn.getresponse()
+        datos = json.loads(r.read()) if r.status == 200 else {}
+    finally:
+        conn.close()
+    return [f["clave"] for f in datos.get("results", []) if f.get("clave")]
+
+
+def carga(url: str, total: int = 500, concurrencia: int = 8, mezcla: dict | None = None,
+          folios: list[str] | None = None, seed: int = 1) -> dict:
+    """
+    Lanza `total` requests repartidos según `mezcla` con `concurrencia`
+    hilos contra `url`. `folios` alimenta a reprint (si falta, se piden
+    al listado de `url`; sin folios, usa ids).
+    """
+    mezcla = mezcla or MEZCLA_DEFAULT
+    rnd = random.Random(seed)
+    nombres = [k for k, peso in mezcla.items() for _ in range(peso)]
+    plan = [rnd.choice(nombres) for _ in range(total)]
+    folios = folios or folios_del_servidor(url)
+
+    tiempos = {k: [] for k in mezcla}
+    errores = {k: 0 for k in mezcla}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def ejecutar(i, endpoint):
+        if not hasattr(local, "cliente"):
+            local.cliente = _Cliente(url)
+            local.rnd = random.Random(seed + threading.get_ident())
+        ruta = RUTAS[endpoint]
+        cuerpo, headers, metodo = None, {}, "GET"
+        if endpoint.startswith("register"):
+            metodo = "POST"
+            fila = fila_aleatoria(local.rnd)
+            fila["full_name"] += f" {i}"  # sin marcar duplicados
+            cuerpo = json.dumps(fila).encode()
+            headers["Content-Type"] = "application/json"
+        elif endpoint.startswith("reprint"):
+            ruta += "?" + urlencode({"q": local.rnd.choice(folios) if folios else "1"})
+        elif endpoint == "export_csv":
+            ruta += "?" + urlencode({"plantel": local.rnd.choice(PLANTELES)})
+
+        inicio = time.perf_counter()
+        try:
+            estado, _ = local.cliente.pedir(metodo, ruta, cuerpo, headers)
+            ok = estado < 400
+        except Exception:
+            ok = False
+        dur = time.perf_counter() - inicio
+        with lock:
+            tiempos[endpoint].append(dur)
+            if not ok:
+                errores[endpoint] += 1
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        list(pool.map(ejecutar, range(total), plan))
+    segundos = time.perf_counter() - inicio
+
+    por_endpoint = {}
+    for k, ts in tiempos.items():
+        datos = resumen(ts, segundos)
+        datos["errores"] = errores[k]
+        por_endpoint[k] = datos
+    todos = [t for ts in tiempos.values() for t in ts]
+    return {
+        "url": url,
+        "concurrencia": concurrencia,
+        "folios": len(folios),
+        "segundos": round(segundos, 3),
+        "total": {**resumen(todos, segundos), "errores": sum(errores.values())},
+        "endpoints": por_endpoint,
+    }
+
+
+def comparar_async(url: str, mezcla: dict | None = None, **kw) -> dict:
+    """
+    La misma carga (mismo plan de requests) contra register/reprint y
+    contra sus versiones async; el resto de endpoints se quedan igual.
+    """
+    mezcla = mezcla or {"register": 1, "reprint": 1}
+    mezcla_async = {VERSION_ASYNC.get(k, k): peso for k, peso in mezcla.items()}
+    return {"sync": carga(url, mezcla=mezcla, **kw), "async": carga(url, mezcla=mezcla_async, **kw)}
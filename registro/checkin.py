@@ -0,0 +1,173 @@
+# registro/checkin.py
+"""
+Check-in del día del evento (estaciones con lector de QR/código de barras).
+
+Cada escaneo resuelve el folio con un LRU en memoria (folio normalizado →
+resumen del participante) o, si no está, con una sola consulta sobre el
+índice UPPER(clave). Los cambios a un participante lo sacan del LRU
+(signals.py). El LRU es de cada proceso: que haya una sola llegada por
+estación lo garantiza la restricción única de CheckIn, no la caché. Las
+estaciones sin red pueden mandar sus escaneos en lote.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+from .folios import folio_de_payload, participantes_por_folio
+from .models import CheckIn, Participant
+
+CAMPOS_RESUMEN = ("id", "clave", "full_name", "child_name", "grado", "role", "plantel")
+
+
+def normalizar_folio(folio: str) -> str:
+    # Acepta el folio tecleado o el contenido del QR (firmado o no)
+    return folio_de_payload(folio).upper()
+
+
+class LRU:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            valor = self._datos.get(key)
+            if valor is None:
+                self.misses += 1
+                return None
+            self._datos.move_to_end(key)
+            self.hits += 1
+            return valor
+
+    def put(self, key, valor):
+        with self._lock:
+            self._datos[key] = valor
+            self._datos.move_to_end(key)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._datos.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+
+_cache = LRU(settings.MARATON_CHECKIN_LRU_SIZE)
+
+
+def olvidar(clave: str) -> None:
+    # La clave de la base, no un payload: con MARATON_QR_FIRMADO,
+    # normalizar_folio() de un folio sin firma da "" y no borraría nada
+    _cache.discard((clave or "").strip().upper())
+
+
+def buscar(folio: str):
+    """Resumen del participante (dict) o None. Caché o una consulta indexada."""
+    key = normalizar_folio(folio)
+    if not key:
+        return None
+    resumen = _cache.get(key)
+    if resumen is None:
+        resumen = participantes_por_folio(key).values(*CAMPOS_RESUMEN).first()
+        if resumen is not None:
+            _cache.put(key, resumen)
+    return resumen
+
+
+def buscar_varios(folios) -> dict:
+    """{folio normalizado: resumen} con una sola consulta para los que no estén en caché."""
+    encontrados, faltan = {}, set()
+    for folio in folios:
+        key = normalizar_folio(folio)
+        if not key or key in encontrados:
+            continue
+        resumen = _cache.get(key)
+        if resumen is None:
+            faltan.add(key)
+        else:
+            encontrados[key] = resumen
+    if faltan:
+        qs = (Participant.objects
+              .annotate(clave_upper=Upper("clave"))
+              .filter(clave_upper__in=faltan)
+              .values("clave_upper", *CAMPOS_RESUMEN))
+        for fila in qs:
+            key = fila.pop("clave_upper")
+            _cache.put(key, fila)
+            encontrados[key] = fila
+    return encontrados
+
+
+def registrar(folio: str, estacion: str, llegada=None):
+    """
+    Marca la llegada en la estación. Devuelve (resumen, checkin, nuevo) o
+    None si el folio no existe. Si ya había llegada en esa estación se
+    conserva la primera.
+    """
+    resumen = buscar(folio)
+    if resumen is None:
+        return None
+    checkin, nuevo = CheckIn.objects.get_or_create(
+        participant_id=resumen["id"],
+        estacion=estacion,
+        defaults={"llegada": llegada or timezone.now()},
+    )
+    return resumen, checkin, nuevo
+
+
+def sincronizar(estacion: str, escaneos: list[dict]) -> list[dict]:
+    """
+    Registra en bloque los escaneos guardados sin conexión
+    ([{"folio": ..., "llegada": datetime|None}, ...]).
+    Devuelve un resultado por escaneo, en el mismo orden; "nuevo" solo va
+    en True en el escaneo que creó la llegada de ese participante.
+
+    Se queda la llegada más temprana aunque otra estación o worker haya
+    sincronizado antes. Los duplicados los resuelve la restricción
+    uniq_checkin_estacion de la base, no el LRU (que es de cada proceso y
+    solo guarda folio → resumen): INSERT ignorando conflictos, se leen las
+    filas del lote y, donde ya había una llegada posterior, un UPDATE
+    condicionado a llegada > la nuestra.
+    """
+    resumenes = buscar_varios(e.get("folio") for e in escaneos)
+
+    elegidos, resultados = {}, []
+    for e in escaneos:
+        resumen = resumenes.get(normalizar_folio(e.get("folio")))
+        if resumen is None:
+            resultados.append({"folio": e.get("folio"), "ok": False, "error": "Folio no encontrado"})
+            continue
+        # Dentro del lote se queda la llegada más temprana
+        llegada = e.get("llegada") or timezone.now()
+        previo = elegidos.get(resumen["id"])
+        if previo is None or llegada < previo[0].llegada:
+            elegidos[resumen["id"]] = (
+                CheckIn(participant_id=resumen["id"], estacion=estacion, llegada=llegada), len(resultados))
+        resultados.append({"folio": resumen["clave"], "ok": True, "nuevo": False, "participant": resumen})
+    if not elegidos:
+        return resultados
+
+    CheckIn.objects.bulk_create([c for c, _ in elegidos.values()], ignore_conflicts=True)
+    # Las filas que insertamos traen nuestro recibido_at; las demás ya existían
+    guardados = CheckIn.objects.filter(estacion=estacion, participant_id__in=elegidos).values_list(
+        "participant_id", "pk", "llegada", "recibido_at")
+    for participant_id, pk, llegada, recibido_at in guardados:
+        checkin, i = elegidos[participant_id]
+        if recibido_at == checkin.recibido_at:
+            resultados[i]["nuevo"] = True
+        elif checkin.llegada < llegada:
+            CheckIn.objects.filter(pk=pk, llegada__gt=checkin.llegada).update(llegada=checkin.llegada)
+    return resultados
+
+
+def estadisticas() -> dict:
+    return {"hits": _cache.hits, "misses": _cache.misses, "size": len(_cache._datos)}
@@ -0,0 +1,202 @@
+# registro/difusion.py
+"""
+Cambios del registro en vivo para los tableros (SSE, EstadisticasEnVivoView).
+
+signals.py publica, cuando se confirma la transacción, cada alta, baja o
+cambio de plantel/rol de un Participant: deltas por (plantel, role) y, en
+las altas, la fila del participante (mismo formato que el listado). Las
+importaciones masivas publican solo los deltas (stats.sumar_participantes).
+
+Cada tablero conectado es un Suscriptor que acumula lo pendiente. Cuando su
+conexión puede escribir toma todo junto en un solo evento "cambios": un
+cliente lento no frena a los demás ni hace crecer la memoria, sus deltas se
+suman y de los nuevos se guardan los últimos MAX_NUEVOS (el resto se cuenta
+en "omitidos" para que vuelva a pedir el listado).
+
+Sin novedades se manda un comentario de latido cada MARATON_SSE_LATIDO_S.
+Cada MARATON_SSE_RESYNC_S, alineado al reloj para que todos los tableros
+coincidan, llega de nuevo el evento "estadisticas" completo. Es una sola
+lectura de los contadores por worker sin importar cuántos tableros haya, y
+corrige lo que no pasó por este proceso (altas en otros workers, bajas
+masivas, reconciliar_estadisticas).
+
+Sin tableros conectados, publicar no cuesta nada (signals.py ni arma la fila).
+"""
+import asyncio
+import json
+import threading
+import time
+import weakref
+from collections import Counter, deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import metricas
+
+# Altas que se guardan por cliente entre un envío y el siguiente
+MAX_NUEVOS = 100
+# Milisegundos que el navegador espera antes de reconectar (EventSource)
+REINTENTO_MS = 3000
+
+
+class Suscriptor:
+    def __init__(self, loop):
+        self._loop = loop
+        self._aviso = asyncio.Event()
+        self._lock = threading.Lock()
+        self._totales = Counter()
+        self._nuevos = deque(maxlen=MAX_NUEVOS)
+        self._omitidos = 0
+
+    def agregar(self, grupos, fila=None) -> None:
+        """Desde cualquier hilo: suma los deltas y despierta al tablero."""
+        with self._lock:
+            for grupo, delta in grupos:
+                self._totales[grupo] += delta
+            if fila is not None:
+                if len(self._nuevos) == MAX_NUEVOS:
+                    self._omitidos += 1
+                self._nuevos.append(fila)
+        try:
+            self._loop.call_soon_threadsafe(self._aviso.set)
+        except RuntimeError:  # el event loop ya cerró
+            pass
+
+    async def esperar(self, segundos: float) -> bool:
+        try:
+            await asyncio.wait_for(self._aviso.wait(), max(segundos, 0))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def tomar(self) -> dict | None:
+        """Lo acumulado desde el último envío (None si no hay nada)."""
+        with self._lock:
+            self._aviso.clear()
+            totales = [
+                {"plantel": plantel, "role": role, "delta": n}
+                for (plantel, role), n in sorted(self._totales.items()) if n
+            ]
+            if not totales and not self._nuevos and not self._omitidos:
+                return None
+            cambios = {"totales": totales, "nuevos": list(self._nuevos), "omitidos": self._omitidos}
+            self._totales.clear()
+            self._nuevos.clear()
+            self._omitidos = 0
+        return cambios
+
+
+# Débil: si la vista dio de alta un tablero pero su flujo nunca empezó
+# (cliente que se fue antes), el lugar se libera con el generador
+_suscriptores = weakref.WeakSet()
+_lock = threading.Lock()
+
+
+def hay_suscriptores() -> bool:
+    return bool(_suscriptores)
+
+
+def publicar(grupos, fila=None) -> None:
+    """grupos: [((plantel, role), delta), ...]; fila: el participante nuevo, si es alta."""
+    with _lock:
+        suscriptores = list(_suscriptores)
+    for s in suscriptores:
+        s.agregar(grupos, fila)
+
+
+def _alta(s: Suscriptor) -> bool:
+    """Agrega el tablero si hay lugar (MARATON_SSE_MAX_CLIENTES); revisar y agregar es atómico."""
+    with _lock:
+        if len(_suscriptores) >= settings.MARATON_SSE_MAX_CLIENTES:
+            return False
+        _suscriptores.add(s)
+        metricas.SSE_CLIENTES.fijar(len(_suscriptores))
+        return True
+
+
+def _baja(s: Suscriptor) -> None:
+    with _lock:
+        _suscriptores.discard(s)
+        metricas.SSE_CLIENTES.fijar(len(_suscriptores))
+
+
+def suscribir() -> Suscriptor | None:
+    """Alta de un tablero en el event loop actual; None si ya no hay lugar."""
+    s = Suscriptor(asyncio.get_running_loop())
+    return s if _alta(s) else None
+
+
+# =======================
+# Instantánea compartida
+# =======================
+
+_instantanea = (None, None)
+_instantanea_lock = threading.Lock()
+
+
+def _ciclo() -> int:
+    return int(time.time() // max(1, settings.MARATON_SSE_RESYNC_S))
+
+
+def instantanea(ciclo: int) -> dict:
+    """leer_estadisticas() una sola vez por ciclo para todos los tableros."""
+    global _instantanea
+    from .stats import leer_estadisticas
+
+    with _instantanea_lock:
+        if _instantanea[0] != ciclo:
+            _instantanea = (ciclo, leer_estadisticas())
+        return _instantanea[1]
+
+
+# =======================
+# Flujo SSE
+# =======================
+
+def _evento(nombre: str, datos) -> bytes:
+    texto = json.dumps(datos, ensure_ascii=False, separators=(",", ":"))
+    return f"event: {nombre}\ndata: {texto}\n\n".encode("utf-8")
+
+
+async def eventos(s: Suscriptor):
+    """
+    Flujo text/event-stream del tablero `s` (de suscribir()); termina y lo
+    da de baja cuando el cliente se desconecta.
+    """
+    try:
+        yield f"retry: {REINTENTO_MS}\n\n".encode()
+        # Al conectar, estadísticas al momento (no la instantánea del ciclo).
+        # Lo publicado mientras se leían ya viene incluido: se descarta para
+        # no contarlo dos veces (lo que se pierda en esa ventana lo corrige
+        # el siguiente resync).
+        from .stats import leer_estadisticas
+
+        inicial = await sync_to_async(leer_estadisticas)()
+        s.tomar()
+        yield _evento("estadisticas", inicial)
+        ciclo = _ciclo()
+        ultimo_envio = time.monotonic()
+        while True:
+            latido = settings.MARATON_SSE_LATIDO_S
+            resync = max(1, settings.MARATON_SSE_RESYNC_S)
+            hasta_resync = resync - time.time() % resync
+            hasta_latido = ultimo_envio + latido - time.monotonic()
+            if await s.esperar(min(hasta_latido, hasta_resync)) and settings.MARATON_SSE_AGRUPAR_MS:
+                # Una ráfaga de altas sale en un solo evento
+                await asyncio.sleep(settings.MARATON_SSE_AGRUPAR_MS / 1000)
+
+            if (actual := _ciclo()) != ciclo:
+                # La instantánea ya incluye lo pendiente
+                ciclo = actual
+                s.tomar()
+                yield _evento("estadisticas", await sync_to_async(instantanea)(ciclo))
+            elif (cambios := s.tomar()) is not None:
+                yield _evento("cambios", cambios)
+            elif time.monotonic() - ultimo_envio >= latido:
+                yield b": latido\n\n"
+            else:
+                continue
+            ultimo_envio = time.monotonic()
+    finally:
+        _baja(s)
@@ -0,0 +1,64 @@
+# registro/filters.py
+"""
+Filtros comunes para listados, exportaciones y lotes de gafetes.
+
+Parámetros (todos opcionales):
+    plantel   Primaria|Secundaria|Preparatoria (sin importar mayúsculas)
+    role      rol exacto (ACOMPAÑANTE MUJER, ...)
+    desde     fecha (AAAA-MM-DD) o fecha-hora ISO, inclusive
+    hasta     fecha (AAAA-MM-DD, incluye todo el día) o fecha-hora ISO
+    folios    lista separada por comas (Primaria0001,Primaria0002)
+    q         texto contenido en nombre, alumno o folio
+"""
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+class FiltroInvalido(ValueError):
+    pass
+
+
+def _fecha(valor: str, nombre: str):
+    dt = parse_datetime(valor)
+    if dt is not None:
+        if timezone.is_naive(dt):
+            dt = timezone.make_aware(dt)
+        return dt, False
+    d = parse_date(valor)
+    if d is not None:
+        return d, True
+    raise FiltroInvalido(f"Fecha inválida en '{nombre}': {valor}")
+
+
+def filtrar_participantes(qs, params):
+    """Aplica al queryset los filtros presentes en `params` (QueryDict o dict)."""
+    plantel = (params.get("plantel") or "").strip()
+    if plantel:
+        qs = qs.filter(plantel=plantel.title())
+
+    role = (params.get("role") or "").strip()
+    if role:
+        qs = qs.filter(role=role.upper())
+
+    desde = (params.get("desde") or "").strip()
+    if desde:
+        valor, es_fecha = _fecha(desde, "desde")
+        qs = qs.filter(**{"created_at__date__gte" if es_fecha else "created_at__gte": valor})
+
+    hasta = (params.get("hasta") or "").strip()
+    if hasta:
+        valor, es_fecha = _fecha(hasta, "hasta")
+        qs = qs.filter(**{"created_at__date__lte" if es_fecha else "created_at__lte": valor})
+
+    folios = [f.strip() for f in (params.get("folios") or "").split(",") if f.strip()]
+    if folios:
+        qs = qs.filter(clave__in=folios)
+
+    q = (params.get("q") or "").strip()
+    if q:
+        qs = qs.filter(
+            Q(full_name__icontains=q) | Q(child_name__icontains=q) | Q(clave__icontains=q)
+        )
+
+    return qs
@@ -0,0 +1,117 @@
+# registro/folios.py
+"""
+Asignación de folios (clave) por plantel.
+
+Cada prefijo tiene una fila en FolioCounter. Asignar un folio es un
+UPDATE ... SET ultimo = ultimo + n seguido de una lectura de la misma fila,
+ambos dentro de una transacción:
+
+- Postgres: el UPDATE toma el candado de la fila hasta el commit.
+- SQLite: el UPDATE toma el candado de escritura de la base (con
+  transaction_mode=IMMEDIATE en settings se pide desde el BEGIN).
+
+El costo es constante: no depende de cuántos participantes haya.
+"""
+import re
+
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Upper
+
+from .models import FolioCounter, Participant
+
+FOLIO_RE = re.compile(r"^(.*?)(\d+)$")
+
+
+def prefijo_folio(plantel: str) -> str:
+    # Primaria|Secundaria|Preparatoria
+    return (plantel or "").strip().title() or "GEN"
+
+
+def formatear_folio(prefijo: str, numero: int) -> str:
+    return f"{prefijo}{numero:04d}"
+
+
+def _maximo_existente(prefijo: str) -> int:
+    """Número más alto ya usado con ese prefijo (solo al crear el contador)."""
+    max_n = 0
+    claves = (Participant.objects
+              .filter(clave__startswith=prefijo)
+              .values_list("clave", flat=True))
+    for clave in claves:
+        m = FOLIO_RE.match(clave or "")
+        if m and m.group(1) == prefijo:
+            max_n = max(max_n, int(m.group(2)))
+    return max_n
+
+
+def reservar_folios(plantel: str, cantidad: int = 1) -> list[str]:
+    """
+    Reserva `cantidad` folios consecutivos para el plantel y los devuelve
+    en orden. Es atómico: un bloque reservado nunca se repite.
+    """
+    if cantidad < 1:
+        return []
+    prefijo = prefijo_folio(plantel)
+    contador = FolioCounter.objects.filter(prefijo=prefijo)
+
+    with transaction.atomic():
+        if not contador.update(ultimo=F("ultimo") + cantidad):
+            # Primer folio de este prefijo: se siembra con lo que ya exista
+            try:
+                with transaction.atomic():
+                    FolioCounter.objects.create(
+                        prefijo=prefijo,
+                        ultimo=_maximo_existente(prefijo) + cantidad,
+                    )
+            except IntegrityError:
+                # Otro proceso lo creó al mismo tiempo
+                contador.update(ultimo=F("ultimo") + cantidad)
+        ultimo = contador.values_list("ultimo", flat=True).get()
+
+    inicio = ultimo - cantidad + 1
+    return [formatear_folio(prefijo, n) for n in range(inicio, ultimo + 1)]
+
+
+def asignar_folio(plantel: str) -> str:
+    return reservar_folios(plantel, 1)[0]
+
+
+def participantes_por_folio(q: str):
+    """
+    Queryset del participante con ese folio, sin importar mayúsculas.
+    UPPER(clave) = 'X' usa el índice part_clave_upper_idx (iexact no puede).
+    """
+    return (Participant.objects
+            .annotate(clave_upper=Upper("clave"))
+            .filter(clave_upper=(q or "").strip().upper()))
+
+
+# =======================
+# Contenido del QR del gafete
+# =======================
+
+_signer = signing.Signer(salt="registro.gafete")
+
+
+def payload_qr(clave: str) -> str:
+    """Texto del QR: el folio, o folio:firma si MARATON_QR_FIRMADO está activo."""
+    return _signer.sign(clave) if settings.MARATON_QR_FIRMADO else clave
+
+
+def folio_de_payload(texto: str) -> str:
+    """
+    Folio a partir de lo que leyó el escáner (o se tecleó). Un QR con firma
+    inválida devuelve "" para que no se encuentre a nadie; con
+    MARATON_QR_FIRMADO activo también un folio sin firma (tecleado o de un
+    QR hecho a mano): solo cuentan los gafetes impresos por el sistema.
+    """
+    texto = (texto or "").strip()
+    if ":" not in texto:
+        return "" if settings.MARATON_QR_FIRMADO else texto
+    try:
+        return _signer.unsign(texto)
+    except signing.BadSignature:
+        return ""
@@ -0,0 +1,140 @@
+# registro/importacion.py
+"""
+Importación masiva de participantes (listas de grupo en CSV o JSON).
+
+1. Todas las filas se validan con ParticipantSerializer(many=True); las
+   inválidas se reportan con su número de fila y no detienen el lote.
+2. Se reserva un bloque contiguo de folios por plantel en un solo paso.
+3. Se inserta con bulk_create por bloques y se ajustan los contadores de
+   estadísticas (bulk_create no dispara señales).
+4. Los PDFs son opcionales y se difieren a la cola de gafetes (jobs.py).
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+
+from django.db import transaction
+
+from . import stats
+from .folios import reservar_folios
+from .jobs import encolar_gafete
+from .models import BadgeJob, Participant, clave_duplicado
+from .serializers import ParticipantSerializer
+
+CHUNK_SIZE = 500
+
+# Encabezados aceptados (los del CSV exportado y los nombres de la API)
+COLUMNAS = {
+    "full_name": "full_name",
+    "nombre": "full_name",
+    "nombre participante": "full_name",
+    "plantel": "plantel",
+    "child_name": "child_name",
+    "alumno": "child_name",
+    "nombre alumno": "child_name",
+    "grado": "grado",
+    "role": "role",
+    "rol": "role",
+}
+
+
+class ArchivoInvalido(ValueError):
+    pass
+
+
+def _normalizar_fila(fila: dict) -> dict:
+    out = {}
+    for k, v in fila.items():
+        campo = COLUMNAS.get((k or "").strip().lower())
+        if campo:
+            out[campo] = v if v is not None else ""
+    return out
+
+
+def leer_filas(contenido, formato: str) -> list[dict]:
+    """Convierte el archivo (bytes o str) en una lista de dicts."""
+    if isinstance(contenido, bytes):
+        contenido = contenido.decode("utf-8-sig")
+
+    if formato == "json":
+        try:
+            data = json.loads(contenido)
+        except ValueError as e:
+            raise ArchivoInvalido(f"JSON inválido: {e}")
+        if isinstance(data, dict):
+            data = data.get("rows") or data.get("participants") or []
+        if not isinstance(data, list) or not all(isinstance(f, dict) for f in data):
+            raise ArchivoInvalido("Se esperaba una lista de objetos")
+        return [_normalizar_fila(f) for f in data]
+
+    if formato == "csv":
+        muestra = contenido[:4096]
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        return [_normalizar_fila(f) for f in csv.DictReader(io.StringIO(contenido), dialect=dialecto)]
+
+    raise ArchivoInvalido(f"Formato no soportado: {formato}")
+
+
+def _validar(filas):
+    """Devuelve ([(fila, datos_validos)], [(fila, errores)]); fila empieza en 1."""
+    s = ParticipantSerializer(data=filas, many=True)
+    if s.is_valid():
+        return list(enumerate(s.validated_data, 1)), []
+
+    errores = [(i, e) for i, e in enumerate(s.errors, 1) if e]
+    con_error = {i for i, _ in errores}
+    indices = [i for i in range(1, len(filas) + 1) if i not in con_error]
+    if not indices:
+        return [], errores
+
+    # Segunda pasada solo con las filas buenas para obtener validated_data
+    s = ParticipantSerializer(data=[filas[i - 1] for i in indices], many=True)
+    s.is_valid(raise_exception=True)
+    return list(zip(indices, s.validated_data)), errores
+
+
+def importar(filas: list[dict], generar_pdfs: bool = False, chunk_size: int = CHUNK_SIZE) -> dict:
+    validas, errores = _validar(filas)
+
+    por_plantel = defaultdict(list)
+    for fila, data in validas:
+        por_plantel[(data.get("plantel") or "").strip()].append((fila, data))
+
+    # Un bloque de folios por plantel (transacción corta, no bloquea el registro)
+    objetos = []
+    for plantel, grupo in por_plantel.items():
+        folios = reservar_folios(plantel, len(grupo))
+        for (fila, data), clave in zip(grupo, folios):
+            p = Participant(
+                full_name=(data.get("full_name") or "").strip(),
+                plantel=plantel,
+                child_name=(data.get("child_name") or "").strip(),
+                grado=(data.get("grado") or "").strip(),
+                role=(data.get("role") or "").strip().upper(),
+                clave=clave,
+            )
+            p.nombre_clave = clave_duplicado(p.full_name, p.child_name, p.plantel)
+            p._fila = fila
+            objetos.append(p)
+    objetos.sort(key=lambda p: p._fila)
+
+    with transaction.atomic():
+        for i in range(0, len(objetos), chunk_size):
+            Participant.objects.bulk_create(objetos[i:i + chunk_size])
+        stats.sumar_participantes(objetos)
+
+        if generar_pdfs and objetos:
+            jobs = BadgeJob.objects.bulk_create(BadgeJob(participant=p) for p in objetos)
+            ids = [j.pk for j in jobs]
+            transaction.on_commit(lambda: [encolar_gafete(pk) for pk in ids])
+
+    return {
+        "recibidas": len(filas),
+        "creados": len(objetos),
+        "participantes": [{"fila": p._fila, "id": p.pk, "clave": p.clave} for p in objetos],
+        "errores": [{"fila": fila, "errores": e} for fila, e in errores],
+    }
@@ -0,0 +1,126 @@
+# registro/jobs.py
+"""
+Cola de gafetes para el modo asíncrono (MARATON_PDF_ASYNC=1).
+
+El PDF queda en la caché de reimpresión (pdf_cache) y BadgeJob.pdf_path
+guarda su nombre dentro del storage "gafetes".
+
+El registro crea un BadgeJob en la misma transacción que el participante y,
+al hacer commit, lo manda a un pool de hilos local. Si el proceso se reinicia
+con trabajos pendientes, `python manage.py procesar_gafetes` los termina.
+Los que quedaron en PROCESANDO porque el proceso murió a medias regresan a
+la cola cuando su started_at pasa de MARATON_PDF_JOB_TIMEOUT_S
+(reencolar_atascados, que el comando corre en cada vuelta).
+"""
+import datetime
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import admision, pdf_cache
+from .models import BadgeJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.MARATON_PDF_WORKERS,
+            thread_name_prefix="gafetes",
+        )
+    return _executor
+
+
+def encolar_gafete(job_id: int) -> None:
+    """Manda el trabajo al pool local; con 0 workers queda para el comando."""
+    if settings.MARATON_PDF_WORKERS > 0:
+        _get_executor().submit(_procesar_en_hilo, job_id)
+
+
+def en_segundo_plano(fn, *args) -> None:
+    """Ejecuta fn(*args) en el mismo pool; con 0 workers, en línea."""
+    if settings.MARATON_PDF_WORKERS > 0:
+        _get_executor().submit(_en_hilo, fn, *args)
+    else:
+        fn(*args)
+
+
+async def aen_segundo_plano(fn, *args) -> None:
+    """
+    en_segundo_plano() para vistas async. Con 0 workers fn(*args) no corre
+    en el event loop (lo frenaría para todos los requests): se espera en un
+    hilo aparte, sin tocar el hilo compartido de sync_to_async.
+    """
+    if settings.MARATON_PDF_WORKERS > 0:
+        _get_executor().submit(_en_hilo, fn, *args)
+    else:
+        await sync_to_async(_en_hilo, thread_sensitive=False)(fn, *args)
+
+
+def _en_hilo(fn, *args) -> None:
+    try:
+        fn(*args)
+    except Exception:
+        logger.error("BACKGROUND_ERROR %s:\n%s", getattr(fn, "__name__", fn), traceback.format_exc())
+
+
+def _procesar_en_hilo(job_id: int) -> None:
+    close_old_connections()
+    try:
+        procesar_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def procesar_job(job_id: int) -> bool:
+    """
+    Genera el PDF de un trabajo pendiente. Devuelve False si otro worker
+    ya lo tomó (el cambio a PROCESANDO es un UPDATE condicional).
+    """
+    tomado = (BadgeJob.objects
+              .filter(pk=job_id, status=BadgeJob.PENDIENTE)
+              .update(status=BadgeJob.PROCESANDO, started_at=timezone.now(), updated_at=timezone.now()))
+    if not tomado:
+        return False
+
+    job = BadgeJob.objects.select_related("participant").get(pk=job_id)
+    try:
+        with admision.render_en_segundo_plano():
+            pdf_path, _, _ = pdf_cache.obtener_pdf(job.participant)
+    except Exception as e:
+        logger.error("BADGE_JOB_ERROR %s: %s", job_id, e)
+        logger.error("TRACE:\n%s", traceback.format_exc())
+        job.status = BadgeJob.ERROR
+        job.error = str(e)
+        job.save(update_fields=["status", "error", "updated_at"])
+        return True
+
+    job.status = BadgeJob.LISTO
+    job.pdf_path = pdf_path
+    job.error = ""
+    job.save(update_fields=["status", "pdf_path", "error", "updated_at"])
+    return True
+
+
+def reencolar_atascados() -> int:
+    """
+    Regresa a PENDIENTE los trabajos en PROCESANDO desde hace más de
+    MARATON_PDF_JOB_TIMEOUT_S. Si el worker original seguía vivo, el gafete
+    se dibuja dos veces y el segundo sale de la caché de PDFs.
+    """
+    limite = timezone.now() - datetime.timedelta(seconds=settings.MARATON_PDF_JOB_TIMEOUT_S)
+    n = (BadgeJob.objects
+         .filter(status=BadgeJob.PROCESANDO, started_at__lt=limite)
+         .update(status=BadgeJob.PENDIENTE, started_at=None, updated_at=timezone.now()))
+    if n:
+        logger.warning("BADGE_JOB_REENCOLADOS %s trabajo(s) atascados en PROCESANDO", n)
+    return n
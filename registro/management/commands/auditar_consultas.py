@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from registro.query_audit import auditar
+
+
+class Command(BaseCommand):
+    help = "Muestra el EXPLAIN de las consultas de cada endpoint y falla si alguna recorre toda la tabla."
+
+    def handle(self, *args, **opts):
+        fallas = []
+        for nombre, plan, ok in auditar():
+            estilo = self.style.SUCCESS if ok else self.style.ERROR
+            self.stdout.write(estilo(f"[{'OK' if ok else 'SCAN'}] {nombre}"))
+            for linea in plan.splitlines():
+                self.stdout.write(f"    {linea}")
+            if not ok:
+                fallas.append(nombre)
+
+        if fallas:
+            raise CommandError(f"Recorrido completo en: {', '.join(fallas)}")
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from registro import semilla
+
+
+class Command(BaseCommand):
+    help = (
+        "Llena Participant con N registros realistas (nombres, planteles, roles, grados, "
+        "folios y fechas) para medir con volumen. Mismo --seed, mismos datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("cantidad", type=int)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--dias", type=float, default=45,
+                            help="created_at se reparte entre hace N días y ahora.")
+        parser.add_argument("--chunk-size", type=int, default=semilla.CHUNK_SIZE)
+
+    def handle(self, *args, **opts):
+        n = opts["cantidad"]
+        if n < 1 or opts["chunk_size"] < 1:
+            raise CommandError("cantidad y --chunk-size deben ser mayores que cero")
+
+        inicio = time.perf_counter()
+        cada = max(opts["chunk_size"], n // 20)
+        avisos = {"siguiente": cada}
+
+        def progreso(hechos):
+            if hechos >= avisos["siguiente"] and hechos < n:
+                avisos["siguiente"] += cada
+                seg = time.perf_counter() - inicio
+                self.stdout.write(f"  {hechos}/{n} ({hechos / seg:.0f} filas/s)")
+
+        creados = semilla.sembrar(n, seed=opts["seed"], dias=opts["dias"],
+                                  chunk_size=opts["chunk_size"], progreso=progreso)
+        seg = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{creados} participante(s) generados en {seg:.2f}s ({creados / seg:.0f} filas/s)"
+        ))
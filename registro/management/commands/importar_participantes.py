@@ -0,0 +1,41 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from registro.importacion import CHUNK_SIZE, ArchivoInvalido, importar, leer_filas
+
+
+class Command(BaseCommand):
+    help = "Importa participantes desde un CSV o JSON (lista de grupo)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo")
+        parser.add_argument("--formato", choices=["csv", "json"],
+                            help="Por defecto se deduce de la extensión.")
+        parser.add_argument("--pdfs", action="store_true",
+                            help="Encolar el gafete de cada participante creado.")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **opts):
+        path = opts["archivo"]
+        formato = opts["formato"] or ("json" if path.lower().endswith(".json") else "csv")
+        if not os.path.exists(path):
+            raise CommandError(f"No existe {path}")
+
+        with open(path, "rb") as f:
+            try:
+                filas = leer_filas(f.read(), formato)
+            except ArchivoInvalido as e:
+                raise CommandError(str(e))
+
+        inicio = time.perf_counter()
+        r = importar(filas, generar_pdfs=opts["pdfs"], chunk_size=opts["chunk_size"])
+        seg = time.perf_counter() - inicio
+
+        for err in r["errores"]:
+            detalle = "; ".join(f"{k}: {', '.join(map(str, v))}" for k, v in err["errores"].items())
+            self.stdout.write(self.style.WARNING(f"Fila {err['fila']}: {detalle}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{r['creados']} de {r['recibidas']} participante(s) importados en {seg:.2f}s"
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from registro.filters import FiltroInvalido, filtrar_participantes
+from registro.models import Participant
+from registro.pdf_lote import CHUNK_SIZE, generar_lote_pdf
+
+
+class Command(BaseCommand):
+    help = "Genera un solo PDF con los gafetes de los participantes filtrados."
+
+    def add_arguments(self, parser):
+        parser.add_argument("-o", "--output", default="gafetes_maraton.pdf",
+                            help="Archivo PDF de salida.")
+        parser.add_argument("--plantel")
+        parser.add_argument("--role")
+        parser.add_argument("--desde", help="AAAA-MM-DD o fecha-hora ISO (inclusive).")
+        parser.add_argument("--hasta", help="AAAA-MM-DD o fecha-hora ISO (inclusive).")
+        parser.add_argument("--folios", help="Lista separada por comas.")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **opts):
+        try:
+            qs = filtrar_participantes(Participant.objects.all(), opts)
+        except FiltroInvalido as e:
+            raise CommandError(str(e))
+
+        qs = qs.order_by("plantel", "clave", "id")
+        if not qs.exists():
+            raise CommandError("Sin participantes para esos filtros")
+
+        paginas = generar_lote_pdf(qs, opts["output"], chunk_size=opts["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"{paginas} gafete(s) en {opts['output']}"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from registro import pdf_cache, pdf_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra del storage de gafetes los PDFs que ya no corresponden a ningún "
+        "participante o versión vigente (y los del esquema anterior en credenciales/)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--simular", action="store_true",
+                            help="Solo lista lo que se borraría.")
+
+    def handle(self, *args, **opts):
+        st = pdf_storage.storage()
+        n = 0
+        for nombre in pdf_cache.huerfanos():
+            if opts["simular"]:
+                self.stdout.write(nombre)
+            else:
+                st.delete(nombre)
+            n += 1
+
+        accion = "por borrar" if opts["simular"] else "eliminados"
+        self.stdout.write(self.style.SUCCESS(f"{n} PDF(s) huérfanos {accion}"))
@@ -0,0 +1,127 @@
+import json
+import os
+import platform
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from registro import benchmarks
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def _mezcla(texto: str) -> dict:
+    mezcla = {}
+    for parte in texto.split(","):
+        nombre, _, peso = parte.partition("=")
+        nombre = nombre.strip()
+        if nombre not in benchmarks.RUTAS:
+            raise CommandError(f"Endpoint desconocido en --mezcla: {nombre}")
+        mezcla[nombre] = int(peso or 1)
+    return mezcla
+
+
+class Command(BaseCommand):
+    help = (
+        "Microbenchmarks del registro (folio, serializer, PDF por modo), lectura del listado "
+        "(filas/seg) y prueba de carga HTTP contra un servidor levantado (--url). "
+        "Guarda los resultados en JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--solo", choices=["micro", "lectura", "carga"],
+                            help="Ejecuta solo una de las partes.")
+        parser.add_argument("--repeticiones", type=int, default=50,
+                            help="Iteraciones por microbenchmark.")
+        parser.add_argument("--lectura-filas", type=int, default=20_000,
+                            help="Tamaño del padrón para el benchmark de lectura (se revierte al final).")
+        parser.add_argument("--en-esta-bd", action="store_true",
+                            help="Corre micro y lectura en la BD configurada en lugar de una desechable. "
+                                 "Toman el candado de escritura mientras corren: nunca durante el registro.")
+        parser.add_argument("--url", help="Servidor para la prueba de carga (http://127.0.0.1:8000).")
+        parser.add_argument("--sembrar", type=int, default=0,
+                            help="Antes de la carga, agrega N participantes aleatorios a esta BD "
+                                 "(solo sirve si --url es un servidor sobre esta misma BD).")
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrencia", type=int, default=8)
+        parser.add_argument("--mezcla", default="register=1,participants=4,export_csv=1,reprint=4",
+                            help="Pesos por endpoint.")
+        parser.add_argument("--comparar-async", action="store_true",
+                            help="Corre la carga con register/reprint síncronos y luego con sus versiones async.")
+        parser.add_argument("--json", dest="json_path", help="Archivo donde guardar los resultados.")
+
+    def handle(self, *args, **opts):
+        resultado = {
+            "commit": _commit(),
+            "fecha": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "db": connection.vendor,
+            "cpus": os.cpu_count(),
+        }
+
+        if opts["solo"] in (None, "micro", "lectura"):
+            if opts["en_esta_bd"]:
+                self._micro_y_lectura(opts, resultado)
+            else:
+                self.stdout.write("Creando una BD desechable para micro y lectura...")
+                with benchmarks.bd_desechable():
+                    self._micro_y_lectura(opts, resultado)
+
+        if opts["solo"] in (None, "carga"):
+            if not opts["url"]:
+                if opts["solo"] == "carga":
+                    raise CommandError("La prueba de carga necesita --url")
+            else:
+                if opts["sembrar"]:
+                    self.stdout.write(f"Sembrando {opts['sembrar']} participantes...")
+                    benchmarks.sembrar(opts["sembrar"])
+                self.stdout.write(f"Carga: {opts['requests']} requests, {opts['concurrencia']} hilos "
+                                  f"contra {opts['url']}...")
+                kw = {"total": opts["requests"], "concurrencia": opts["concurrencia"],
+                      "mezcla": _mezcla(opts["mezcla"])}
+                if opts["comparar_async"]:
+                    resultado["comparacion"] = benchmarks.comparar_async(opts["url"], **kw)
+                    for modo, carga in resultado["comparacion"].items():
+                        self.stdout.write(f" {modo}:")
+                        self._tabla(carga)
+                else:
+                    resultado["carga"] = benchmarks.carga(opts["url"], **kw)
+                    self._tabla(resultado["carga"])
+
+        if opts["json_path"]:
+            with open(opts["json_path"], "w", encoding="utf-8") as f:
+                json.dump(resultado, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados en {opts['json_path']}"))
+
+    def _micro_y_lectura(self, opts, resultado: dict) -> None:
+        if opts["solo"] in (None, "micro"):
+            self.stdout.write("Microbenchmarks...")
+            resultado["micro"] = benchmarks.micro(opts["repeticiones"])
+            for nombre, r in resultado["micro"].items():
+                self.stdout.write(f"  {nombre:<24} p50={r['p50_ms']:>9.3f} ms  p95={r['p95_ms']:>9.3f} ms")
+
+        if opts["solo"] in (None, "lectura"):
+            self.stdout.write(f"Lectura del listado ({opts['lectura_filas']} filas)...")
+            r = resultado["lectura"] = benchmarks.lectura(opts["lectura_filas"])
+            for nombre in ("serializer", "rapida"):
+                self.stdout.write(f"  {nombre:<12} p50={r[nombre]['p50_ms']:>9.1f} ms  "
+                                  f"{r[nombre]['filas_por_seg']:>10} filas/s")
+            self.stdout.write(f"  {r['aceleracion']}x, bytes idénticos: {'sí' if r['identico'] else 'NO'}")
+
+    def _tabla(self, carga: dict) -> None:
+        for nombre, r in [("TOTAL", carga["total"]), *carga["endpoints"].items()]:
+            if not r.get("n"):
+                continue
+            self.stdout.write(
+                f"  {nombre:<14} n={r['n']:<6} err={r['errores']:<4} p50={r['p50_ms']:>8.1f} ms  "
+                f"p95={r['p95_ms']:>8.1f} ms  p99={r['p99_ms']:>8.1f} ms  {r['por_seg']:>8.1f} req/s"
+            )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from registro.jobs import procesar_job, reencolar_atascados
+from registro.models import BadgeJob
+
+
+class Command(BaseCommand):
+    help = "Genera los gafetes pendientes de la cola asíncrona (BadgeJob)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true",
+                            help="Seguir revisando la cola en lugar de terminar al vaciarla.")
+        parser.add_argument("--intervalo", type=float, default=2.0,
+                            help="Segundos de espera entre revisiones con --loop.")
+        parser.add_argument("--reintentar-errores", action="store_true",
+                            help="Regresar a PENDIENTE los trabajos en ERROR antes de empezar.")
+
+    def handle(self, *args, **opts):
+        if opts["reintentar_errores"]:
+            n = BadgeJob.objects.filter(status=BadgeJob.ERROR).update(status=BadgeJob.PENDIENTE)
+            self.stdout.write(f"{n} trabajo(s) con error regresados a la cola")
+
+        total = 0
+        while True:
+            reencolados = reencolar_atascados()
+            if reencolados:
+                self.stdout.write(f"{reencolados} trabajo(s) atascados en PROCESANDO regresados a la cola")
+            pendientes = list(BadgeJob.objects
+                              .filter(status=BadgeJob.PENDIENTE)
+                              .order_by("id")
+                              .values_list("id", flat=True)[:100])
+            for job_id in pendientes:
+                if procesar_job(job_id):
+                    total += 1
+            if pendientes:
+                continue
+            if not opts["loop"]:
+                break
+            time.sleep(opts["intervalo"])
+
+        self.stdout.write(self.style.SUCCESS(f"{total} gafete(s) procesados"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from registro import pdf_cache
+
+
+class Command(BaseCommand):
+    help = "Purga la caché de PDFs de reimpresión por antigüedad y tamaño."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-mb", type=float, default=None,
+                            help="Tamaño máximo de la carpeta (default: MARATON_PDF_CACHE_MAX_MB).")
+        parser.add_argument("--max-dias", type=float, default=None,
+                            help="Antigüedad máxima (default: MARATON_PDF_CACHE_MAX_DIAS).")
+
+    def handle(self, *args, **opts):
+        n = pdf_cache.purgar(max_mb=opts["max_mb"], max_dias=opts["max_dias"])
+        self.stdout.write(self.style.SUCCESS(f"{n} PDF(s) eliminados de {pdf_cache.cache_dir()} (storage 'gafetes')"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from registro.stats import reconciliar
+
+
+class Command(BaseCommand):
+    help = "Recalcula los contadores de estadísticas desde cero y reporta las diferencias."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--solo-revisar", action="store_true",
+                            help="Solo reporta diferencias, no corrige.")
+
+    def handle(self, *args, **opts):
+        drift = reconciliar(aplicar=not opts["solo_revisar"])
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Contadores al día: sin diferencias"))
+            return
+
+        for clave, (contador, real) in sorted(drift.items(), key=lambda kv: str(kv[0])):
+            self.stdout.write(f"{clave}: contador={contador} real={real} ({real - contador:+d})")
+        accion = "reportadas" if opts["solo_revisar"] else "corregidas"
+        self.stdout.write(self.style.WARNING(f"{len(drift)} diferencia(s) {accion}"))
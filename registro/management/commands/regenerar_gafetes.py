@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from registro import pdf_cache, pdf_storage
+from registro.filters import FiltroInvalido, filtrar_participantes
+from registro.models import Participant
+from registro.pdf_generator import generar_credencial_pdf
+
+
+def _iniciar_worker():
+    # Con spawn (macOS/Windows) el hijo arranca sin Django configurado
+    import django
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "maraton_backend.settings")
+    django.setup()
+
+
+def _renderizar_lote(ids, destino_dir=None):
+    """
+    Genera los gafetes de `ids`. Sin destino_dir usa la caché de PDFs
+    (si la huella ya existe no se vuelve a dibujar); con destino_dir
+    siempre dibuja ahí (modo --medir). Devuelve [(clave, nombre, reusado)]:
+    nombre en el storage "gafetes" o ruta local en modo --medir.
+    """
+    hechos = []
+    for p in Participant.objects.filter(pk__in=ids).order_by("id"):
+        if destino_dir:
+            path = generar_credencial_pdf(p, pdf_path=os.path.join(destino_dir, f"{p.clave or p.pk}.pdf"))
+            hechos.append((p.clave or str(p.pk), path, False))
+        else:
+            nombre, _, hit = pdf_cache.obtener_pdf(p)
+            hechos.append((p.clave or str(p.pk), nombre, hit))
+    connections.close_all()
+    return hechos
+
+
+def _lotes(ids, tam):
+    for i in range(0, len(ids), tam):
+        yield ids[i:i + tam]
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenera los gafetes en paralelo (un proceso por núcleo). Es reanudable: "
+        "los folios cuyo PDF en caché ya corresponde a sus datos y a la plantilla se omiten."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Procesos a usar (1 = sin pool).")
+        parser.add_argument("--lote", type=int, default=100,
+                            help="Participantes por tarea enviada a cada proceso.")
+        parser.add_argument("--zip", dest="zip_path",
+                            help="Además empaqueta los PDFs en este .zip (<folio>.pdf).")
+        parser.add_argument("--forzar", action="store_true",
+                            help="Borra los PDFs en caché de los seleccionados antes de empezar.")
+        parser.add_argument("--medir", metavar="N,N,...",
+                            help="Solo mide: dibuja todo con cada número de workers "
+                                 "(en un temporal) y reporta gafetes/seg.")
+        parser.add_argument("--plantel")
+        parser.add_argument("--role")
+        parser.add_argument("--desde")
+        parser.add_argument("--hasta")
+        parser.add_argument("--folios")
+
+    def handle(self, *args, **opts):
+        try:
+            qs = filtrar_participantes(Participant.objects.all(), opts)
+        except FiltroInvalido as e:
+            raise CommandError(str(e))
+        ids = list(qs.order_by("id").values_list("id", flat=True))
+        if not ids:
+            raise CommandError("Sin participantes para esos filtros")
+
+        if opts["medir"]:
+            for n in [int(x) for x in opts["medir"].split(",") if x.strip()]:
+                with tempfile.TemporaryDirectory() as tmp:
+                    inicio = time.perf_counter()
+                    self._ejecutar(ids, n, opts["lote"], tmp)
+                    seg = time.perf_counter() - inicio
+                self.stdout.write(
+                    f"workers={n:<3} gafetes={len(ids)} tiempo={seg:.2f}s "
+                    f"gafetes/seg={len(ids) / seg:.1f}"
+                )
+            return
+
+        if opts["forzar"]:
+            for p in Participant.objects.filter(pk__in=ids).only("id", "clave"):
+                pdf_cache.invalidar(p)
+
+        inicio = time.perf_counter()
+        hechos = self._ejecutar(ids, opts["workers"], opts["lote"], None)
+        seg = time.perf_counter() - inicio
+        reusados = sum(1 for _, _, hit in hechos if hit)
+
+        if opts["zip_path"]:
+            st = pdf_storage.storage()
+            with zipfile.ZipFile(opts["zip_path"], "w", zipfile.ZIP_STORED) as zf:
+                for clave, nombre, _ in sorted(hechos):
+                    with st.open(nombre, "rb") as f, zf.open(f"{clave}.pdf", "w") as dest:
+                        shutil.copyfileobj(f, dest)
+
+        nuevos = len(hechos) - reusados
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(hechos)} gafete(s): {nuevos} generados, {reusados} ya estaban al día "
+            f"({seg:.2f}s, {nuevos / seg if seg else 0:.1f} gafetes/seg con {opts['workers']} worker(s))"
+        ))
+
+    def _ejecutar(self, ids, workers, tam_lote, destino_dir):
+        if workers <= 1:
+            hechos = []
+            for lote in _lotes(ids, tam_lote):
+                hechos.extend(_renderizar_lote(lote, destino_dir))
+            return hechos
+
+        connections.close_all()  # que los hijos no hereden conexiones abiertas
+        hechos = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker) as pool:
+            futuros = [pool.submit(_renderizar_lote, lote, destino_dir)
+                       for lote in _lotes(ids, tam_lote)]
+            for f in as_completed(futuros):
+                hechos.extend(f.result())
+        return hechos
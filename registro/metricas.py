@@ -0,0 +1,189 @@
+# registro/metricas.py
+"""
+Métricas en memoria con salida en formato de texto de Prometheus (/metrics).
+
+Histogramas y contadores con buckets fijos: registrar una observación es
+buscar el bucket y sumar bajo un candado, así que se puede dejar activo en
+producción.
+
+Los valores son de cada worker y no se juntan entre procesos. Solo son
+consistentes con un solo worker (WEB_CONCURRENCY=1 o `gunicorn -w 1`).
+Con varios, todos escuchan en el mismo puerto: cada scrape de /metrics lo
+contesta un worker cualquiera, los contadores saltan de uno a otro y
+sumarlos en Prometheus no lo arregla.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple, buckets: tuple):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = buckets
+        self._series = {}  # valores de etiquetas → [conteos por bucket, suma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *etiquetas) -> None:
+        i = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self) -> list[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for valores, (conteos, suma, total) in sorted(series.items()):
+            base = _etiquetas(self.etiquetas, valores)
+            acumulado = 0
+            for le, n in zip(self.buckets, conteos):
+                acumulado += n
+                lineas.append(f'{self.nombre}_bucket{{{base}{"," if base else ""}le="{le}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_bucket{{{base}{"," if base else ""}le="+Inf"}} {total}')
+            lineas.append(f"{_serie(self.nombre + '_sum', base)} {suma}")
+            lineas.append(f"{_serie(self.nombre + '_count', base)} {total}")
+        return lineas
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def sumar(self, *etiquetas, n: float = 1) -> None:
+        with self._lock:
+            self._series[etiquetas] = self._series.get(etiquetas, 0) + n
+
+    def exponer(self) -> list[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        with self._lock:
+            series = dict(self._series)
+        for valores, n in sorted(series.items()):
+            lineas.append(f"{_serie(self.nombre, _etiquetas(self.etiquetas, valores))} {n}")
+        return lineas
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Indicador(Contador):
+    """Valor que sube y baja (gauge), p. ej. requests en cola."""
+    tipo = "gauge"
+
+    def fijar(self, valor: float, *etiquetas) -> None:
+        with self._lock:
+            self._series[etiquetas] = valor
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(nombres, valores) -> str:
+    return ",".join(f'{k}="{_escapar(v)}"' for k, v in zip(nombres, valores))
+
+
+def _serie(nombre: str, etiquetas: str) -> str:
+    return f"{nombre}{{{etiquetas}}}" if etiquetas else nombre
+
+
+# =======================
+# Métricas de la app
+# =======================
+
+LATENCIA = Histograma(
+    "maraton_http_request_duration_seconds", "Tiempo de respuesta por endpoint.",
+    ("endpoint", "method", "status"), BUCKETS_SEGUNDOS,
+)
+CONSULTAS = Histograma(
+    "maraton_http_db_queries", "Consultas SQL por request.",
+    ("endpoint",), BUCKETS_CONSULTAS,
+)
+TIEMPO_DB = Histograma(
+    "maraton_http_db_duration_seconds", "Tiempo en la base de datos por request.",
+    ("endpoint",), BUCKETS_SEGUNDOS,
+)
+TAMANO = Histograma(
+    "maraton_http_response_size_bytes", "Tamaño del cuerpo de la respuesta.",
+    ("endpoint",), BUCKETS_BYTES,
+)
+LENTOS = Contador(
+    "maraton_http_slow_requests_total", "Requests arriba de MARATON_SLOW_REQUEST_MS.",
+    ("endpoint",),
+)
+PDF_FASES = Histograma(
+    "maraton_pdf_render_duration_seconds",
+    "Tiempo de render del gafete por fase (imagenes, dibujo, guardado).",
+    ("fase",), BUCKETS_SEGUNDOS,
+)
+
+ADMISION_EN_CURSO = Indicador(
+    "maraton_admision_en_curso", "Requests admitidos en las rutas con control de admisión (este proceso).", (),
+)
+ADMISION_COLA = Indicador(
+    "maraton_admision_cola", "Requests esperando turno en la cola de admisión (este proceso).", (),
+)
+ADMISION_ESPERA = Histograma(
+    "maraton_admision_espera_seconds", "Tiempo en la cola de admisión de los requests admitidos.",
+    (), BUCKETS_SEGUNDOS,
+)
+ADMISION_RECHAZOS = Contador(
+    "maraton_admision_rechazos_total",
+    "Requests rechazados por el control de admisión (cliente=429, cola_llena/espera=503).",
+    ("motivo",),
+)
+
+REPLICA_FALLAS = Contador(
+    "maraton_replica_fallas_total", "Veces que la réplica de lectura falló y se leyó de la primaria.", (),
+)
+
+SSE_CLIENTES = Indicador(
+    "maraton_sse_clientes", "Tableros conectados al flujo de estadísticas en vivo (este proceso).", (),
+)
+
+TODAS = (LATENCIA, CONSULTAS, TIEMPO_DB, TAMANO, LENTOS, PDF_FASES,
+         ADMISION_EN_CURSO, ADMISION_COLA, ADMISION_ESPERA, ADMISION_RECHAZOS, REPLICA_FALLAS,
+         SSE_CLIENTES)
+
+
+@contextmanager
+def cronometro(histograma: Histograma, *etiquetas):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        histograma.observar(time.perf_counter() - inicio, *etiquetas)
+
+
+def exponer() -> str:
+    lineas = []
+    for m in TODAS:
+        lineas.extend(m.exponer())
+    return "\n".join(lineas) + "\n"
+
+
+def limpiar() -> None:
+    for m in TODAS:
+        m.limpiar()
@@ -0,0 +1,355 @@
+# registro/middleware.py
+"""
+Instrumentación por request (métricas en registro/metricas.py).
+
+Por endpoint (nombre de la ruta: register, participants_list, ...) mide la
+latencia, cuántas consultas SQL hizo y cuánto tardaron y el tamaño de la
+respuesta. En las respuestas en streaming (CSV, PDFs) el tamaño se cuenta
+conforme se envían los bloques; la latencia y las consultas cubren hasta
+que la vista devuelve la respuesta.
+
+Las consultas se cuentan con un execute_wrapper que signals.py instala en
+cada conexión nueva y que reporta al medidor del request actual
+(ContextVar). Así se cuentan también las de vistas async, que corren en
+otros hilos vía sync_to_async.
+
+Con MARATON_SLOW_REQUEST_MS > 0, los requests más lentos se registran en
+el log "registro.lentos" con sus consultas SQL.
+
+AdmisionMiddleware aplica el control de admisión de admision.py y
+ReplicaMiddleware elige la base de lectura de cada request (replica.py).
+
+Bajo ASGI todos estos middlewares son async: no obligan a las vistas async a
+correr en un hilo. Las respuestas en streaming de vistas síncronas (CSV,
+FileResponse) se envían bloque por bloque desde un hilo; Django, en cambio,
+las leería completas a memoria antes de enviarlas.
+"""
+import logging
+import math
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import InterfaceError, OperationalError
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import admision, metricas, replica
+
+logger = logging.getLogger("registro.lentos")
+
+# Consultas que se guardan para el log de requests lentos
+MAX_SQL_LOG = 50
+
+_medidor_actual = ContextVar("medidor_db", default=None)
+
+
+class _MedidorDB:
+    def __init__(self, guardar_sql: bool):
+        self.consultas = 0
+        self.segundos = 0.0
+        self.sql = [] if guardar_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            dur = time.perf_counter() - inicio
+            self.consultas += 1
+            self.segundos += dur
+            if self.sql is not None and len(self.sql) < MAX_SQL_LOG:
+                self.sql.append((dur, sql))
+
+
+def _medir_consulta(execute, sql, params, many, context):
+    medidor = _medidor_actual.get()
+    if medidor is None:
+        return execute(sql, params, many, context)
+    return medidor(execute, sql, params, many, context)
+
+
+def instalar_medidor(conexion) -> None:
+    """Se llama para cada conexión nueva (signals.py)."""
+    if _medir_consulta not in conexion.execute_wrappers:
+        conexion.execute_wrappers.append(_medir_consulta)
+
+
+def _contar_bytes(bloques, endpoint):
+    total = 0
+    try:
+        for bloque in bloques:
+            total += len(bloque)
+            yield bloque
+    finally:
+        if endpoint is not None:
+            metricas.TAMANO.observar(total, endpoint)
+
+
+async def _contar_bytes_async(bloques, endpoint):
+    total = 0
+    try:
+        async for bloque in bloques:
+            total += len(bloque)
+            yield bloque
+    finally:
+        metricas.TAMANO.observar(total, endpoint)
+
+
+_FIN = object()
+
+
+async def _bloques_async(bloques, endpoint):
+    """Itera bloques síncronos (p. ej. un cursor de la BD) sin bloquear el event loop."""
+    it = iter(bloques)
+    siguiente = sync_to_async(next)  # mismo hilo que la vista: el cursor sigue vivo
+    total = 0
+    try:
+        while (bloque := await siguiente(it, _FIN)) is not _FIN:
+            total += len(bloque)
+            yield bloque
+    finally:
+        if hasattr(it, "close"):
+            await sync_to_async(it.close)()
+        if endpoint is not None:
+            metricas.TAMANO.observar(total, endpoint)
+
+
+class MetricasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        if not settings.MARATON_METRICAS:
+            return self.get_response(request)
+
+        medidor = _MedidorDB(guardar_sql=settings.MARATON_SLOW_REQUEST_MS > 0)
+        token = _medidor_actual.set(medidor)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medidor_actual.reset(token)
+        endpoint = self._observar(request, response, time.perf_counter() - inicio, medidor)
+        if response.streaming:
+            response.streaming_content = _contar_bytes(response.streaming_content, endpoint)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.MARATON_METRICAS:
+            response = await self.get_response(request)
+            if response.streaming and not response.is_async:
+                response.streaming_content = _bloques_async(response.streaming_content, None)
+            return response
+
+        medidor = _MedidorDB(guardar_sql=settings.MARATON_SLOW_REQUEST_MS > 0)
+        token = _medidor_actual.set(medidor)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medidor_actual.reset(token)
+        endpoint = self._observar(request, response, time.perf_counter() - inicio, medidor)
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = _contar_bytes_async(response.streaming_content, endpoint)
+            else:
+                response.streaming_content = _bloques_async(response.streaming_content, endpoint)
+        return response
+
+    def _observar(self, request, response, dur: float, medidor: _MedidorDB) -> str:
+        match = getattr(request, "resolver_match", None)
+        endpoint = (match.url_name if match else None) or "otro"
+        metricas.LATENCIA.observar(dur, endpoint, request.method, f"{response.status_code // 100}xx")
+        metricas.CONSULTAS.observar(medidor.consultas, endpoint)
+        metricas.TIEMPO_DB.observar(medidor.segundos, endpoint)
+        if not response.streaming:
+            metricas.TAMANO.observar(len(response.content), endpoint)
+
+        umbral = settings.MARATON_SLOW_REQUEST_MS / 1000
+        if umbral and dur >= umbral:
+            metricas.LENTOS.sumar(endpoint)
+            logger.warning(
+                "SLOW_REQUEST %s %s %s %.0f ms, %d consultas (%.0f ms en DB)\n%s",
+                request.method, request.get_full_path(), response.status_code,
+                dur * 1000, medidor.consultas, medidor.segundos * 1000,
+                "\n".join(f"  {d * 1000:.1f} ms  {sql}" for d, sql in medidor.sql),
+            )
+        return endpoint
+
+
+_rutas_cache = {}
+
+
+def _nombre_ruta(request) -> str | None:
+    """
+    url_name del request (resolve con caché por path). Deja
+    request.resolver_match puesto para que una respuesta que no llega a la
+    vista (p. ej. un 503 de admisión) se mida con el nombre del endpoint.
+    """
+    path = request.path_info
+    match = _rutas_cache.get(path, False)
+    if match is False:
+        try:
+            match = resolve(path)
+        except Resolver404:
+            match = None
+        if len(_rutas_cache) < 1024:
+            _rutas_cache[path] = match
+    if match is None:
+        return None
+    request.resolver_match = match
+    return match.url_name
+
+
+def _respuesta_rechazo(rechazo: admision.Rechazo) -> JsonResponse:
+    metricas.ADMISION_RECHAZOS.sumar(rechazo.motivo)
+    if rechazo.motivo == "cliente":
+        resp = JsonResponse({"detail": "Demasiadas solicitudes, intenta de nuevo en unos segundos"}, status=429)
+    else:
+        resp = JsonResponse({"detail": "Registro saturado, intenta de nuevo en unos segundos"}, status=503)
+    resp["Retry-After"] = str(max(1, math.ceil(rechazo.reintentar)))
+    return resp
+
+
+class AdmisionMiddleware:
+    """
+    Control de admisión (admision.py) en register/reprint/lote: token bucket
+    por cliente (429) y lugares limitados con cola corta (503), con
+    Retry-After.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        if not admision.aplica(_nombre_ruta(request)):
+            return self.get_response(request)
+
+        compuerta = admision.compuerta()
+        try:
+            compuerta.pedir_token(admision.cliente(request))
+            compuerta.entrar()
+        except admision.Rechazo as r:
+            return _respuesta_rechazo(r)
+        try:
+            return self.get_response(request)
+        finally:
+            compuerta.salir()
+
+    async def __acall__(self, request):
+        if not admision.aplica(_nombre_ruta(request)):
+            return await self.get_response(request)
+
+        compuerta = admision.compuerta()
+        try:
+            compuerta.pedir_token(admision.cliente(request))
+            await compuerta.aentrar()
+        except admision.Rechazo as r:
+            return _respuesta_rechazo(r)
+        try:
+            return await self.get_response(request)
+        finally:
+            compuerta.salir()
+
+
+class ReplicaMiddleware:
+    """
+    Con REPLICA_DATABASE_URL: las rutas de MARATON_REPLICA_RUTAS leen de la
+    réplica (replica.py), la cookie COOKIE_FIJAR manda al cliente a la
+    primaria después de escribir y un error de la réplica repite la vista
+    en la primaria (no aplica a las respuestas que se transmiten: esas rutas
+    leen siempre de la primaria, replica.SOLO_PRIMARIA_RUTAS).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        if not replica.configurada():
+            return self.get_response(request)
+        with self._lectura(request) as estado:
+            response = self.get_response(request)
+        return self._fijar(response, estado)
+
+    async def __acall__(self, request):
+        if not replica.configurada():
+            return await self.get_response(request)
+        with self._lectura(request) as estado:
+            response = await self.get_response(request)
+        return self._fijar(response, estado)
+
+    def _lectura(self, request):
+        ruta = _nombre_ruta(request)
+        return replica.lectura(
+            request.method in ("GET", "HEAD") and ruta in settings.MARATON_REPLICA_RUTAS
+            and ruta not in replica.SOLO_PRIMARIA_RUTAS,
+            fijada=replica.COOKIE_FIJAR in request.COOKIES,
+        )
+
+    def _fijar(self, response, estado: replica.EstadoLectura):
+        if estado.escribio:
+            response.set_cookie(replica.COOKIE_FIJAR, "1", max_age=settings.MARATON_REPLICA_FIJAR_S,
+                                secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite="Lax")
+        return response
+
+    def process_exception(self, request, exception):
+        estado = replica.estado()
+        if (estado is None or not estado.uso_replica
+                or not isinstance(exception, (OperationalError, InterfaceError))):
+            return None
+        replica.marcar_caida(exception)
+        # La vista no escribió nada (solo GET/HEAD leen de la réplica): se repite en la primaria
+        estado.replica = False
+        match = request.resolver_match
+        return match.func(request, *match.args, **match.kwargs)
+
+
+class EstaticosMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise que bajo ASGI deja pasar los requests sin salir del event loop."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
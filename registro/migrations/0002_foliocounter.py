@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:00
+
+import re
+
+from django.db import migrations, models
+
+FOLIO_RE = re.compile(r"^(.*?)(\d+)$")
+
+
+def sembrar_contadores(apps, schema_editor):
+    """Crea un contador por prefijo con el número más alto ya usado."""
+    Participant = apps.get_model("registro", "Participant")
+    FolioCounter = apps.get_model("registro", "FolioCounter")
+
+    maximos = {}
+    claves = (Participant.objects
+              .exclude(clave__isnull=True)
+              .exclude(clave__exact="")
+              .values_list("clave", flat=True)
+              .iterator())
+    for clave in claves:
+        m = FOLIO_RE.match(clave)
+        if m:
+            prefijo, n = m.group(1), int(m.group(2))
+            maximos[prefijo] = max(maximos.get(prefijo, 0), n)
+
+    FolioCounter.objects.bulk_create(
+        [FolioCounter(prefijo=p, ultimo=n) for p, n in maximos.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registro', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FolioCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefijo', models.CharField(max_length=50, unique=True)),
+                ('ultimo', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(sembrar_contadores, migrations.RunPython.noop),
+    ]
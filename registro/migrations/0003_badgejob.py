@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registro', '0002_foliocounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BadgeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('LISTO', 'Listo'), ('ERROR', 'Error')], default='PENDIENTE', max_length=20)),
+                ('pdf_path', models.CharField(blank=True, default='', max_length=500)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('participant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='badge_jobs', to='registro.participant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='registro_ba_status_194ae8_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:45
+
+from datetime import timezone as dt_timezone
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+
+def sembrar_contadores(apps, schema_editor):
+    Participant = apps.get_model("registro", "Participant")
+    ParticipantStat = apps.get_model("registro", "ParticipantStat")
+    RegistrationHour = apps.get_model("registro", "RegistrationHour")
+
+    ParticipantStat.objects.bulk_create(
+        ParticipantStat(plantel=r["plantel"], role=r["role"], total=r["n"])
+        for r in Participant.objects.values("plantel", "role").annotate(n=Count("id"))
+    )
+    RegistrationHour.objects.bulk_create(
+        RegistrationHour(hora=r["h"], total=r["n"])
+        for r in (Participant.objects
+                  .annotate(h=TruncHour("created_at", tzinfo=dt_timezone.utc))
+                  .values("h").annotate(n=Count("id")))
+        if r["h"] is not None
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registro', '0003_badgejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistrationHour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField(unique=True)),
+                ('total', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ParticipantStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('plantel', models.CharField(max_length=50)),
+                ('role', models.CharField(max_length=80)),
+                ('total', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('plantel', 'role'), name='uniq_stat_plantel_role')],
+            },
+        ),
+        migrations.RunPython(sembrar_contadores, migrations.RunPython.noop),
+    ]
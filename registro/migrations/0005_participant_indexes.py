@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:47
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registro', '0004_stats_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['-created_at', '-id'], name='part_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['plantel', '-created_at', '-id'], name='part_plantel_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['plantel', 'role', 'full_name'], name='part_plantel_role_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(django.db.models.functions.text.Upper('clave'), name='part_clave_upper_idx'),
+        ),
+    ]
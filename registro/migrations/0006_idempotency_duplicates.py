@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:50
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _normalizar(texto):
+    sin_acentos = "".join(
+        ch for ch in unicodedata.normalize("NFKD", texto or "")
+        if not unicodedata.combining(ch)
+    )
+    return " ".join(sin_acentos.casefold().split())
+
+
+def llenar_nombre_clave(apps, schema_editor):
+    Participant = apps.get_model("registro", "Participant")
+    pendientes = []
+    for p in Participant.objects.only("id", "full_name", "child_name", "plantel").iterator(chunk_size=2000):
+        p.nombre_clave = "|".join([_normalizar(p.full_name), _normalizar(p.child_name), _normalizar(p.plantel)])
+        pendientes.append(p)
+        if len(pendientes) >= 2000:
+            Participant.objects.bulk_update(pendientes, ["nombre_clave"])
+            pendientes = []
+    if pendientes:
+        Participant.objects.bulk_update(pendientes, ["nombre_clave"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registro', '0005_participant_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='nombre_clave',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=460),
+        ),
+        migrations.RunPython(llenar_nombre_clave, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='RegistrationKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('request_hash', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('participant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='registration_keys', to='registro.participant')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registro', '0006_idempotency_duplicates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckIn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estacion', models.CharField(max_length=50)),
+                ('llegada', models.DateTimeField()),
+                ('recibido_at', models.DateTimeField(auto_now_add=True)),
+                ('participant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkins', to='registro.participant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estacion', '-llegada'], name='checkin_estacion_llegada_idx')],
+                'constraints': [models.UniqueConstraint(fields=('participant', 'estacion'), name='uniq_checkin_estacion')],
+            },
+        ),
+    ]
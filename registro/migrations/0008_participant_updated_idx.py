@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registro', '0007_checkin'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['-updated_at'], name='part_updated_idx'),
+        ),
+    ]
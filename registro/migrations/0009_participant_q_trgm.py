@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# Búsqueda q del listado/CSV: icontains en nombre, alumno y folio. Django lo
+# traduce a UPPER(col::text) LIKE UPPER('%...%'), que un B-tree no cubre; en
+# Postgres lo cubre un GIN de trigramas con las mismas expresiones. En SQLite
+# no hay equivalente y la migración no hace nada.
+CREAR = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS part_q_trgm_idx ON registro_participant USING gin (
+    (UPPER("full_name"::text)) gin_trgm_ops,
+    (UPPER("child_name"::text)) gin_trgm_ops,
+    (UPPER("clave"::text)) gin_trgm_ops
+);
+"""
+BORRAR = "DROP INDEX IF EXISTS part_q_trgm_idx;"
+
+
+def crear(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREAR)
+
+
+def borrar(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(BORRAR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registro', '0008_participant_updated_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear, borrar),
+    ]
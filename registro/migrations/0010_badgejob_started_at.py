@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registro', '0009_participant_q_trgm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='badgejob',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,7 @@
+import unicodedata
+
 from django.db import models
-import re
+from django.db.models.functions import Upper
 
 PLANTEL_CHOICES = [
     ("Primaria", "Primaria"),
@@ -21,6 +23,20 @@ ROLE_CHOICES = [
     ("ALUMNOS LMA PREPH","ALUMNOS LMA Preparatoria (hombres)"),
     ("ALUMNOS LMA PREPM","ALUMNOS LMA Preparatoria (mujeres)"),
 ]
+def normalizar_nombre(texto: str) -> str:
+    """Sin acentos, sin mayúsculas y con espacios simples: "  José  NÚÑEZ" → "jose nunez"."""
+    sin_acentos = "".join(
+        ch for ch in unicodedata.normalize("NFKD", texto or "")
+        if not unicodedata.combining(ch)
+    )
+    return " ".join(sin_acentos.casefold().split())
+
+
+def clave_duplicado(full_name: str, child_name: str, plantel: str) -> str:
+    """Llave para detectar registros repetidos (adulto + alumno + plantel)."""
+    return "|".join([normalizar_nombre(full_name), normalizar_nombre(child_name), normalizar_nombre(plantel)])
+
+
 class Participant(models.Model):
     full_name = models.CharField(max_length=200)
     plantel = models.CharField(max_length=50)
@@ -35,24 +51,132 @@ class Participant(models.Model):
     updated_at = models.DateTimeField(auto_now=True) 
     # (NO pongas updated_at si ya te dio guerra)
 
+    # Nombre normalizado para detectar duplicados (ver clave_duplicado)
+    nombre_clave = models.CharField(max_length=460, blank=True, default="", db_index=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Listado: ORDER BY -created_at, -id (cursor), con o sin plantel
+            models.Index(fields=["-created_at", "-id"], name="part_created_id_idx"),
+            models.Index(fields=["plantel", "-created_at", "-id"], name="part_plantel_created_idx"),
+            # CSV: ORDER BY plantel, role, full_name (y GROUP BY plantel, role)
+            models.Index(fields=["plantel", "role", "full_name"], name="part_plantel_role_name_idx"),
+            # Reimpresión: búsqueda de folio sin importar mayúsculas
+            models.Index(Upper("clave"), name="part_clave_upper_idx"),
+            # ETag del listado: el updated_at más reciente
+            models.Index(fields=["-updated_at"], name="part_updated_idx"),
+        ]
+
     def __str__(self):
         return f"{self.full_name} ({self.plantel})"
 
         return f"{self.full_name} - {self.clave or ''}"
 
     def save(self, *args, **kwargs):
-        creating = self.pk is None
-        super().save(*args, **kwargs)  # obtener id
-        if creating and not self.clave:
-            prefix_map = {"Primaria": "Primaria", "Secundaria": "Secundaria", "Preparatoria": "Prepa"}
-            prefix = prefix_map.get(self.plantel, "GEN")
-
-            last = Participant.objects.filter(clave__startswith=prefix).order_by("-id").first()
-            num = 1
-            if last and last.clave:
-                m = re.search(r"(\d+)$", last.clave)
-                if m:
-                    num = int(m.group(1)) + 1
-
-            self.clave = f"{prefix}{num:04d}"
-            super().save(update_fields=["clave"])
+        # Folio: un solo camino de asignación (ver registro/folios.py)
+        if self.pk is None and not self.clave:
+            from .folios import asignar_folio
+            self.clave = asignar_folio(self.plantel)
+        self.nombre_clave = clave_duplicado(self.full_name, self.child_name, self.plantel)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"full_name", "child_name", "plantel"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"nombre_clave"}
+        super().save(*args, **kwargs)
+
+
+class FolioCounter(models.Model):
+    """
+    Último número de folio entregado por prefijo (uno por plantel).
+    Se incrementa con F() dentro de una transacción: la fila queda bloqueada
+    hasta el commit, así dos registros simultáneos nunca obtienen el mismo folio.
+    """
+    prefijo = models.CharField(max_length=50, unique=True)
+    ultimo = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.prefijo}: {self.ultimo}"
+
+
+class BadgeJob(models.Model):
+    """Gafete pendiente de generar cuando el registro corre en modo asíncrono."""
+    PENDIENTE = "PENDIENTE"
+    PROCESANDO = "PROCESANDO"
+    LISTO = "LISTO"
+    ERROR = "ERROR"
+    STATUS_CHOICES = [
+        (PENDIENTE, "Pendiente"),
+        (PROCESANDO, "Procesando"),
+        (LISTO, "Listo"),
+        (ERROR, "Error"),
+    ]
+
+    participant = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name="badge_jobs")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDIENTE)
+    pdf_path = models.CharField(max_length=500, blank=True, default="")
+    error = models.TextField(blank=True, default="")
+    # Cuándo lo tomó un worker (PROCESANDO); sirve para reencolar los atascados
+    started_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "id"])]
+
+    def __str__(self):
+        return f"{self.participant_id} [{self.status}]"
+
+
+class ParticipantStat(models.Model):
+    """Conteo de participantes por (plantel, rol); lo mantiene registro/stats.py."""
+    plantel = models.CharField(max_length=50)
+    role = models.CharField(max_length=80)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["plantel", "role"], name="uniq_stat_plantel_role"),
+        ]
+
+    def __str__(self):
+        return f"{self.plantel} / {self.role}: {self.total}"
+
+
+class RegistrationHour(models.Model):
+    """Registros por hora (UTC, truncada a la hora)."""
+    hora = models.DateTimeField(unique=True)
+    total = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.hora:%Y-%m-%d %H}h: {self.total}"
+
+
+class RegistrationKey(models.Model):
+    """
+    Idempotency-Key de /api/register/: un reintento con la misma llave
+    devuelve el mismo participante en lugar de crear otro.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    request_hash = models.CharField(max_length=64)
+    participant = models.ForeignKey(Participant, null=True, blank=True, on_delete=models.CASCADE,
+                                    related_name="registration_keys")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+
+class CheckIn(models.Model):
+    """Llegada de un participante a una estación el día del evento (una por estación)."""
+    participant = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name="checkins")
+    estacion = models.CharField(max_length=50)
+    llegada = models.DateTimeField()
+    recibido_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["participant", "estacion"], name="uniq_checkin_estacion"),
+        ]
+        indexes = [models.Index(fields=["estacion", "-llegada"], name="checkin_estacion_llegada_idx")]
+
+    def __str__(self):
+        return f"{self.participant_id} @ {self.estacion}"
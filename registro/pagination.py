@@ -0,0 +1,10 @@
+# registro/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class ParticipantCursorPagination(CursorPagination):
+    """Cursor sobre (-created_at, -id): el costo no crece con la página."""
+    ordering = ("-created_at", "-id")
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 500
@@ -0,0 +1,142 @@
+# registro/pdf_assets.py
+"""
+Caché de imágenes del gafete (logo LMA, zorro y marca de agua).
+
+Cada imagen se lee una sola vez por proceso, se reduce al tamaño exacto
+(en puntos) en que se dibuja y se guarda ya decodificada en un ImageReader.
+Así cada gafete no vuelve a abrir, decodificar ni hashear el PNG original
+(el zorro pesa 2.4 MB). Si el archivo cambia (mtime), se vuelve a cargar.
+
+Además se guarda el image XObject ya comprimido (registrar_imagen): cada PDF
+individual lleva su propia copia del fondo, pero sin volver a comprimir ni
+hashear los pixeles (eran dos tercios del tiempo de un gafete).
+"""
+import copy
+import os
+import threading
+import time
+import weakref
+
+from PIL import Image
+from django.conf import settings
+from reportlab import rl_config
+from reportlab.lib.utils import ImageReader, _digester
+from reportlab.pdfbase import pdfdoc
+
+_cache = {}
+_lock = threading.Lock()
+_xobjetos = weakref.WeakKeyDictionary()  # ImageReader → (useA85, nombre, XObject, máscara)
+_local = threading.local()  # segundos acumulados en imagen_gafete (métricas)
+
+
+def _escalar(path: str, ancho_pt: float, alto_pt: float) -> Image.Image:
+    """Reduce la imagen a la caja (misma proporción, como preserveAspectRatio)."""
+    with Image.open(path) as im:
+        im.load()
+        escala = min(ancho_pt / im.width, alto_pt / im.height)
+        px_por_pt = settings.MARATON_PDF_IMAGE_DPI / 72.0
+        w = max(1, round(im.width * escala * px_por_pt))
+        h = max(1, round(im.height * escala * px_por_pt))
+        if w >= im.width or h >= im.height:
+            return im.copy()  # nunca se agranda
+        return im.resize((w, h), Image.LANCZOS)
+
+
+def _aplicar_opacidad(im: Image.Image, opacidad: float) -> Image.Image:
+    """Multiplica el canal alfa (la marca de agua no depende de setFillAlpha)."""
+    im = im.convert("RGBA")
+    alfa = im.getchannel("A").point(lambda a: round(a * opacidad))
+    im.putalpha(alfa)
+    return im
+
+
+def imagen_gafete(nombre: str, ancho_pt: float, alto_pt: float, opacidad: float = 1.0):
+    """
+    ImageReader de static/<nombre> listo para drawImage en una caja de
+    ancho_pt x alto_pt (con `opacidad` < 1 ya aplicada al canal alfa).
+    Devuelve None si el archivo no existe.
+    """
+    inicio = time.perf_counter()
+    try:
+        return _imagen_gafete(nombre, ancho_pt, alto_pt, opacidad)
+    finally:
+        _local.segundos = segundos_carga() + time.perf_counter() - inicio
+
+
+def segundos_carga() -> float:
+    """Tiempo acumulado por este hilo en cargar imágenes del gafete."""
+    return getattr(_local, "segundos", 0.0)
+
+
+def _imagen_gafete(nombre, ancho_pt, alto_pt, opacidad):
+    path = os.path.join(settings.BASE_DIR, "static", nombre)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    key = (path, round(ancho_pt, 2), round(alto_pt, 2), round(opacidad, 3))
+    with _lock:
+        hit = _cache.get(key)
+    if hit and hit[0] == mtime:
+        return hit[1]
+
+    im = _escalar(path, ancho_pt, alto_pt)
+    if opacidad < 1:
+        im = _aplicar_opacidad(im, opacidad)
+    reader = ImageReader(im)
+    reader.getRGBData()  # decodifica ahora (y separa el canal alfa) una sola vez
+    with _lock:
+        _cache[key] = (mtime, reader)
+    return reader
+
+
+def _xobjeto(reader):
+    """
+    El image XObject de `reader` comprimido una sola vez, con el mismo
+    nombre que le daría drawImage(..., mask="auto").
+    """
+    with _lock:
+        hecho = _xobjetos.get(reader)
+    if hecho and hecho[0] == rl_config.useA85:
+        return hecho[1:]
+
+    rgb = reader.getRGBData()  # separa el canal alfa (_dataA)
+    alfa = reader._dataA
+    nombre = _digester(rgb + (alfa.getRGBData() if alfa else b"auto"))
+    xobj = pdfdoc.PDFImageXObject(nombre, reader, mask="auto")
+    xobj.name = nombre
+    mascara = xobj.__dict__.pop("_smask", None)
+    with _lock:
+        _xobjetos[reader] = (rl_config.useA85, nombre, xobj, mascara)
+    return nombre, xobj, mascara
+
+
+def registrar_imagen(c, reader) -> None:
+    """
+    Deja la imagen ya registrada en el documento de `c` (como lo haría
+    drawImage la primera vez) con una copia del XObject comprimido: el
+    drawImage que sigue la encuentra y solo escribe la referencia.
+    """
+    nombre, xobj, mascara = _xobjeto(reader)
+    doc = c._doc
+    nombre_pdf = doc.getXObjectName(nombre)
+    if nombre_pdf in doc.idToObject:
+        return
+    copia = copy.copy(xobj)
+    copia.XObjects = None
+    doc.Reference(copia, nombre_pdf)
+    if mascara is not None:
+        nombre_mascara = doc.getXObjectName(mascara.name)
+        if nombre_mascara in doc.idToObject:
+            copia.smask = pdfdoc.PDFObjectReference(nombre_mascara)
+        else:
+            copia_mascara = copy.copy(mascara)
+            copia_mascara.XObjects = None
+            copia.smask = doc.Reference(copia_mascara, nombre_mascara)
+
+
+def limpiar_cache() -> None:
+    with _lock:
+        _cache.clear()
+        _xobjetos.clear()
@@ -0,0 +1,208 @@
+# registro/pdf_cache.py
+"""
+Caché de PDFs para reimpresión.
+
+Cada archivo se llama credenciales/cache/<folio>/<huella>.pdf dentro del
+storage "gafetes" (pdf_storage.py); una carpeta por folio para que
+invalidar solo liste los PDFs de ese participante. La huella es un hash de los datos que
+aparecen en el gafete, la versión de la plantilla (pdf_plantilla.version:
+cambia al editar plantillas/gafete.json) y los ajustes del QR. Si el participante cambia, cambia
+la huella y el PDF anterior ya no se usa (además la señal post_save lo
+borra). La carpeta se purga por antigüedad y tamaño total.
+"""
+import hashlib
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from . import pdf_plantilla, pdf_pool, pdf_storage
+from .models import Participant
+from .pdf_generator import generar_credencial_bytes
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evicted": 0}
+_escrituras = 0
+
+# Cada cuántos PDFs nuevos se revisa la política de purga
+PURGAR_CADA = 50
+
+CARPETA = "credenciales/cache"
+
+
+def cache_dir() -> str:
+    """Carpeta de la caché dentro del storage "gafetes" (nombre relativo)."""
+    return CARPETA
+
+
+def nombre_pdf(participant, h: str) -> str:
+    return f"{CARPETA}/{_nombre_base(participant)}/{h}.pdf"
+
+
+def huella(participant) -> str:
+    """Hash de todo lo que cambia el contenido del gafete."""
+    partes = [
+        pdf_plantilla.version(),
+        participant.clave or "",
+        participant.full_name or "",
+        participant.child_name or "",
+        participant.grado or "",
+        participant.role or "",
+        # El QR: si va y si va firmado
+        f"qr={int(settings.MARATON_BADGE_QR)}:{int(settings.MARATON_QR_FIRMADO)}",
+    ]
+    return hashlib.sha256("\x1f".join(partes).encode("utf-8")).hexdigest()[:32]
+
+
+def _nombre_base(participant) -> str:
+    return participant.clave or f"id{participant.pk}"
+
+
+def _contar(clave: str, n: int = 1) -> None:
+    with _lock:
+        _stats[clave] += n
+
+
+def estadisticas() -> dict:
+    with _lock:
+        return dict(_stats)
+
+
+def obtener_pdf(participant) -> tuple[str, str, bool]:
+    """
+    Devuelve (nombre en el storage, huella, hit). Si no está en caché, lo
+    genera en memoria y lo sube al storage "gafetes".
+    """
+    h = huella(participant)
+    nombre = nombre_pdf(participant, h)
+    if pdf_storage.storage().exists(nombre):
+        _contar("hits")
+        return nombre, h, True
+
+    guardar(nombre, generar(participant))
+    return nombre, h, False
+
+
+def generar(participant) -> bytes:
+    """Dibuja el PDF en memoria sin consultar la caché (cuenta como miss)."""
+    _contar("misses")
+    return generar_credencial_bytes(participant)
+
+
+async def aobtener_pdf(participant) -> tuple[str, str, bool]:
+    """obtener_pdf para vistas async: el render va a pdf_pool y el storage a un hilo."""
+    h = huella(participant)
+    nombre = nombre_pdf(participant, h)
+    if await sync_to_async(pdf_storage.storage().exists, thread_sensitive=False)(nombre):
+        _contar("hits")
+        return nombre, h, True
+
+    data = await agenerar(participant)
+    await sync_to_async(guardar, thread_sensitive=False)(nombre, data)
+    return nombre, h, False
+
+
+async def agenerar(participant) -> bytes:
+    """generar() para vistas async: dibuja en pdf_pool."""
+    _contar("misses")
+    return await pdf_pool.ejecutar(generar_credencial_bytes, participant)
+
+
+def guardar(nombre: str, data: bytes) -> bool:
+    """Sube `data` a la caché como `nombre`. False si ya estaba."""
+    global _escrituras
+    st = pdf_storage.storage()
+    if st.exists(nombre):
+        return False
+    guardado = st.save(nombre, ContentFile(data, name=nombre))
+    if guardado != nombre:
+        # Otro proceso lo subió al mismo tiempo y el backend no sobrescribe
+        st.delete(guardado)
+
+    with _lock:
+        _escrituras += 1
+        purgar_ahora = _escrituras % PURGAR_CADA == 0
+    if purgar_ahora:
+        purgar()
+    return True
+
+
+def _listar_carpeta(carpeta: str) -> tuple[list[str], list[str]]:
+    try:
+        return pdf_storage.storage().listdir(carpeta)
+    except FileNotFoundError:
+        return [], []
+
+
+def listar() -> list[str]:
+    """Nombres de todos los PDFs en caché."""
+    carpetas, _ = _listar_carpeta(CARPETA)
+    nombres = []
+    for folio in carpetas:
+        _, archivos = _listar_carpeta(f"{CARPETA}/{folio}")
+        nombres.extend(f"{CARPETA}/{folio}/{a}" for a in archivos if a.endswith(".pdf"))
+    return nombres
+
+
+def invalidar(participant) -> int:
+    """Borra los PDFs en caché de ese participante (todas sus huellas)."""
+    st = pdf_storage.storage()
+    carpeta = f"{CARPETA}/{_nombre_base(participant)}"
+    archivos = [a for a in _listar_carpeta(carpeta)[1] if a.endswith(".pdf")]
+    for a in archivos:
+        st.delete(f"{carpeta}/{a}")
+    return len(archivos)
+
+
+def purgar(max_mb: float | None = None, max_dias: float | None = None) -> int:
+    """
+    Quita los PDFs más viejos que `max_dias` y luego los más antiguos
+    hasta que la carpeta pese menos de `max_mb`. Devuelve cuántos borró.
+    """
+    max_mb = settings.MARATON_PDF_CACHE_MAX_MB if max_mb is None else max_mb
+    max_dias = settings.MARATON_PDF_CACHE_MAX_DIAS if max_dias is None else max_dias
+
+    st = pdf_storage.storage()
+    archivos = []
+    for nombre in listar():
+        try:
+            archivos.append((st.get_modified_time(nombre).timestamp(), st.size(nombre), nombre))
+        except FileNotFoundError:
+            pass
+    archivos.sort()  # más antiguos primero
+
+    limite_edad = time.time() - max_dias * 86400
+    limite_bytes = max_mb * 1024 * 1024
+    total = sum(a[1] for a in archivos)
+    borrados = 0
+    for mtime, size, nombre in archivos:
+        if mtime >= limite_edad and total <= limite_bytes:
+            break
+        st.delete(nombre)
+        total -= size
+        borrados += 1
+
+    _contar("evicted", borrados)
+    return borrados
+
+
+def huerfanos():
+    """
+    Nombres en el storage que ya no corresponden a ningún gafete vigente:
+    participantes borrados, huellas viejas (datos editados con update() o
+    plantilla cambiada) y PDFs del esquema anterior en credenciales/.
+    """
+    campos = ("id", "clave", "full_name", "child_name", "grado", "role")
+    vigentes = {nombre_pdf(p, huella(p))
+                for p in Participant.objects.only(*campos).iterator(chunk_size=2000)}
+    for nombre in listar():
+        if nombre not in vigentes:
+            yield nombre
+
+    # Esquema anterior: credenciales/<folio>.pdf y credenciales/cache/<folio>__<huella>.pdf
+    for carpeta in ("credenciales", CARPETA):
+        for a in _listar_carpeta(carpeta)[1]:
+            if a.endswith(".pdf"):
+                yield f"{carpeta}/{a}"
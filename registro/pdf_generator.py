@@ -1,243 +1,153 @@
 import io
+import itertools
 import os
-import re
+import time
+from functools import lru_cache
 
 from django.conf import settings
 from django.utils import timezone
 
 from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.colors import HexColor, black
-from reportlab.lib.utils import ImageReader
+from reportlab.graphics.barcode import qrencoder
 
+from . import metricas, pdf_assets, pdf_plantilla
 from .models import Participant
+from .folios import payload_qr
 
-AZUL  = HexColor("#001B5E")
-ROJO  = HexColor("#C62828")
-VERDE = HexColor("#2E7D32")
-GRIS  = HexColor("#666666")
+# Módulos en blanco alrededor del QR (los mismos que QrCodeWidget)
+QR_BORDE = 4
 
 
-def generar_credencial_pdf(participant: Participant) -> str:
+@lru_cache(maxsize=2048)
+def _modulos_qr(texto: str) -> tuple[int, tuple]:
     """
-    Genera un PDF en hoja carta con dos gafetes (adulto arriba, alumno abajo).
-    Devuelve la ruta absoluta del PDF generado.
+    Codifica el QR una sola vez por texto: (módulos por lado, tramos
+    oscuros de cada renglón como (renglón, columna, largo)).
+    """
+    qr = qrencoder.QRCode(None, qrencoder.QRErrorCorrectLevel.M)
+    qr.addData(texto)
+    qr.make()
+    tramos = []
+    for renglon, modulos in enumerate(qr.modules):
+        columna = 0
+        for oscuro, grupo in itertools.groupby(map(bool, modulos)):
+            largo = len(list(grupo))
+            if oscuro:
+                tramos.append((renglon, columna, largo))
+            columna += largo
+    return qr.getModuleCount(), tuple(tramos)
+
+
+def forma_qr(c, participant: Participant, tam: float) -> str | None:
+    """
+    Dibuja el QR del folio una sola vez como form XObject del canvas y
+    devuelve su nombre; cada mitad del gafete solo lo referencia (doForm).
+    Todo el QR es un solo path relleno: un rectángulo por tramo oscuro.
+    """
+    if not settings.MARATON_BADGE_QR or not participant.clave:
+        return None
+    nombre = f"qr_{participant.clave}"
+    if c.hasForm(nombre):  # mismo folio dos veces en un lote
+        return nombre
+
+    n, tramos = _modulos_qr(payload_qr(participant.clave))
+    modulo = tam / (n + 2 * QR_BORDE)
+    c.beginForm(nombre)
+    c.setFillColorRGB(0, 0, 0)
+    path = c.beginPath()
+    for renglon, columna, largo in tramos:
+        path.rect((columna + QR_BORDE) * modulo, tam - (renglon + QR_BORDE + 1) * modulo,
+                  largo * modulo, modulo)
+    c.drawPath(path, stroke=0, fill=1)
+    c.endForm()
+    return nombre
+
+
+def nuevo_canvas(destino, **kwargs):
+    """Canvas del tamaño de página de la plantilla (ruta o archivo binario)."""
+    return canvas.Canvas(destino, pagesize=tuple(pdf_plantilla.cargar()["pagina"]), **kwargs)
+
+
+def valores_gafete(participant: Participant) -> dict:
+    """Textos variables que usa la plantilla ({full_name}, {folio}, ...)."""
+    # categoría: usa el label bonito del ROLE_CHOICES
+    try:
+        rol = participant.get_role_display() or ""
+    except Exception:
+        rol = participant.role or ""
+    return {
+        "full_name": (participant.full_name or "").upper(),
+        "child_name": (participant.child_name or "").upper(),
+        "grado": (participant.grado or "").upper(),
+        "rol": rol.upper(),
+        "folio": (participant.clave or "").replace("FOLIO: ", ""),
+        # hora local según configuración de Django
+        "generado": timezone.localtime().strftime("%d/%m/%Y %H:%M"),
+    }
+
+
+def dibujar_credencial(c, participant: Participant) -> None:
     """
-    # Tamaño carta
-    page_width  = 8.5 * 72   # 612
-    page_height = 11  * 72   # 792
-    badge_height = page_height / 2.0
-    badge_width  = page_width
+    Dibuja en la página actual de `c` los dos gafetes del participante
+    (adulto arriba, alumno abajo) según la plantilla. No cierra la página:
+    eso le toca a quien llama (un PDF individual o un lote de muchas páginas).
+    """
+    plantilla = pdf_plantilla.cargar()
+
+    # Parte fija: se registra una vez por canvas y aquí solo se estampa
+    c.doForm(pdf_plantilla.forma_fondo(c, plantilla))
+
+    qr = plantilla.get("qr")
+    qr_form = forma_qr(c, participant, qr["tam"]) if qr else None
+    valores = valores_gafete(participant)
+
+    for mitad in plantilla["mitades"]:
+        c.saveState()
+        c.translate(0, mitad["y"])
+        pdf_plantilla.dibujar_textos(c, plantilla, mitad["modo"], valores)
+        # QR del folio (para el lector del check-in)
+        if qr_form:
+            c.translate(qr["x"], qr["y"])
+            c.doForm(qr_form)
+        c.restoreState()
+
+
+def _renderizar(c, participant: Participant) -> None:
+    """Dibuja y guarda un PDF de una página; mide cada fase (metricas.py)."""
+    imagenes_antes = pdf_assets.segundos_carga()
+    inicio = time.perf_counter()
+    dibujar_credencial(c, participant)
+    c.showPage()
+    dibujado = time.perf_counter()
+    c.save()
+    fin = time.perf_counter()
 
-    # Imágenes
-    logo_path  = os.path.join(settings.BASE_DIR, "static", "logo_lma.png")
-    zorro_path = os.path.join(settings.BASE_DIR, "static", "zorro_maraton.png")
-    liceo_path = os.path.join(settings.BASE_DIR, "static", "liceo.png")
+    imagenes = pdf_assets.segundos_carga() - imagenes_antes
+    metricas.PDF_FASES.observar(imagenes, "imagenes")
+    metricas.PDF_FASES.observar(dibujado - inicio - imagenes, "dibujo")
+    metricas.PDF_FASES.observar(fin - dibujado, "guardado")
 
-    logo_img   = ImageReader(logo_path)  if os.path.exists(logo_path)  else None
-    zorro_img  = ImageReader(zorro_path) if os.path.exists(zorro_path) else None
-    liceo_img  = ImageReader(liceo_path) if os.path.exists(liceo_path) else None
 
+def generar_credencial_pdf(participant: Participant, pdf_path: str | None = None) -> str:
+    """
+    Genera un PDF en hoja carta con dos gafetes (adulto arriba, alumno abajo).
+    Devuelve la ruta absoluta del PDF generado (por defecto
+    MEDIA_ROOT/credenciales/<folio>.pdf, o `pdf_path` si se indica).
+    """
     # Carpeta de salida en MEDIA_ROOT/credenciales
-    out_dir = os.path.join(settings.MEDIA_ROOT, "credenciales")
-    os.makedirs(out_dir, exist_ok=True)
-
-    folio = participant.clave or "SIN-FOLIO"
-    pdf_path = os.path.join(out_dir, f"{folio}.pdf")
-
-    c = canvas.Canvas(pdf_path, pagesize=(page_width, page_height))
-
-    # ------------------------------------------------------
-    # FUNCIÓN INTERNA: Dibuja cada gafete (Adulto / Alumno)
-    # ------------------------------------------------------
-    def dibujar_gafete(x0, y0, alto, modo: str):
-        margin = 18
-        ix = x0 + margin
-        iy = y0 + margin
-        iw = badge_width - 2 * margin
-        ih = alto - 2 * margin
-
-        # ====== Marca de agua (logo LMA centrado) ======
-        try:
-            if liceo_img:
-                c.saveState()
-                if hasattr(c, "setFillAlpha"):
-                    c.setFillAlpha(0.08)  # 8% opacidad
-                center_x = ix + iw / 2.0
-                center_y = iy + ih / 2.0
-                wm_size = min(iw, ih) * 0.60
-                c.drawImage(
-                    liceo_img,
-                    center_x - wm_size / 2.0,
-                    center_y - wm_size / 2.0,
-                    width=wm_size,
-                    height=wm_size,
-                    preserveAspectRatio=True,
-                    mask="auto",
-                )
-                c.restoreState()
-        except Exception as e:
-            print("WATERMARK_ERROR:", e)
-
-        # Marco
-        c.setStrokeColor(AZUL)
-        c.setLineWidth(2)
-        c.rect(ix, iy, iw, ih, stroke=1, fill=0)
-
-        # =================== ENCABEZADO ===================
-        header_top_pad = 16
-        header_h       = 110
-        header_top     = iy + ih - header_top_pad
-
-        # Logo LMA (más grande)
-        if logo_img:
-            LOGO_H = 100
-            LOGO_W = 200
-            y_logo = header_top - LOGO_H
-            c.drawImage(
-                logo_img,
-                ix + 6,
-                y_logo,
-                width=LOGO_W,
-                height=LOGO_H,
-                preserveAspectRatio=True,
-                mask="auto",
-            )
-
-        # Zorro a la derecha
-        if zorro_img:
-            ZORRO_H = 100
-            ZORRO_W = 210
-            y_zorro = header_top - ZORRO_H
-            x_zorro = ix + iw - ZORRO_W - 6
-            c.drawImage(
-                zorro_img,
-                x_zorro,
-                y_zorro,
-                width=ZORRO_W,
-                height=ZORRO_H,
-                preserveAspectRatio=True,
-                mask="auto",
-            )
-
-        # Título
-        c.setFillColor(AZUL)
-        c.setFont("Helvetica-Bold", 26)
-        c.drawCentredString(ix + iw / 2, header_top - 22, "MARATÓN LMA 2025")
-
-        # Franjas
-        c.setLineWidth(4)
-        base = header_top - 50
-        margen_lateral = 150  # más cortas = franjas más largas
-
-        c.setStrokeColor(AZUL)
-        c.line(ix + margen_lateral, base, ix + iw - margen_lateral, base)
-        c.setStrokeColor(ROJO)
-        c.line(ix + margen_lateral, base - 8, ix + iw - margen_lateral, base - 8)
-        c.setStrokeColor(VERDE)
-        c.line(ix + margen_lateral, base - 16, ix + iw - margen_lateral, base - 16)
-
-        # =================== CONTENIDO ===================
-        # un poco más abajo para despegar del encabezado
-        y = header_top - header_h - 45
-
-        nombre_adulto = (participant.full_name or "").upper()
-        nombre_alumno = (participant.child_name or "").upper()
-        grado_txt     = (participant.grado or "").upper()
-
-        # categoría: usa el label bonito del ROLE_CHOICES
-        try:
-            rol_txt = (participant.get_role_display() or "").upper()
-        except Exception:
-            rol_txt = (participant.role or "").upper()
-
-        cx = ix + iw / 2
-
-        if modo == "ADULTO":
-            # Nombre del adulto
-            c.setFillColor(black)
-            c.setFont("Helvetica-Bold", 28)
-            c.drawCentredString(cx, y, nombre_adulto or "ACOMPAÑANTE")
-            y -= 36
-
-            # Alumno y grado
-            c.setFillColor(GRIS)
-            c.setFont("Helvetica", 13)
-            c.drawCentredString(
-                cx,
-                y,
-                f"Alumno(a): {nombre_alumno or '--'}   |   Grado: {grado_txt or '--'}",
-            )
-            y -= 28
-
-            # Categoría del adulto
-            c.setFillColor(AZUL)
-            c.setFont("Helvetica-Bold", 18)
-            c.drawCentredString(cx, y, rol_txt or "--")
-            y -= 60
-
-            # Folio
-            c.setFillColor(black)
-            c.setFont("Helvetica-Bold", 42)
-            c.drawCentredString(
-                cx,
-                y,
-                (participant.clave or "").replace("FOLIO: ", ""),
-            )
-            y -= 40
-
-        else:  # ALUMNO
-            # Nombre del alumno
-            c.setFillColor(black)
-            c.setFont("Helvetica-Bold", 30)
-            c.drawCentredString(cx, y, nombre_alumno or "ALUMNO")
-            y -= 36
-
-            # Grado
-            c.setFillColor(black)
-            c.setFont("Helvetica-Bold", 18)
-            c.drawCentredString(cx, y, f"GRADO: {grado_txt}")
-            y -= 40
-
-           
-
-            # Folio
-            c.setFillColor(black)
-            c.setFont("Helvetica-Bold", 40)
-            c.drawCentredString(
-                cx,
-                y,
-                (participant.clave or "").replace("FOLIO: ", ""),
-            )
-            y -= 60
-
-        # Leyenda inferior
-        c.setFillColor(GRIS)
-        c.setFont("Helvetica-Oblique", 11)
-        c.drawCentredString(
-            cx,
-            iy + 20,
-            "Imprime y presenta este gafete el día del evento",
-        )
-
-        # Fecha (hora local según configuración de Django)
-        hora_local = timezone.localtime().strftime("%d/%m/%Y %H:%M")
-        c.setFillColor(GRIS)
-        c.setFont("Helvetica", 9)
-        c.drawRightString(ix + iw - 10, iy + 16, f"Generado: {hora_local}")
-
-    # ------------------------------------------------------
-    # DIBUJAR AMBOS GAFETES
-    # ------------------------------------------------------
-    dibujar_gafete(0, badge_height, badge_height, "ADULTO")
-    dibujar_gafete(0, 0,            badge_height, "ALUMNO")
-
-    # Línea punteada de corte
-    c.setStrokeColor(HexColor("#9E9E9E"))
-    c.setDash(3, 3)
-    c.line(0, page_height / 2, page_width, page_height / 2)
-    c.setDash()
+    if pdf_path is None:
+        out_dir = os.path.join(settings.MEDIA_ROOT, "credenciales")
+        os.makedirs(out_dir, exist_ok=True)
 
-    c.showPage()
-    c.save()
+        folio = participant.clave or "SIN-FOLIO"
+        pdf_path = os.path.join(out_dir, f"{folio}.pdf")
+
+    _renderizar(nuevo_canvas(pdf_path), participant)
     return pdf_path
+
+
+def generar_credencial_bytes(participant: Participant) -> bytes:
+    """Igual que generar_credencial_pdf pero en memoria: sin archivo de por medio."""
+    buf = io.BytesIO()
+    _renderizar(nuevo_canvas(buf), participant)
+    return buf.getvalue()
@@ -0,0 +1,32 @@
+# registro/pdf_lote.py
+"""
+Lote de gafetes en un solo PDF (una hoja carta por participante).
+
+Todas las páginas comparten un canvas, así que la parte fija de la
+plantilla (logos, marca de agua, marco, textos fijos) se registra una sola
+vez como form XObject y cada página solo la referencia.
+Los participantes se leen del ORM por bloques (iterator) y cada página se
+comprime al cerrarse; el PDF se escribe a un archivo, no a memoria.
+"""
+from .pdf_generator import dibujar_credencial, nuevo_canvas
+
+CHUNK_SIZE = 500
+
+
+def generar_lote_pdf(participants, destino, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Dibuja una página por participante en `destino` (ruta o archivo binario).
+    `participants` puede ser un queryset (se recorre por bloques) o una lista.
+    Devuelve el número de páginas.
+    """
+    if hasattr(participants, "iterator"):
+        participants = participants.iterator(chunk_size=chunk_size)
+
+    c = nuevo_canvas(destino, pageCompression=1)
+    paginas = 0
+    for participant in participants:
+        dibujar_credencial(c, participant)
+        c.showPage()
+        paginas += 1
+    c.save()
+    return paginas
@@ -0,0 +1,157 @@
+# registro/pdf_plantilla.py
+"""
+Diseño del gafete declarado en un archivo de datos (plantillas/gafete.json).
+
+La parte fija (marco, logos, marca de agua, título, franjas, leyenda y línea
+de corte) se dibuja una sola vez por canvas como form XObject; cada página
+solo la estampa con doForm y encima escribe los textos del participante.
+Un lote comparte la forma entre todas sus páginas. Un PDF individual es un
+documento aparte y necesita la suya, pero sus imágenes (lo caro) llegan ya
+comprimidas de pdf_assets.
+Cambiar el diseño o el año es editar el JSON: su hash forma parte de la
+huella de la caché de PDFs, así que los gafetes viejos se regeneran solos.
+
+Coordenadas en puntos. Las de "fondo", "textos" y "qr" son relativas a la
+esquina inferior izquierda de cada mitad ("mitades"); "corte" es de página.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from django.conf import settings
+from reportlab.lib.colors import HexColor
+
+from .pdf_assets import imagen_gafete, registrar_imagen
+
+_cache = {}
+_lock = threading.Lock()
+
+
+class PlantillaInvalida(ValueError):
+    pass
+
+
+def ruta() -> str:
+    return settings.MARATON_GAFETE_PLANTILLA
+
+
+def cargar() -> dict:
+    """Plantilla ya leída (se vuelve a leer si el archivo cambia)."""
+    path = ruta()
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        hit = _cache.get(path)
+    if hit and hit[0] == mtime:
+        return hit[1]
+
+    with open(path, "rb") as f:
+        crudo = f.read()
+    try:
+        plantilla = json.loads(crudo)
+    except ValueError as e:
+        raise PlantillaInvalida(f"{path}: {e}")
+    faltan = {"pagina", "mitades", "fondo", "textos"} - set(plantilla)
+    if faltan:
+        raise PlantillaInvalida(f"{path}: faltan {', '.join(sorted(faltan))}")
+
+    plantilla["_huella"] = hashlib.sha256(crudo).hexdigest()[:12]
+    plantilla["_colores"] = {k: HexColor(v) for k, v in plantilla.get("colores", {}).items()}
+    with _lock:
+        _cache[path] = (mtime, plantilla)
+    return plantilla
+
+
+def version() -> str:
+    """Versión declarada + hash del archivo (entra en la huella de pdf_cache)."""
+    p = cargar()
+    return f"{p.get('version', '')}-{p['_huella']}"
+
+
+def _color(plantilla, nombre):
+    return plantilla["_colores"].get(nombre) or HexColor(nombre)
+
+
+def _texto(c, plantilla, e, texto):
+    c.setFillColor(_color(plantilla, e.get("color", "negro")))
+    c.setFont(e.get("fuente", "Helvetica"), e.get("tam", 12))
+    alinear = e.get("alinear", "izquierda")
+    if alinear == "centro":
+        c.drawCentredString(e["x"], e["y"], texto)
+    elif alinear == "derecha":
+        c.drawRightString(e["x"], e["y"], texto)
+    else:
+        c.drawString(e["x"], e["y"], texto)
+
+
+def _dibujar_fondo(c, plantilla):
+    for e in plantilla["fondo"]:
+        tipo = e["tipo"]
+        if tipo == "imagen":
+            # La opacidad va en el alfa de la imagen: ReportLab no lleva
+            # los ExtGState (setFillAlpha) a los recursos de un form XObject
+            img = imagen_gafete(e["archivo"], e["ancho"], e["alto"], e.get("opacidad", 1.0))
+            if img is None:
+                continue
+            registrar_imagen(c, img)
+            c.drawImage(img, e["x"], e["y"], width=e["ancho"], height=e["alto"],
+                        preserveAspectRatio=True, mask="auto")
+        elif tipo == "rect":
+            c.setStrokeColor(_color(plantilla, e.get("color", "negro")))
+            c.setLineWidth(e.get("grosor", 1))
+            c.rect(e["x"], e["y"], e["ancho"], e["alto"], stroke=1, fill=0)
+        elif tipo == "linea":
+            c.setStrokeColor(_color(plantilla, e.get("color", "negro")))
+            c.setLineWidth(e.get("grosor", 1))
+            c.line(e["x1"], e["y1"], e["x2"], e["y2"])
+        elif tipo == "texto":
+            _texto(c, plantilla, e, e["texto"])
+        else:
+            raise PlantillaInvalida(f"Elemento de fondo desconocido: {tipo}")
+
+
+def forma_fondo(c, plantilla) -> str:
+    """
+    Registra en `c` (una vez) la parte fija de la página completa y
+    devuelve el nombre del form XObject.
+    """
+    nombre = f"fondo_{plantilla['_huella']}"
+    if c.hasForm(nombre):
+        return nombre
+
+    c.beginForm(nombre)
+    for mitad in plantilla["mitades"]:
+        c.saveState()
+        c.translate(0, mitad["y"])
+        _dibujar_fondo(c, plantilla)
+        c.restoreState()
+
+    corte = plantilla.get("corte")
+    if corte:
+        c.setStrokeColor(_color(plantilla, corte.get("color", "negro")))
+        c.setLineWidth(corte.get("grosor", 1))
+        c.setDash(*corte.get("guion", []))
+        c.line(corte["x1"], corte["y1"], corte["x2"], corte["y2"])
+        c.setDash()
+    c.endForm()
+    return nombre
+
+
+class _Valores(dict):
+    def __missing__(self, key):
+        return ""
+
+
+def dibujar_textos(c, plantilla, modo: str, valores: dict) -> None:
+    """Textos variables de una mitad (coordenadas ya trasladadas a la mitad)."""
+    textos = plantilla["textos"]
+    for e in textos.get("comun", []) + textos.get(modo, []):
+        datos = _Valores(valores)
+        for campo, defecto in e.get("vacio", {}).items():
+            datos[campo] = datos.get(campo) or defecto
+        _texto(c, plantilla, e, e["texto"].format_map(datos))
+
+
+def limpiar_cache() -> None:
+    with _lock:
+        _cache.clear()
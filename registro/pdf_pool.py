@@ -0,0 +1,59 @@
+# registro/pdf_pool.py
+"""
+Pool acotado donde las vistas async dibujan los gafetes.
+
+ReportLab es Python puro y retiene el GIL. Con MARATON_PDF_POOL=thread
+(default) el event loop queda libre mientras se dibuja, pero los renders
+se turnan entre sí. Con "process" cada worker es un proceso aparte (spawn +
+django.setup) y los renders corren en paralelo en varios núcleos. En ese
+modo la función y sus argumentos deben poder serializarse con pickle, y las
+métricas de fases del render (metricas.PDF_FASES) quedan en el proceso hijo.
+
+Como máximo hay MARATON_PDF_POOL_WORKERS renders a la vez; los demás
+esperan su turno en la cola del executor.
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _iniciar_proceso() -> None:
+    import django
+
+    django.setup()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            workers = max(1, settings.MARATON_PDF_POOL_WORKERS)
+            if settings.MARATON_PDF_POOL == "process":
+                _executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_iniciar_proceso,
+                )
+            else:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+        return _executor
+
+
+async def ejecutar(fn, *args):
+    """Corre fn(*args) en el pool sin bloquear el event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+
+
+def cerrar() -> None:
+    """Detiene el pool (el siguiente uso crea otro con la configuración vigente)."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
@@ -0,0 +1,102 @@
+# registro/pdf_storage.py
+"""
+Almacenamiento y entrega de los PDFs de gafetes.
+
+Los PDFs se guardan con la API de storages de Django en el alias "gafetes"
+(settings.STORAGES): disco local por defecto o un bucket S3 compatible
+(django-storages) con MARATON_PDF_STORAGE=s3. El código solo usa nombres
+relativos (credenciales/cache/<folio>/<huella>.pdf, ver pdf_cache.nombre_pdf),
+nunca rutas locales.
+
+La entrega (MARATON_PDF_ENTREGA) puede evitar que el worker de Django
+transmita los bytes:
+  - "django":     FileResponse sobre storage.open() (default)
+  - "redirect":   302 a storage.url() (URL firmada de S3, CDN o /media/)
+  - "x-accel":    X-Accel-Redirect para nginx (MARATON_PDF_XACCEL_PREFIX)
+  - "x-sendfile": X-Sendfile para Apache/lighttpd (requiere disco local)
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, storages
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from django.utils.encoding import escape_uri_path
+
+
+class AlmacenLocal(FileSystemStorage):
+    """
+    FileSystemStorage que escribe a un temporal en la misma carpeta y lo
+    renombra: quien lea el PDF nunca lo ve a medias. Con la misma huella el
+    contenido es el mismo, así que sobrescribir es seguro.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("allow_overwrite", True)
+        super().__init__(**kwargs)
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        carpeta = os.path.dirname(full_path)
+        os.makedirs(carpeta, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=carpeta, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            os.replace(tmp, full_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return str(name).replace("\\", "/")
+
+
+def storage():
+    return storages["gafetes"]
+
+
+def existe(nombre: str) -> bool:
+    if not nombre:
+        return False
+    try:
+        return storage().exists(nombre)
+    except SuspiciousFileOperation:  # rutas absolutas de antes del storage
+        return False
+
+
+def ruta_local(nombre: str) -> str | None:
+    """Ruta en disco si el storage es local; None si es remoto."""
+    try:
+        ruta = storage().path(nombre)
+    except NotImplementedError:
+        return None
+    return ruta if os.path.isfile(ruta) else None
+
+
+def respuesta_pdf(nombre: str, filename: str, as_attachment: bool = True) -> HttpResponse:
+    """Respuesta que entrega el PDF `nombre` según MARATON_PDF_ENTREGA."""
+    modo = settings.MARATON_PDF_ENTREGA
+    st = storage()
+
+    if modo == "redirect":
+        return HttpResponseRedirect(st.url(nombre))
+
+    if modo in ("x-accel", "x-sendfile"):
+        resp = HttpResponse(content_type="application/pdf")
+        if modo == "x-accel":
+            resp["X-Accel-Redirect"] = escape_uri_path(settings.MARATON_PDF_XACCEL_PREFIX + nombre)
+            ok = True
+        else:
+            ruta = ruta_local(nombre)
+            ok = ruta is not None
+            if ok:
+                resp["X-Sendfile"] = ruta
+        if ok:
+            disposicion = "attachment" if as_attachment else "inline"
+            resp["Content-Disposition"] = f'{disposicion}; filename="{filename}"'
+            return resp
+
+    # FileResponse cierra el archivo al terminar de enviar la respuesta
+    return FileResponse(st.open(nombre, "rb"), as_attachment=as_attachment,
+                        filename=filename, content_type="application/pdf")
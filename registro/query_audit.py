@@ -0,0 +1,110 @@
+# registro/query_audit.py
+"""
+Auditoría de planes de consulta (EXPLAIN) de las rutas calientes.
+
+Cada entrada de CONSULTAS arma el queryset tal como lo ejecuta su endpoint.
+`auditar()` obtiene el plan y marca como fallo cualquier recorrido completo
+de registro_participant:
+    SQLite:   "SCAN registro_participant" sin índice, o un ORDER BY con
+              "USE TEMP B-TREE" (ordenar toda la tabla en memoria)
+    Postgres: "Seq Scan on registro_participant"
+Las de LECTURA_COMPLETA (el CSV sin filtros) leen todas las filas a
+propósito: ahí solo falla ordenar la tabla entera en memoria.
+
+La búsqueda `q` (icontains en nombre, alumno y folio) no puede usar un
+índice B-tree; en Postgres la cubre el índice de trigramas part_q_trgm_idx
+(migración 0009). En SQLite recorre part_created_id_idx en orden y se
+detiene al llenar la página.
+Uso: `manage.py auditar_consultas` o la prueba en tests.py.
+"""
+import re
+
+from django.db import connection
+from django.db.models.functions import Upper
+
+from .filters import filtrar_participantes
+from .folios import participantes_por_folio
+from .models import Participant
+from .views import CSV_CAMPOS
+
+TABLA = Participant._meta.db_table
+
+
+def _listado(params):
+    qs = filtrar_participantes(Participant.objects.all(), params)
+    return qs.order_by("-created_at", "-id")[:101]
+
+
+def _csv(params):
+    qs = filtrar_participantes(Participant.objects.all(), params)
+    return qs.order_by("plantel", "role", "full_name").values_list(*CSV_CAMPOS)
+
+
+CONSULTAS = {
+    "participants_list": lambda: _listado({}),
+    "participants_list_plantel": lambda: _listado({"plantel": "Primaria"}),
+    "participants_list_q": lambda: _listado({"q": "perez"}),
+    # ETag del listado (views._version_participantes)
+    "participants_etag": lambda: (
+        Participant.objects.order_by("-updated_at").values_list("updated_at", flat=True)[:1]
+    ),
+    "export_csv": lambda: _csv({}),
+    "export_csv_plantel": lambda: _csv({"plantel": "Primaria"}),
+    "reprint_folio": lambda: participantes_por_folio("primaria0001"),
+    "reprint_id": lambda: Participant.objects.filter(pk=1),
+    "checkin_sync": lambda: (
+        Participant.objects.annotate(clave_upper=Upper("clave"))
+        .filter(clave_upper__in=["PRIMARIA0001", "SECUNDARIA0002"])
+        .values("clave_upper", "id")
+    ),
+    "register_duplicados": lambda: (
+        Participant.objects.filter(nombre_clave="maria perez|luis perez|primaria")
+        .values_list("clave", flat=True)[:5]
+    ),
+}
+
+
+# Leen toda la tabla a propósito
+LECTURA_COMPLETA = {"export_csv"}
+
+
+def plan_es_recorrido_completo(plan: str, vendor: str | None = None) -> bool:
+    vendor = vendor or connection.vendor
+    if vendor == "postgresql":
+        return f"Seq Scan on {TABLA}" in plan
+    if vendor == "sqlite":
+        for linea in plan.splitlines():
+            if re.search(rf"\bSCAN {TABLA}\b", linea) and "USING" not in linea:
+                return True
+            if "USE TEMP B-TREE FOR ORDER BY" in linea:
+                return True
+    return False
+
+
+def plan_ordena_toda_la_tabla(plan: str, vendor: str | None = None) -> bool:
+    vendor = vendor or connection.vendor
+    if vendor == "postgresql":
+        return bool(re.search(r"^\s*Sort\b", plan, re.M)) and f"Seq Scan on {TABLA}" in plan
+    if vendor == "sqlite":
+        return "USE TEMP B-TREE FOR ORDER BY" in plan
+    return False
+
+
+def auditar():
+    """Devuelve [(nombre, plan, ok)] para cada consulta de CONSULTAS."""
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cur:
+            cur.execute("ANALYZE")  # estadísticas para que el planificador decida bien
+    elif connection.vendor == "postgresql":
+        with connection.cursor() as cur:
+            cur.execute(f"ANALYZE {TABLA}")
+
+    resultados = []
+    for nombre, construir in CONSULTAS.items():
+        plan = construir().explain()
+        if nombre in LECTURA_COMPLETA:
+            ok = not plan_ordena_toda_la_tabla(plan)
+        else:
+            ok = not plan_es_recorrido_completo(plan)
+        resultados.append((nombre, plan, ok))
+    return resultados
@@ -0,0 +1,36 @@
+# registro/renderers.py
+"""
+JSONRenderer con orjson para las lecturas grandes (listado de participantes).
+
+Escribe los mismos bytes que el JSONRenderer de DRF con la configuración de
+siempre (UTF-8, compacto, \\u2028/\\u2029 escapados). Las fechas y los tipos
+que orjson no conoce pasan por el encoder de DRF. La excepción son los
+floats (orjson escribe 1e-05 como 0.00001), por eso solo se usa en vistas
+cuyos datos son texto, enteros y None.
+
+Sin orjson instalado, con indentación pedida (Accept: ...; indent=2) o si
+orjson no puede con algún valor (enteros de más de 64 bits), se usa el de DRF.
+"""
+from rest_framework.utils import encoders
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+_encoder = encoders.JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
+        return ret
@@ -0,0 +1,129 @@
+# registro/replica.py
+"""
+Réplica de lectura opcional (REPLICA_DATABASE_URL → alias "replica").
+
+Las rutas de MARATON_REPLICA_RUTAS (listado, estadísticas) leen de la
+réplica para no competir con el registro; todo lo demás sigue en la
+primaria ("default"). ReplicaMiddleware marca cada request (ContextVar) y
+RouterReplica decide por consulta:
+
+- Escrituras y el contador de folios → siempre la primaria.
+- Lecturas después de una escritura en el mismo request → primaria. La
+  respuesta deja la cookie COOKIE_FIJAR por MARATON_REPLICA_FIJAR_S
+  segundos y mientras tanto ese cliente lee de la primaria: así ve lo que
+  acaba de escribir aunque la réplica vaya atrasada.
+- Réplica caída → primaria. Se revisa con un SELECT 1 a lo más cada
+  MARATON_REPLICA_REVISAR_S segundos. Si una consulta a la réplica falla,
+  se marca caída por ese tiempo y el middleware repite la vista (GET) en
+  la primaria.
+- Respuestas que se transmiten (SOLO_PRIMARIA_RUTAS: el CSV) → primaria
+  aunque estén en MARATON_REPLICA_RUTAS. Sus filas se leen después de que
+  la vista regresa: si la réplica fallara a media descarga ya no habría
+  vista que repetir y el cliente recibiría un 200 truncado.
+
+Fuera de un request (comandos, hilos de gafetes) y sin REPLICA_DATABASE_URL
+todo va a la primaria, como siempre.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from . import metricas
+
+logger = logging.getLogger(__name__)
+
+ALIAS = "replica"
+COOKIE_FIJAR = "maraton_primaria"
+# Modelos que nunca se leen de la réplica (el folio siguiente debe ser exacto)
+SOLO_PRIMARIA = {"registro.foliocounter"}
+# Rutas con StreamingHttpResponse que leen mientras transmiten
+SOLO_PRIMARIA_RUTAS = {"export_csv"}
+
+
+class EstadoLectura:
+    """De qué base lee el request actual."""
+    __slots__ = ("replica", "fijada", "escribio", "uso_replica")
+
+    def __init__(self, replica: bool, fijada: bool):
+        self.replica = replica
+        self.fijada = fijada
+        self.escribio = False
+        self.uso_replica = False
+
+
+_estado_actual = ContextVar("lectura_replica", default=None)
+
+_lock = threading.Lock()
+_caida_hasta = 0.0
+_revisada = 0.0
+
+
+def configurada() -> bool:
+    return ALIAS in settings.DATABASES
+
+
+def estado() -> EstadoLectura | None:
+    return _estado_actual.get()
+
+
+@contextmanager
+def lectura(replica: bool, fijada: bool = False):
+    """Marca el request: `replica` si la ruta lee de la réplica, `fijada` si trae la cookie."""
+    actual = EstadoLectura(replica, fijada)
+    token = _estado_actual.set(actual)
+    try:
+        yield actual
+    finally:
+        _estado_actual.reset(token)
+
+
+def marcar_caida(error) -> None:
+    global _caida_hasta
+    with _lock:
+        _caida_hasta = time.monotonic() + settings.MARATON_REPLICA_REVISAR_S
+    metricas.REPLICA_FALLAS.sumar()
+    logger.warning("Réplica no disponible, se lee de la primaria: %s", error)
+
+
+def disponible() -> bool:
+    global _revisada
+    ahora = time.monotonic()
+    if ahora < _caida_hasta:
+        return False
+    if ahora - _revisada < settings.MARATON_REPLICA_REVISAR_S:
+        return True
+    with _lock:
+        _revisada = ahora
+    try:
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except DatabaseError as e:
+        marcar_caida(e)
+        return False
+    return True
+
+
+class RouterReplica:
+    def db_for_read(self, model, **hints):
+        actual = _estado_actual.get()
+        if actual is None or not actual.replica or actual.fijada or actual.escribio:
+            return None
+        if model._meta.label_lower in SOLO_PRIMARIA or not disponible():
+            return None
+        actual.uso_replica = True
+        return ALIAS
+
+    def db_for_write(self, model, **hints):
+        actual = _estado_actual.get()
+        if actual is not None:
+            actual.escribio = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Misma información en las dos bases
+        return True
@@ -0,0 +1,138 @@
+# registro/semilla.py
+"""
+Datos de prueba realistas para medir con volumen (`manage.py generar_participantes`).
+
+Nombres en español con acentos, los tres planteles, roles de ROLE_CHOICES
+con una distribución parecida a la real (los roles de alumno según plantel,
+grado y sexo), grados tipo "3B", folios válidos del contador y created_at
+repartido en los días previos al evento. Mismo seed → mismos datos (sobre
+una base vacía; los folios continúan el contador), con cualquier tamaño de bloque.
+
+Se inserta con bulk_create por bloques, cada uno en su transacción junto
+con sus contadores de estadísticas (bulk_create no dispara señales).
+auto_now_add pone la hora actual en created_at; la fecha del padrón se
+escribe después con bulk_update en la misma transacción.
+"""
+import random
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import stats
+from .folios import reservar_folios
+from .models import Participant, clave_duplicado
+
+CHUNK_SIZE = 5000
+
+NOMBRES_HOMBRE = [
+    "José", "Luis", "Juan Pablo", "Miguel Ángel", "Jesús", "Martín", "Andrés", "Raúl",
+    "Óscar", "Rubén", "Sebastián", "Julián", "Joaquín", "Héctor", "Adrián", "Germán",
+    "Ramón", "Tomás", "Nicolás", "Emiliano", "Santiago", "Mateo", "Diego", "Fernando",
+    "Iñaki", "Ángel", "Efraín", "Simón",
+]
+NOMBRES_MUJER = [
+    "María José", "Sofía", "Valentina", "Ximena", "Regina", "Renata", "Mónica", "Verónica",
+    "Begoña", "Inés", "Lucía", "Raquel", "Angélica", "Mariana", "Daniela", "Fátima",
+    "Noemí", "Azucena", "Itzel", "Citlali", "Guadalupe", "Teresa", "Camila", "Natalia",
+    "Zoé", "Belén", "Dulce María", "Abigaíl",
+]
+APELLIDOS = [
+    "Hernández", "García", "Martínez", "López", "González", "Pérez", "Rodríguez", "Sánchez",
+    "Ramírez", "Cruz", "Flores", "Gómez", "Morales", "Vázquez", "Jiménez", "Reyes",
+    "Díaz", "Torres", "Gutiérrez", "Ruiz", "Mendoza", "Aguilar", "Ortiz", "Castillo",
+    "Núñez", "Muñoz", "Chávez", "Peña", "Ibáñez", "Ávila", "Domínguez", "Velázquez",
+]
+
+# Pesos aproximados de la inscripción real
+PLANTELES = {"Primaria": 50, "Secundaria": 30, "Preparatoria": 20}
+GRADOS = {"Primaria": 6, "Secundaria": 3, "Preparatoria": 3}
+GRUPOS = "ABC"
+ROLES_ADULTO = {
+    "ACOMPAÑANTE HOMBRE": 28,
+    "ACOMPAÑANTE MUJER": 40,
+    "ABUELITO": 8,
+    "ABUELITA": 12,
+}
+PESO_ALUMNO = 12  # el participante es el propio alumno
+HOMBRES = {"ACOMPAÑANTE HOMBRE", "ABUELITO"}
+
+
+def _rol_alumno(plantel: str, grado: int, hombre: bool) -> str:
+    sexo = "H" if hombre else "M"
+    if plantel == "Primaria":
+        return f"ALUMNOS LMA {'BAJA' if grado <= 3 else 'ALTA'}{sexo}"
+    return f"ALUMNOS LMA {'SEC' if plantel == 'Secundaria' else 'PREP'}{sexo}"
+
+
+def _nombre(rnd: random.Random, hombre: bool, primer_apellido: str | None = None) -> str:
+    nombre = rnd.choice(NOMBRES_HOMBRE if hombre else NOMBRES_MUJER)
+    return f"{nombre} {primer_apellido or rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}"
+
+
+_planteles, _pesos_plantel = list(PLANTELES), list(PLANTELES.values())
+_roles = [*ROLES_ADULTO, None]
+_pesos_rol = [*ROLES_ADULTO.values(), PESO_ALUMNO]
+
+
+def fila(rnd: random.Random) -> dict:
+    """Un registro aleatorio con los campos que captura el formulario."""
+    plantel = rnd.choices(_planteles, _pesos_plantel)[0]
+    grado_n = rnd.randint(1, GRADOS[plantel])
+    grado = f"{grado_n}{rnd.choice(GRUPOS)}"
+    alumno_hombre = rnd.random() < 0.5
+    apellido = rnd.choice(APELLIDOS)
+    alumno = _nombre(rnd, alumno_hombre, apellido)
+
+    role = rnd.choices(_roles, _pesos_rol)[0]
+    if role is None:
+        return {"full_name": alumno, "plantel": plantel, "child_name": alumno,
+                "grado": grado, "role": _rol_alumno(plantel, grado_n, alumno_hombre)}
+
+    # El adulto casi siempre comparte el primer apellido con el alumno
+    adulto = _nombre(rnd, role in HOMBRES, apellido if rnd.random() < 0.8 else None)
+    if rnd.random() < 0.05:  # a veces el formulario llega sin alumno/grado
+        alumno, grado = "", ""
+    return {"full_name": adulto, "plantel": plantel, "child_name": alumno, "grado": grado, "role": role}
+
+
+def sembrar(n: int, seed: int = 1, dias: float = 45, chunk_size: int = CHUNK_SIZE,
+            progreso=None) -> int:
+    """
+    Inserta n participantes con created_at creciente entre hace `dias`
+    días y ahora. `progreso(hechos)` se llama después de cada bloque.
+    """
+    rnd = random.Random(seed)
+    # Generador aparte para las fechas: los datos no dependen de chunk_size
+    rnd_fechas = random.Random(f"{seed}-fechas")
+    fin = timezone.now().replace(microsecond=0)
+    paso = timedelta(days=dias) / max(n, 1)
+    inicio = fin - timedelta(days=dias)
+
+    hechos = 0
+    while hechos < n:
+        tam = min(chunk_size, n - hechos)
+        filas = [fila(rnd) for _ in range(tam)]
+
+        por_plantel = {}
+        for f in filas:
+            por_plantel[f["plantel"]] = por_plantel.get(f["plantel"], 0) + 1
+        folios = {plantel: iter(reservar_folios(plantel, k)) for plantel, k in por_plantel.items()}
+
+        objetos, fechas = [], []
+        for i, f in enumerate(filas):
+            fechas.append(inicio + paso * (hechos + i) + timedelta(seconds=rnd_fechas.random() * paso.total_seconds()))
+            p = Participant(**f, clave=next(folios[f["plantel"]]))
+            p.nombre_clave = clave_duplicado(p.full_name, p.child_name, p.plantel)
+            objetos.append(p)
+
+        with transaction.atomic():
+            Participant.objects.bulk_create(objetos)
+            for p, creado in zip(objetos, fechas):
+                p.created_at = creado
+            Participant.objects.bulk_update(objetos, ["created_at"], batch_size=1000)
+            stats.sumar_participantes(objetos)
+        hechos += tam
+        if progreso:
+            progreso(hechos)
+    return hechos
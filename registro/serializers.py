@@ -1,5 +1,7 @@
 # registro/serializers.py
 # registro/serializers.py
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Participant
 
@@ -28,6 +30,14 @@ class ParticipantSerializer(serializers.ModelSerializer):
     clave = serializers.CharField(read_only=True)
     created_at = serializers.DateTimeField(read_only=True)
 
+    def __init__(self, *args, **kwargs):
+        # ?fields=id,clave,... → solo esos campos (sparse fieldsets)
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Participant
         fields = [
@@ -64,3 +74,46 @@ class ParticipantSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError({"grado": "Requerido para ALUMNO."})
         return attrs
 
+
+# =======================
+# Lectura rápida (listado)
+# =======================
+# Mismas llaves, orden y formato que ParticipantSerializer(many=True), pero
+# sobre dicts de .values(): sin instanciar modelos ni pasar cada campo por
+# el serializer. Los CharField devuelven el str de la BD tal cual y None
+# sigue siendo None, como en el serializer.
+
+CAMPOS_LECTURA = tuple(ParticipantSerializer.Meta.fields)
+
+
+def campos_lectura(fields) -> list:
+    """Los de ?fields= en el orden del serializer; todos si no se pidió ninguno."""
+    if not fields:
+        return list(CAMPOS_LECTURA)
+    return [f for f in CAMPOS_LECTURA if f in fields]
+
+
+def consulta_lectura(qs, campos):
+    """.values() con los campos pedidos más created_at (la posición del cursor)."""
+    extra = [] if "created_at" in campos else ["created_at"]
+    return qs.values(*campos, *extra)
+
+
+def representar_filas(filas, campos) -> list:
+    """
+    Dicts nuevos con solo los campos pedidos y created_at como texto, como
+    DateTimeField (hora local, ISO 8601, 'Z' en UTC). No toca `filas`: el
+    paginador lee de ahí la posición del cursor.
+    """
+    if "created_at" not in campos:
+        return [{c: fila[c] for c in campos} for fila in filas]
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+    salida = []
+    for fila in filas:
+        valor = fila["created_at"]
+        if valor:
+            valor = (valor.astimezone(tz) if tz is not None else valor).isoformat()
+            if valor.endswith("+00:00"):
+                valor = valor[:-6] + "Z"
+        salida.append({**fila, "created_at": valor or None})
+    return salida
@@ -0,0 +1,93 @@
+# registro/signals.py
+import logging
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import checkin, difusion, middleware, pdf_cache, stats
+from .models import Participant
+from .serializers import ParticipantSerializer
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Participant)
+def invalidar_pdf_al_editar(sender, instance, created, **kwargs):
+    if not created:
+        pdf_cache.invalidar(instance)
+        checkin.olvidar(instance.clave)
+
+
+@receiver(post_delete, sender=Participant)
+def invalidar_pdf_al_borrar(sender, instance, **kwargs):
+    # Con .only() sin clave no hay cómo saber la carpeta: el renglón ya no
+    # existe para cargarla. Sus PDFs los quita limpiar_pdfs_huerfanos
+    if "clave" not in instance.__dict__:
+        return
+    pdf_cache.invalidar(instance)
+    checkin.olvidar(instance.clave)
+
+
+# =======================
+# Contadores de estadísticas (stats.py)
+# =======================
+
+def _grupo(instance):
+    # __dict__ para no disparar consultas con campos diferidos (.only())
+    d = instance.__dict__
+    if "plantel" not in d or "role" not in d:
+        return None
+    return (d["plantel"], d["role"])
+
+
+@receiver(post_init, sender=Participant)
+def recordar_grupo(sender, instance, **kwargs):
+    instance._stats_grupo = _grupo(instance) if instance.pk else None
+    instance._stats_creado = instance.__dict__.get("created_at") if instance.pk else None
+
+
+def _difundir(grupos, instance=None):
+    # A los tableros en vivo (difusion.py), solo si la transacción se confirma
+    if not difusion.hay_suscriptores():
+        return
+    fila = dict(ParticipantSerializer(instance).data) if instance is not None else None
+    transaction.on_commit(lambda: difusion.publicar(grupos, fila))
+
+
+@receiver(post_save, sender=Participant)
+def contar_alta_o_cambio(sender, instance, created, **kwargs):
+    actual = _grupo(instance)
+    if created:
+        stats.sumar_grupo(*actual, 1)
+        stats.sumar_hora(instance.created_at, 1)
+        _difundir([(actual, 1)], instance)
+    else:
+        anterior = getattr(instance, "_stats_grupo", None)
+        if anterior and actual and anterior != actual:
+            stats.sumar_grupo(*anterior, -1)
+            stats.sumar_grupo(*actual, 1)
+            _difundir([(anterior, -1), (actual, 1)])
+    instance._stats_grupo = actual
+    instance._stats_creado = instance.created_at
+
+
+@receiver(post_delete, sender=Participant)
+def contar_baja(sender, instance, **kwargs):
+    # Sin tocar el renglón borrado: un campo diferido intentaría recargarlo
+    grupo = getattr(instance, "_stats_grupo", None) or _grupo(instance)
+    creado = getattr(instance, "_stats_creado", None) or instance.__dict__.get("created_at")
+    if grupo:
+        stats.sumar_grupo(*grupo, -1)
+        _difundir([(grupo, -1)])
+    stats.sumar_hora(creado, -1)
+    if not grupo or not creado:
+        logger.warning("Baja de participante %s sin plantel/rol/created_at cargados (.only()): "
+                       "los contadores pueden quedar desfasados, corre reconciliar_estadisticas", instance.pk)
+
+
+@receiver(connection_created)
+def medir_consultas(sender, connection, **kwargs):
+    # Cada conexión reporta sus consultas al request en curso (cualquier hilo)
+    middleware.instalar_medidor(connection)
@@ -0,0 +1,145 @@
+# registro/stats.py
+"""
+Contadores de estadísticas mantenidos al vuelo.
+
+Cada alta, baja o cambio de plantel/rol de un Participant ajusta
+ParticipantStat y RegistrationHour con UPDATE ... SET total = total ± 1
+dentro de la misma transacción (señales en signals.py). El endpoint de
+estadísticas solo lee estas tablas, que tienen unas decenas de filas.
+
+Todas las altas de la misma hora tocan el mismo renglón de
+RegistrationHour, así que ese candado dura lo que dure la transacción del
+alta: nada lento (el render del gafete) debe correr dentro de ella. Las
+vistas de registro confirman el alta y dibujan después.
+
+Las operaciones masivas que no disparan señales (bulk_create,
+QuerySet.update/delete) deben llamar a estas funciones o correr
+`manage.py reconciliar_estadisticas`.
+"""
+from collections import Counter
+from datetime import timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncHour
+
+from . import difusion
+from .models import Participant, ParticipantStat, RegistrationHour
+
+
+def hora_de(dt):
+    """Cubeta horaria en UTC."""
+    return dt.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _sumar(model, filtro: dict, delta: int) -> None:
+    if not delta:
+        return
+    qs = model.objects.filter(**filtro)
+    if qs.update(total=F("total") + delta):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(total=delta, **filtro)
+    except IntegrityError:
+        qs.update(total=F("total") + delta)
+
+
+def sumar_grupo(plantel: str, role: str, delta: int) -> None:
+    _sumar(ParticipantStat, {"plantel": plantel, "role": role}, delta)
+
+
+def sumar_hora(created_at, delta: int) -> None:
+    if created_at:
+        _sumar(RegistrationHour, {"hora": hora_de(created_at)}, delta)
+
+
+def sumar_participantes(participants, delta: int = 1) -> None:
+    """Ajusta los contadores para muchos participantes (p. ej. tras bulk_create)."""
+    grupos = Counter((p.plantel, p.role) for p in participants)
+    horas = Counter(hora_de(p.created_at) for p in participants if p.created_at)
+    with transaction.atomic():
+        for (plantel, role), n in grupos.items():
+            sumar_grupo(plantel, role, n * delta)
+        for hora, n in horas.items():
+            _sumar(RegistrationHour, {"hora": hora}, n * delta)
+        if difusion.hay_suscriptores():
+            transaction.on_commit(lambda: difusion.publicar([(g, n * delta) for g, n in grupos.items()]))
+
+
+# =======================
+# Lectura
+# =======================
+
+def leer_estadisticas() -> dict:
+    """Totales a partir de los contadores (sin tocar la tabla Participant)."""
+    grupos = list(ParticipantStat.objects.filter(total__gt=0).values_list("plantel", "role", "total"))
+    por_plantel, por_role = Counter(), Counter()
+    for plantel, role, n in grupos:
+        por_plantel[plantel] += n
+        por_role[role] += n
+
+    return {
+        "total": sum(por_plantel.values()),
+        "por_plantel": [{"plantel": k, "total": por_plantel[k]} for k in sorted(por_plantel)],
+        "por_role": [{"role": k, "total": por_role[k]} for k in sorted(por_role)],
+        "por_plantel_role": [
+            {"plantel": plantel, "role": role, "total": n} for plantel, role, n in sorted(grupos)
+        ],
+        "por_hora": [
+            {"hora": hora.isoformat(), "total": n}
+            for hora, n in RegistrationHour.objects.filter(total__gt=0)
+                                                   .order_by("hora")
+                                                   .values_list("hora", "total")
+        ],
+    }
+
+
+# =======================
+# Reconciliación
+# =======================
+
+def calcular_desde_cero():
+    """Conteos reales (escaneo completo; solo para reconciliar)."""
+    grupos = {
+        (r["plantel"], r["role"]): r["n"]
+        for r in Participant.objects.values("plantel", "role").annotate(n=Count("id"))
+    }
+    horas = {
+        r["h"]: r["n"]
+        for r in (Participant.objects
+                  .annotate(h=TruncHour("created_at", tzinfo=dt_timezone.utc))
+                  .values("h").annotate(n=Count("id")))
+        if r["h"] is not None
+    }
+    return grupos, horas
+
+
+def reconciliar(aplicar: bool = True) -> dict:
+    """
+    Compara contadores contra los conteos reales y, si `aplicar`, los
+    reescribe. Devuelve las diferencias encontradas {clave: (contador, real)}.
+    """
+    with transaction.atomic():
+        grupos, horas = calcular_desde_cero()
+        actuales_g = {(s.plantel, s.role): s.total for s in ParticipantStat.objects.all()}
+        actuales_h = {h.hora: h.total for h in RegistrationHour.objects.all()}
+
+        drift = {}
+        for k in set(grupos) | set(actuales_g):
+            if grupos.get(k, 0) != actuales_g.get(k, 0):
+                drift[k] = (actuales_g.get(k, 0), grupos.get(k, 0))
+        for k in set(horas) | set(actuales_h):
+            if horas.get(k, 0) != actuales_h.get(k, 0):
+                drift[k.isoformat()] = (actuales_h.get(k, 0), horas.get(k, 0))
+
+        if aplicar and drift:
+            ParticipantStat.objects.all().delete()
+            RegistrationHour.objects.all().delete()
+            ParticipantStat.objects.bulk_create(
+                ParticipantStat(plantel=p, role=r, total=n) for (p, r), n in grupos.items()
+            )
+            RegistrationHour.objects.bulk_create(
+                RegistrationHour(hora=h, total=n) for h, n in horas.items()
+            )
+    return drift
@@ -1,3 +1,1686 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+import zipfile
+import zlib
+from contextlib import contextmanager
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from reportlab import rl_config
+from reportlab.graphics.barcode import qrencoder
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.pdfgen.canvas import Canvas
+from rest_framework.renderers import JSONRenderer
+
+from . import admision, checkin, difusion, jobs, metricas, pdf_assets, pdf_cache, pdf_plantilla, pdf_pool, pdf_storage
+from . import benchmarks, pdf_generator, query_audit, replica, semilla
+from .folios import asignar_folio, participantes_por_folio, payload_qr, reservar_folios
+from .models import ROLE_CHOICES, BadgeJob, CheckIn, FolioCounter, Participant, ParticipantStat, RegistrationHour
+from .models import clave_duplicado
+from .query_audit import auditar
+from .renderers import ORJSONRenderer
+from .serializers import ParticipantSerializer
+from .importacion import importar
+from .stats import reconciliar
+from .pdf_generator import generar_credencial_bytes, generar_credencial_pdf
+from .pdf_lote import generar_lote_pdf
+
+DATOS_REGISTRO = {
+    "full_name": "María Pérez",
+    "plantel": "primaria",
+    "child_name": "Luis Pérez",
+    "grado": "3A",
+    "role": "acompañante mujer",
+}
+
+
+class MediaTempMixin:
+    """MEDIA_ROOT temporal para que las pruebas no escriban PDFs en el repo."""
+
+    def setUp(self):
+        super().setUp()
+        self._media = tempfile.mkdtemp()
+        self._media_override = override_settings(MEDIA_ROOT=self._media)
+        self._media_override.enable()
+
+    def tearDown(self):
+        self._media_override.disable()
+        shutil.rmtree(self._media, ignore_errors=True)
+        super().tearDown()
+
+
+# Las comparaciones de tiempo dependen de la máquina y de la carga: solo
+# corren con MARATON_PRUEBAS_TIEMPO=1. Los números para comparar commits
+# los da `manage.py medir_rendimiento`.
+solo_con_tiempos = skipUnless(os.environ.get("MARATON_PRUEBAS_TIEMPO") == "1",
+                              "comparación de tiempos (MARATON_PRUEBAS_TIEMPO=1)")
+
+
+# =======================
+# Folios
+# =======================
+
+class FolioAllocatorTests(TestCase):
+    def test_folios_consecutivos_por_plantel(self):
+        self.assertEqual(asignar_folio("primaria"), "Primaria0001")
+        self.assertEqual(asignar_folio("Primaria"), "Primaria0002")
+        self.assertEqual(asignar_folio("Secundaria"), "Secundaria0001")
+
+    def test_contador_nuevo_continua_claves_existentes(self):
+        Participant.objects.create(full_name="A", plantel="Preparatoria", role="ABUELITO",
+                                   clave="Preparatoria0041")
+        FolioCounter.objects.all().delete()
+        self.assertEqual(asignar_folio("Preparatoria"), "Preparatoria0042")
+
+    def test_save_usa_el_mismo_contador(self):
+        p = Participant.objects.create(full_name="A", plantel="Preparatoria", role="ABUELITA")
+        self.assertEqual(p.clave, "Preparatoria0001")
+        self.assertEqual(asignar_folio("Preparatoria"), "Preparatoria0002")
+
+    def test_reservar_bloque(self):
+        asignar_folio("Primaria")
+        self.assertEqual(reservar_folios("Primaria", 3),
+                         ["Primaria0002", "Primaria0003", "Primaria0004"])
+
+    def test_costo_constante(self):
+        asignar_folio("Primaria")
+        Participant.objects.bulk_create(
+            Participant(full_name=f"P{i}", plantel="Primaria", role="ABUELITO",
+                        clave=f"X{i:05d}")
+            for i in range(2000)
+        )
+        # Mismo número de consultas sin importar el tamaño de la tabla:
+        # SAVEPOINT, UPDATE, SELECT, RELEASE
+        with self.assertNumQueries(4):
+            asignar_folio("Primaria")
+
+
+class FolioConcurrencyTests(TransactionTestCase):
+    def test_sin_folios_duplicados_bajo_concurrencia(self):
+        asignar_folio("Primaria")
+        folios, errores = [], []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                for _ in range(20):
+                    f = asignar_folio("Primaria")
+                    with lock:
+                        folios.append(f)
+            except Exception as e:  # pragma: no cover - se reporta abajo
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=worker) for _ in range(8)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(len(folios), 160)
+        self.assertEqual(len(set(folios)), 160)
+        self.assertEqual(FolioCounter.objects.get(prefijo="Primaria").ultimo, 161)
+
+
+# =======================
+# Registro
+# =======================
+
+class RegisterViewTests(MediaTempMixin, TestCase):
+    def test_modo_sincrono_devuelve_pdf(self):
+        with mock.patch("registro.pdf_storage.AlmacenLocal._save") as escribir, \
+                mock.patch("registro.views.en_segundo_plano") as en_segundo_plano:
+            r = self.client.post(reverse("register"), DATOS_REGISTRO, content_type="application/json")
+            # Respuesta desde memoria: la subida a la caché queda para después
+            escribir.assert_not_called()
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "application/pdf")
+        self.assertTrue(r.content.startswith(b"%PDF"))
+        p = Participant.objects.get()
+        self.assertEqual(p.clave, "Primaria0001")
+
+        # En segundo plano se sube a la caché con los mismos bytes
+        fn, *args = en_segundo_plano.call_args.args
+        fn(*args)
+        nombre = pdf_cache.nombre_pdf(p, pdf_cache.huella(p))
+        with pdf_storage.storage().open(nombre, "rb") as f:
+            self.assertEqual(f.read(), r.content)
+
+    def test_render_fallido_conserva_el_folio(self):
+        with mock.patch("registro.pdf_cache.generar", side_effect=RuntimeError("sin fuente")):
+            r = self.client.post(reverse("register"), DATOS_REGISTRO, content_type="application/json",
+                                 headers={"Idempotency-Key": "llave-render"})
+        self.assertEqual(r.status_code, 500)
+        self.assertEqual(Participant.objects.get().clave, "Primaria0001")
+        # El reintento con la misma llave recupera el folio y dibuja el gafete
+        r = self.client.post(reverse("register"), DATOS_REGISTRO, content_type="application/json",
+                             headers={"Idempotency-Key": "llave-render"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Idempotent-Replay"], "true")
+        self.assertTrue(b"".join(r.streaming_content).startswith(b"%PDF"))
+        self.assertEqual(Participant.objects.count(), 1)
+
+    @override_settings(MARATON_PDF_EN_MEMORIA=False)
+    def test_modo_sincrono_desde_cache(self):
+        r = self.client.post(reverse("register"), DATOS_REGISTRO, content_type="application/json")
+        self.assertTrue(b"".join(r.streaming_content).startswith(b"%PDF"))
+        self.assertEqual(len(pdf_cache.listar()), 1)
+
+    @override_settings(MARATON_PDF_ASYNC=True, MARATON_PDF_WORKERS=0)
+    def test_modo_asincrono_encola_y_sirve_pdf(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.client.post(reverse("register"), DATOS_REGISTRO, content_type="application/json")
+        self.assertEqual(r.status_code, 202)
+        self.assertEqual(r.json()["clave"], "Primaria0001")
+        self.assertEqual(r.json()["status"], BadgeJob.PENDIENTE)
+
+        pdf_url = reverse("badge_job_pdf", args=[r.json()["job"]])
+        self.assertEqual(self.client.get(pdf_url).status_code, 409)
+
+        call_command("procesar_gafetes", stdout=io.StringIO())
+        estado = self.client.get(reverse("badge_job", args=[r.json()["job"]])).json()
+        self.assertEqual(estado["status"], BadgeJob.LISTO)
+
+        pdf = self.client.get(pdf_url)
+        self.assertEqual(pdf.status_code, 200)
+        self.assertTrue(b"".join(pdf.streaming_content).startswith(b"%PDF"))
+
+    @override_settings(MARATON_PDF_ASYNC=True, MARATON_PDF_WORKERS=0, MARATON_PDF_JOB_TIMEOUT_S=60)
+    def test_reencola_trabajos_atascados_en_procesando(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for nombre in ("Uno", "Dos"):
+                self.client.post(reverse("register"), dict(DATOS_REGISTRO, full_name=nombre),
+                                 content_type="application/json")
+        viejo, reciente = BadgeJob.objects.order_by("id")
+        # El worker murió con el primero a medias; el segundo lo está dibujando otro
+        BadgeJob.objects.filter(pk=viejo.pk).update(
+            status=BadgeJob.PROCESANDO, started_at=timezone.now() - datetime.timedelta(seconds=61))
+        BadgeJob.objects.filter(pk=reciente.pk).update(status=BadgeJob.PROCESANDO, started_at=timezone.now())
+
+        out = io.StringIO()
+        call_command("procesar_gafetes", stdout=out)
+        self.assertIn("1 trabajo(s) atascados", out.getvalue())
+        self.assertIn("1 gafete(s) procesados", out.getvalue())
+        viejo.refresh_from_db()
+        reciente.refresh_from_db()
+        self.assertEqual(viejo.status, BadgeJob.LISTO)
+        self.assertIsNotNone(viejo.started_at)
+        self.assertEqual(reciente.status, BadgeJob.PROCESANDO)
+
+
+@override_settings(MARATON_PDF_PERSISTIR=False)
+class RegisterConcurrenciaTests(MediaTempMixin, TransactionTestCase):
+    def test_render_no_bloquea_otro_registro(self):
+        dibujando, soltar = threading.Event(), threading.Event()
+        generar = pdf_cache.generar
+
+        def generar_lento(participant):
+            if participant.full_name == "Lento":
+                dibujando.set()
+                soltar.wait(10)
+            return generar(participant)
+
+        def registrar(nombre, salida):
+            try:
+                salida.append(self.client_class().post(
+                    reverse("register"), dict(DATOS_REGISTRO, full_name=nombre),
+                    content_type="application/json").status_code)
+            finally:
+                connection.close()
+
+        primero, segundo = [], []
+        with mock.patch("registro.pdf_cache.generar", generar_lento):
+            lento = threading.Thread(target=registrar, args=("Lento", primero))
+            lento.start()
+            self.assertTrue(dibujando.wait(5))
+            # Mismo plantel: mismo renglón de FolioCounter y mismos contadores
+            rapido = threading.Thread(target=registrar, args=("Rápido", segundo))
+            rapido.start()
+            rapido.join(5)
+            terminado_a_tiempo = not rapido.is_alive()
+            soltar.set()
+            lento.join(10)
+            rapido.join(30)
+
+        self.assertTrue(terminado_a_tiempo)
+        self.assertEqual(segundo, [200])
+        self.assertEqual(primero, [200])
+        self.assertEqual(set(Participant.objects.values_list("clave", flat=True)), {"Primaria0001", "Primaria0002"})
+        # Los dos pasaron por los mismos renglones de contadores sin perder ninguno
+        self.assertEqual(ParticipantStat.objects.get().total, 2)
+        self.assertEqual(sum(RegistrationHour.objects.values_list("total", flat=True)), 2)
+
+
+# =======================
+# PDF
+# =======================
+
+def _imagen_sin_cache(nombre, ancho_pt, alto_pt, opacidad=1.0):
+    """Comportamiento anterior: PNG original, nuevo ImageReader por gafete."""
+    from reportlab.lib.utils import ImageReader
+    return ImageReader(os.path.join(settings.BASE_DIR, "static", nombre))
+
+
+class PdfAssetCacheTests(MediaTempMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        pdf_assets.limpiar_cache()
+        self.p = Participant.objects.create(full_name="Ana", plantel="Primaria",
+                                            role="ABUELITA", child_name="Eva", grado="2B")
+
+    def _medir(self, n=3):
+        inicio = time.perf_counter()
+        for _ in range(n):
+            path = generar_credencial_pdf(self.p)
+        return (time.perf_counter() - inicio) / n, os.path.getsize(path)
+
+    def test_reutiliza_imagenes_hasta_que_cambia_el_archivo(self):
+        a = pdf_assets.imagen_gafete("logo_lma.png", 200, 100)
+        self.assertIs(pdf_assets.imagen_gafete("logo_lma.png", 200, 100), a)
+        self.assertLessEqual(a.getSize()[1], round(100 * settings.MARATON_PDF_IMAGE_DPI / 72))
+
+        key = next(iter(pdf_assets._cache))
+        mtime, reader = pdf_assets._cache[key]
+        pdf_assets._cache[key] = (mtime - 1, reader)  # simula archivo modificado
+        self.assertIsNot(pdf_assets.imagen_gafete("logo_lma.png", 200, 100), a)
+
+    def test_gafete_con_cache_pesa_menos(self):
+        with mock.patch("registro.pdf_plantilla.imagen_gafete", _imagen_sin_cache):
+            _, bytes_antes = self._medir(n=1)
+        _, bytes_despues = self._medir(n=1)
+        # Imágenes ya reducidas al tamaño dibujado
+        self.assertLess(bytes_despues, bytes_antes)
+
+    @solo_con_tiempos
+    def test_gafete_con_cache_es_mas_rapido(self):
+        with mock.patch("registro.pdf_plantilla.imagen_gafete", _imagen_sin_cache):
+            t_antes, _ = self._medir()
+        generar_credencial_pdf(self.p)  # calienta la caché
+        t_despues, _ = self._medir()
+        self.assertLess(t_despues, t_antes)
+
+    @solo_con_tiempos
+    def test_presupuesto_de_tiempo_del_qr(self):
+        generar_credencial_pdf(self.p)  # calienta la caché
+        with override_settings(MARATON_BADGE_QR=False):
+            t_sin, _ = self._medir()
+        t_con, _ = self._medir()
+        # El QR ya codificado agrega unos ms, no duplica el gafete
+        self.assertLess(t_con - t_sin, 0.010)
+
+    def test_qr_una_vez_por_pagina(self):
+        with override_settings(MARATON_BADGE_QR=False):
+            _, b_sin = self._medir(n=1)
+        _, b_con = self._medir(n=1)
+        self.assertLess(b_con - b_sin, 8 * 1024)
+
+        # Se codifica una vez por folio, no en cada gafete ni en cada mitad
+        pdf_generator._modulos_qr.cache_clear()
+        with mock.patch.object(qrencoder.QRCode, "make", autospec=True, side_effect=qrencoder.QRCode.make) as make:
+            for _ in range(3):
+                generar_credencial_pdf(self.p)
+        self.assertEqual(make.call_count, 1)
+
+        # Los mismos módulos que el QrCodeWidget de ReportLab, en un solo path
+        n, tramos = pdf_generator._modulos_qr(self.p.clave)
+        widget = QrCodeWidget(self.p.clave, barLevel="M")
+        self.assertEqual(len(tramos), len(widget.draw().contents) - 1)  # sin el rectángulo de fondo
+        self.assertEqual(n, widget.qr.getModuleCount())
+
+        # Un solo XObject con el QR, referenciado por las dos mitades
+        with mock.patch.object(Canvas, "doForm", autospec=True, side_effect=Canvas.doForm) as do_form:
+            path = generar_credencial_pdf(self.p)
+        qr = [args[1] for args, _ in do_form.call_args_list if args[1].startswith("qr_")]
+        self.assertEqual(qr, [f"qr_{self.p.clave}"] * 2)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read().count(b"/Subtype /Form"), 2)  # fondo + QR
+
+
+class PlantillaGafeteTests(MediaTempMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        pdf_plantilla.limpiar_cache()
+        for i in range(20):
+            Participant.objects.create(full_name=f"Adulto {i}", plantel="Primaria",
+                                       role="ABUELITO", child_name=f"Niño {i}", grado="1A")
+
+    def test_fondo_se_dibuja_una_vez_por_lote(self):
+        buf = io.BytesIO()
+        with mock.patch("registro.pdf_plantilla._dibujar_fondo",
+                        wraps=pdf_plantilla._dibujar_fondo) as fondo:
+            generar_lote_pdf(Participant.objects.order_by("id"), buf)
+        # una vez por mitad, solo al registrar la forma
+        self.assertEqual(fondo.call_count, 2)
+
+    def test_editar_json_cambia_version_y_huella(self):
+        p = Participant.objects.first()
+        h = pdf_cache.huella(p)
+        copia = os.path.join(self._media, "gafete.json")
+        with open(settings.MARATON_GAFETE_PLANTILLA, encoding="utf-8") as f:
+            data = json.load(f)
+        data["fondo"][4]["texto"] = "MARATÓN LMA 2026"
+        with open(copia, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        with override_settings(MARATON_GAFETE_PLANTILLA=copia):
+            self.assertNotEqual(pdf_cache.huella(p), h)
+            with open(generar_credencial_pdf(p), "rb") as f:
+                self.assertTrue(f.read().startswith(b"%PDF"))
+
+    @solo_con_tiempos
+    def test_benchmark_por_gafete(self):
+        """Plantilla + forma del fondo contra el dibujo imperativo de antes (todo en cada página)."""
+        participants = list(Participant.objects.order_by("id"))
+
+        def imperativo(c, participant):
+            plantilla = pdf_plantilla.cargar()
+            valores = pdf_generator.valores_gafete(participant)
+            for mitad in plantilla["mitades"]:
+                c.saveState()
+                c.translate(0, mitad["y"])
+                pdf_plantilla._dibujar_fondo(c, plantilla)
+                pdf_plantilla.dibujar_textos(c, plantilla, mitad["modo"], valores)
+                c.restoreState()
+
+        def medir():
+            inicio = time.perf_counter()
+            for p in participants[:5]:
+                generar_credencial_pdf(p)
+            individual = (time.perf_counter() - inicio) / 5
+            inicio = time.perf_counter()
+            generar_lote_pdf(participants, io.BytesIO())
+            return individual, (time.perf_counter() - inicio) / len(participants)
+
+        with override_settings(MARATON_BADGE_QR=False):
+            medir()  # calienta cachés de imágenes y plantilla
+            with mock.patch("registro.pdf_generator.dibujar_credencial", imperativo), \
+                 mock.patch("registro.pdf_lote.dibujar_credencial", imperativo), \
+                 mock.patch("registro.pdf_plantilla.registrar_imagen"):
+                ind_antes, lote_antes = medir()
+            ind, lote = medir()
+        self.assertLess(ind, ind_antes / 2)
+        self.assertLess(lote, lote_antes)
+        self.assertLess(lote, ind)
+
+    def test_imagenes_comprimidas_una_vez(self):
+        generar_credencial_bytes(Participant.objects.first())
+        with mock.patch("reportlab.pdfbase.pdfdoc.zlib.compress", wraps=zlib.compress) as comprimir:
+            data = generar_credencial_bytes(Participant.objects.last())
+        # Solo los streams de la página y de las formas; las imágenes ya venían comprimidas
+        self.assertLessEqual(comprimir.call_count, 3)
+        self.assertEqual(data.count(b"/Subtype /Image"), 6)  # 3 imágenes, cada una con su máscara alfa
+        # Binario: sin ASCII85 (MARATON_PDF_ASCII85, aplicado en apps.py)
+        self.assertEqual(rl_config.useA85, 0)
+        self.assertNotIn(b"ASCII85Decode", data)
+
+
+class ReprintCacheTests(MediaTempMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.p = Participant.objects.create(full_name="Ana", plantel="Primaria", role="ABUELITA")
+        self.url = reverse("reprint_pdf") + f"?q={self.p.clave.lower()}"
+
+    def test_miss_hit_y_304(self):
+        antes = pdf_cache.estadisticas()
+        r1 = self.client.get(self.url)
+        self.assertEqual(r1.status_code, 200)
+        self.assertEqual(r1["X-Cache"], "MISS")
+
+        r2 = self.client.get(self.url)
+        self.assertEqual(r2["X-Cache"], "HIT")
+        self.assertEqual(r2["ETag"], r1["ETag"])
+
+        r3 = self.client.get(self.url, HTTP_IF_NONE_MATCH=r1["ETag"])
+        self.assertEqual(r3.status_code, 304)
+        r4 = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=r1["Last-Modified"])
+        self.assertEqual(r4.status_code, 304)
+
+        despues = pdf_cache.estadisticas()
+        self.assertEqual(despues["misses"] - antes["misses"], 1)
+        # If-None-Match se resuelve sin tocar disco; If-Modified-Since sí lee la caché
+        self.assertEqual(despues["hits"] - antes["hits"], 2)
+
+    def test_editar_participante_invalida(self):
+        nombre, h, _ = pdf_cache.obtener_pdf(self.p)
+        self.assertTrue(pdf_storage.existe(nombre))
+        self.p.full_name = "Ana María"
+        self.p.save()
+        self.assertFalse(pdf_storage.existe(nombre))
+        self.assertNotEqual(pdf_cache.huella(self.p), h)
+
+    def test_ajustes_del_qr_cambian_huella(self):
+        h = pdf_cache.huella(self.p)
+        with override_settings(MARATON_QR_FIRMADO=True):
+            self.assertNotEqual(pdf_cache.huella(self.p), h)
+        with override_settings(MARATON_BADGE_QR=False):
+            self.assertNotEqual(pdf_cache.huella(self.p), h)
+
+    def test_purga_por_tamano_y_edad(self):
+        nombre, _, _ = pdf_cache.obtener_pdf(self.p)
+        self.assertEqual(pdf_cache.purgar(max_mb=1000, max_dias=30), 0)
+        self.assertEqual(pdf_cache.purgar(max_mb=0, max_dias=30), 1)
+        self.assertFalse(pdf_storage.existe(nombre))
+
+
+STORAGES_MEMORIA = {
+    **settings.STORAGES,
+    "gafetes": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+}
+
+
+class PdfStorageTests(MediaTempMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.p = Participant.objects.create(full_name="Ana", plantel="Primaria", role="ABUELITA")
+        self.url = reverse("reprint_pdf") + f"?q={self.p.clave}"
+
+    @override_settings(STORAGES=STORAGES_MEMORIA)
+    def test_storage_remoto_sin_rutas_locales(self):
+        # InMemoryStorage no implementa path(): hace las veces de S3
+        r = self.client.get(self.url)
+        self.assertEqual(r["X-Cache"], "MISS")
+        self.assertTrue(b"".join(r.streaming_content).startswith(b"%PDF"))
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "HIT")
+        self.assertEqual(len(pdf_cache.listar()), 1)
+        self.assertFalse(os.path.exists(os.path.join(self._media, "credenciales")))
+
+        self.p.full_name = "Ana María"
+        self.p.save()
+        self.assertEqual(pdf_cache.listar(), [])
+
+    def test_borrar_con_campos_diferidos(self):
+        self.client.get(self.url)
+        otro = Participant.objects.create(full_name="Beto", plantel="Primaria", role="ABUELITO")
+        self.client.get(reverse("reprint_pdf") + f"?q={otro.clave}")
+        self.assertEqual(len(pdf_cache.listar()), 2)
+
+        # Con la clave cargada se invalida; sin ella no se intenta leer el renglón borrado
+        Participant.objects.filter(pk=self.p.pk).only("id", "clave", "created_at").delete()
+        self.assertEqual(len(pdf_cache.listar()), 1)
+        with mock.patch("registro.pdf_cache.invalidar") as invalidar:
+            Participant.objects.filter(pk=otro.pk).only("id", "created_at").delete()
+        invalidar.assert_not_called()
+        self.assertFalse(Participant.objects.exists())
+        self.assertEqual(len(list(pdf_cache.huerfanos())), 1)
+
+    def test_modos_de_entrega(self):
+        # Sin disco local, x-sendfile cae a transmitir el archivo
+        with override_settings(MARATON_PDF_ENTREGA="x-sendfile", STORAGES=STORAGES_MEMORIA):
+            r = self.client.get(self.url)
+        self.assertNotIn("X-Sendfile", r)
+        self.assertTrue(b"".join(r.streaming_content).startswith(b"%PDF"))
+
+        with override_settings(MARATON_PDF_ENTREGA="x-accel", MARATON_PDF_XACCEL_PREFIX="/interno/"):
+            r = self.client.get(self.url)
+        self.assertEqual(r.content, b"")
+        self.assertRegex(r["X-Accel-Redirect"], r"^/interno/credenciales/cache/Primaria0001/\w+\.pdf$")
+        self.assertIn("Primaria0001.pdf", r["Content-Disposition"])
+
+        with override_settings(MARATON_PDF_ENTREGA="x-sendfile"):
+            r = self.client.get(self.url)
+        self.assertTrue(os.path.isfile(r["X-Sendfile"]))
+
+        with override_settings(MARATON_PDF_ENTREGA="redirect"):
+            r = self.client.get(self.url)
+        self.assertEqual(r.status_code, 302)
+        self.assertTrue(r["Location"].startswith(settings.MEDIA_URL + "credenciales/cache/"))
+
+
+    def test_limpiar_huerfanos(self):
+        otro = Participant.objects.create(full_name="Beto", plantel="Primaria", role="ABUELITO")
+        vigente, _, _ = pdf_cache.obtener_pdf(self.p)
+        viejo, _, _ = pdf_cache.obtener_pdf(otro)
+        Participant.objects.filter(pk=otro.pk).update(full_name="Roberto")  # sin señales
+        st = pdf_storage.storage()
+        legado = st.save("credenciales/Primaria0001.pdf", ContentFile(b"%PDF-1.4"))
+
+        out = io.StringIO()
+        call_command("limpiar_pdfs_huerfanos", simular=True, stdout=out)
+        self.assertIn("2 PDF(s) huérfanos por borrar", out.getvalue())
+        self.assertTrue(st.exists(viejo))
+
+        call_command("limpiar_pdfs_huerfanos", stdout=io.StringIO())
+        self.assertFalse(st.exists(viejo))
+        self.assertFalse(st.exists(legado))
+        self.assertTrue(st.exists(vigente))
+
+
+class BatchBadgesTests(MediaTempMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(4):
+            Participant.objects.create(full_name=f"Adulto {i}", plantel="Primaria", role="ABUELITO")
+        Participant.objects.create(full_name="Otro", plantel="Secundaria", role="ABUELITA")
+
+    def test_un_pdf_con_una_pagina_por_participante(self):
+        r = self.client.get(reverse("batch_badges"), {"plantel": "primaria"})
+        self.assertEqual(r.status_code, 200)
+        pdf = b"".join(r.streaming_content)
+        self.assertEqual(pdf.count(b"/Type /Page\n"), 4)
+
+    def test_imagenes_compartidas_entre_paginas(self):
+        uno, cuatro = io.BytesIO(), io.BytesIO()
+        generar_lote_pdf(Participant.objects.filter(plantel="Primaria")[:1], uno)
+        generar_lote_pdf(Participant.objects.filter(plantel="Primaria"), cuatro)
+        por_pagina = (len(cuatro.getvalue()) - len(uno.getvalue())) / 3
+        self.assertLess(por_pagina, 10 * 1024)
+
+    def test_filtros(self):
+        r = self.client.get(reverse("batch_badges"), {"folios": "Secundaria0001"})
+        self.assertEqual(b"".join(r.streaming_content).count(b"/Type /Page\n"), 1)
+        self.assertEqual(self.client.get(reverse("batch_badges"), {"desde": "ayer"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("batch_badges"), {"role": "TUTOR"}).status_code, 404)
+
+
+class RegenerarGafetesTests(MediaTempMixin, TransactionTestCase):
+    def test_paralelo_reanudable_y_zip(self):
+        for i in range(6):
+            Participant.objects.create(full_name=f"P{i}", plantel="Secundaria", role="ABUELITO")
+        zip_path = os.path.join(self._media, "gafetes.zip")
+
+        out = io.StringIO()
+        call_command("regenerar_gafetes", workers=2, lote=2, zip_path=zip_path, stdout=out)
+        self.assertIn("6 generados, 0 ya estaban", out.getvalue())
+        with zipfile.ZipFile(zip_path) as zf:
+            self.assertEqual(len(zf.namelist()), 6)
+
+        Participant.objects.filter(clave="Secundaria0001").update(full_name="Cambiado")
+        out = io.StringIO()
+        call_command("regenerar_gafetes", workers=1, stdout=out)
+        self.assertIn("1 generados, 5 ya estaban", out.getvalue())
+
+    def test_medir_reporta_gafetes_por_segundo(self):
+        Participant.objects.create(full_name="P", plantel="Secundaria", role="ABUELITO")
+        out = io.StringIO()
+        call_command("regenerar_gafetes", medir="1,2", stdout=out)
+        self.assertEqual(out.getvalue().count("gafetes/seg="), 2)
+
+
+# =======================
+# Listado
+# =======================
+
+class ParticipantListTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            Participant.objects.create(full_name=f"Adulto {i}", plantel="Primaria", role="ABUELITO")
+        Participant.objects.create(full_name="José Núñez", plantel="Secundaria", role="ABUELITA")
+
+    def test_paginacion_por_cursor(self):
+        r = self.client.get(reverse("participants_list"), {"page_size": 4})
+        self.assertEqual(len(r.json()["results"]), 4)
+        self.assertEqual(r.json()["results"][0]["full_name"], "José Núñez")
+        r2 = self.client.get(r.json()["next"])
+        self.assertEqual(len(r2.json()["results"]), 2)
+        self.assertIsNone(r2.json()["next"])
+
+    def test_filtros_busqueda_y_campos(self):
+        r = self.client.get(reverse("participants_list"), {"q": "núñez", "fields": "id,clave"})
+        self.assertEqual(r.json()["results"], [
+            {"id": Participant.objects.get(plantel="Secundaria").id, "clave": "Secundaria0001"},
+        ])
+        r = self.client.get(reverse("participants_list"), {"plantel": "primaria"})
+        self.assertEqual(len(r.json()["results"]), 5)
+
+    def test_etag_304_hasta_que_cambia_la_tabla(self):
+        r = self.client.get(reverse("participants_list"))
+        etag = r["ETag"]
+        self.assertEqual(self.client.get(reverse("participants_list"), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Participant.objects.create(full_name="Nuevo", plantel="Primaria", role="ABUELITO")
+        r = self.client.get(reverse("participants_list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+
+        # Bajas (contadores) y ediciones (updated_at) también cambian la versión
+        etag = r["ETag"]
+        Participant.objects.get(full_name="Adulto 1").delete()
+        r = self.client.get(reverse("participants_list"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        etag = r["ETag"]
+        p = Participant.objects.get(full_name="Adulto 2")
+        p.full_name = "Adulto dos"
+        p.save()
+        self.assertEqual(self.client.get(reverse("participants_list"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_sin_recorrer_la_tabla(self):
+        r = self.client.get(reverse("participants_list"))
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(
+                self.client.get(reverse("participants_list"), HTTP_IF_NONE_MATCH=r["ETag"]).status_code, 304)
+        self.assertEqual(len(consultas), 2)
+        sql = consultas[1]["sql"]
+        self.assertIn("ORDER BY", sql)
+        self.assertIn("LIMIT 1", sql)
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = " ".join(str(fila[-1]) for fila in cursor.fetchall())
+        self.assertIn("part_updated_idx", plan)
+
+    def test_ruta_rapida_mismos_bytes_que_el_serializer(self):
+        Participant.objects.create(full_name="Raro \u2028 \"x\"\n\x01", plantel="Primaria", role="ALUMNO",
+                                   child_name=None, grado=None)
+        Participant.objects.filter(full_name="Adulto 0").update(created_at=timezone.now().replace(microsecond=0))
+        qs = Participant.objects.order_by("-created_at", "-id")
+        for fields in ("", "id,clave", "created_at,full_name", "nada"):
+            with self.subTest(fields=fields):
+                r = self.client.get(reverse("participants_list"), {"page_size": 3, "fields": fields})
+                campos = [f for f in fields.split(",") if f]
+                esperado = ParticipantSerializer(qs[:3], many=True, fields=campos).data
+                self.assertEqual(JSONRenderer().render(esperado), JSONRenderer().render(r.json()["results"]))
+                self.assertIn(JSONRenderer().render(esperado)[1:-1], r.content)
+                # El cursor sale igual con dicts que con modelos
+                self.assertEqual(len(self.client.get(r.json()["next"]).json()["results"]), 3)
+
+    def test_renderer_orjson(self):
+        datos = {"a": ["ñ", None, 1, "\u2029"], "fecha": timezone.now(), "id": uuid.uuid4(), "n": 2 ** 70}
+        self.assertEqual(ORJSONRenderer().render(datos), JSONRenderer().render(datos))
+        self.assertEqual(ORJSONRenderer().render(datos, "application/json; indent=2"),
+                         JSONRenderer().render(datos, "application/json; indent=2"))
+        with mock.patch("registro.renderers.orjson", None):
+            self.assertEqual(ORJSONRenderer().render(datos), JSONRenderer().render(datos))
+        self.assertEqual(self.client.get(reverse("participants_list"), HTTP_ACCEPT="text/html").status_code, 406)
+
+
+# =======================
+# CSV
+# =======================
+
+class ExportCSVTests(TestCase):
+    def test_formato_y_filtros(self):
+        p = Participant.objects.create(full_name="José", plantel="Primaria", role="ABUELITO", grado="1A")
+        Participant.objects.create(full_name="Otra", plantel="Secundaria", role="ABUELITA")
+        r = self.client.get(reverse("export_csv"), {"plantel": "Primaria"})
+        filas = list(csv.reader(io.StringIO(b"".join(r.streaming_content).decode("utf-8"))))
+        self.assertEqual(filas[0][:2], ["ID", "Folio"])
+        self.assertEqual(filas[1], [str(p.id), "Primaria0001", "José", "Primaria", "", "1A", "ABUELITO",
+                                    p.created_at.strftime("%Y-%m-%d %H:%M")])
+        self.assertEqual(len(filas), 2)
+
+    def test_gzip(self):
+        Participant.objects.create(full_name="José", plantel="Primaria", role="ABUELITO")
+        r = self.client.get(reverse("export_csv"), {"gzip": "1"})
+        texto = gzip.decompress(b"".join(r.streaming_content)).decode("utf-8")
+        self.assertIn("José", texto)
+
+    def _pico_exportando(self):
+        r = self.client.get(reverse("export_csv"))
+        total = 0
+        tracemalloc.start()
+        try:
+            for bloque in r.streaming_content:
+                total += len(bloque)
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return total, pico
+
+    def _sembrar(self, desde, hasta):
+        Participant.objects.bulk_create(
+            (Participant(full_name=f"Participante número {i}", plantel="Primaria", role="ABUELITO",
+                         clave=f"Primaria{i:06d}", grado="3B") for i in range(desde, hasta)),
+            batch_size=5000,
+        )
+
+    def test_memoria_constante_con_100k_filas(self):
+        self._sembrar(0, 10_000)
+        total_10k, pico_10k = self._pico_exportando()
+        self._sembrar(10_000, 100_000)
+        total_100k, pico_100k = self._pico_exportando()
+
+        # 10x filas, misma memoria (con holgura para ruido del intérprete)
+        self.assertGreater(total_100k, 9 * total_10k)
+        self.assertLess(pico_100k, pico_10k * 1.5)
+
+
+# =======================
+# Estadísticas
+# =======================
+
+class StatsCountersTests(TestCase):
+    def _stats(self):
+        return self.client.get(reverse("participants_stats")).json()
+
+    def test_altas_cambios_y_bajas(self):
+        a = Participant.objects.create(full_name="A", plantel="Primaria", role="ABUELITO")
+        Participant.objects.create(full_name="B", plantel="Primaria", role="ABUELITA")
+        Participant.objects.create(full_name="C", plantel="Secundaria", role="ABUELITO")
+
+        a = Participant.objects.get(pk=a.pk)
+        a.role = "ABUELITA"
+        a.save()
+        Participant.objects.get(full_name="C").delete()
+
+        with self.assertNumQueries(2):
+            data = self._stats()
+        self.assertEqual(data["total"], 2)
+        self.assertEqual(data["por_plantel"], [{"plantel": "Primaria", "total": 2}])
+        self.assertEqual(data["por_role"], [{"role": "ABUELITA", "total": 2}])
+        self.assertEqual(data["por_plantel_role"], [{"plantel": "Primaria", "role": "ABUELITA", "total": 2}])
+        self.assertEqual(sum(h["total"] for h in data["por_hora"]), 2)
+        self.assertEqual(reconciliar(aplicar=False), {})
+
+    def test_bajas_con_campos_diferidos(self):
+        a = Participant.objects.create(full_name="A", plantel="Primaria", role="ABUELITO")
+        b = Participant.objects.create(full_name="B", plantel="Primaria", role="ABUELITO")
+
+        # Con plantel, rol y created_at cargados los contadores bajan
+        with self.assertNoLogs("registro.signals", level="WARNING"):
+            Participant.objects.filter(pk=a.pk).only("id", "clave", "plantel", "role", "created_at").delete()
+        self.assertEqual(reconciliar(aplicar=False), {})
+
+        # Sin ellos no se recarga el renglón borrado: se avisa y reconciliar lo corrige
+        with self.assertLogs("registro.signals", level="WARNING") as logs:
+            Participant.objects.filter(pk=b.pk).only("id").delete()
+        self.assertIn("reconciliar_estadisticas", logs.output[0])
+        self.assertFalse(Participant.objects.exists())
+        self.assertEqual(self._stats()["total"], 1)
+        reconciliar()
+        self.assertEqual(self._stats()["total"], 0)
+
+    def test_reconciliar_corrige_operaciones_masivas(self):
+        Participant.objects.bulk_create([
+            Participant(full_name="X", plantel="Preparatoria", role="ABUELITO", clave="Preparatoria0001"),
+        ])
+        self.assertEqual(self._stats()["total"], 0)
+
+        out = io.StringIO()
+        call_command("reconciliar_estadisticas", stdout=out)
+        self.assertIn("contador=0 real=1", out.getvalue())
+        self.assertEqual(self._stats()["total"], 1)
+        self.assertEqual(ParticipantStat.objects.get().total, 1)
+
+
+# =======================
+# Índices / planes de consulta
+# =======================
+
+class QueryPlanTests(TestCase):
+    def test_rutas_calientes_usan_indices(self):
+        planteles = ["Primaria", "Secundaria", "Preparatoria"]
+        Participant.objects.bulk_create(
+            (Participant(full_name=f"P{i}", plantel=planteles[i % 3], role="ABUELITO",
+                         clave=f"{planteles[i % 3]}{i:06d}",
+                         nombre_clave=clave_duplicado(f"P{i}", "", planteles[i % 3]))
+             for i in range(20_000)),
+            batch_size=5000,
+        )
+        resultados = auditar()
+        fallas = [(nombre, plan) for nombre, plan, ok in resultados if not ok]
+        self.assertEqual(fallas, [])
+        planes = {nombre: plan for nombre, plan, _ in resultados}
+        self.assertIn("part_updated_idx", planes["participants_etag"])
+        self.assertIn("part_plantel_role_name_idx", planes["export_csv"])
+
+    def test_lectura_completa_solo_falla_si_ordena_la_tabla(self):
+        tabla = Participant._meta.db_table
+        self.assertFalse(query_audit.plan_ordena_toda_la_tabla(
+            f"SCAN {tabla} USING INDEX part_plantel_role_name_idx", "sqlite"))
+        self.assertTrue(query_audit.plan_ordena_toda_la_tabla(
+            f"SCAN {tabla}\nUSE TEMP B-TREE FOR ORDER BY", "sqlite"))
+        self.assertTrue(query_audit.plan_ordena_toda_la_tabla(
+            f"Sort  (cost=1.0..2.0 rows=10 width=8)\n  Sort Key: plantel\n  ->  Seq Scan on {tabla}",
+            "postgresql"))
+        self.assertFalse(query_audit.plan_ordena_toda_la_tabla(
+            f"Index Scan using part_plantel_role_name_idx on {tabla}", "postgresql"))
+
+    def test_reimpresion_por_folio_sin_importar_mayusculas(self):
+        p = Participant.objects.create(full_name="A", plantel="Primaria", role="ABUELITO")
+        r = self.client.get(reverse("reprint_pdf"), {"q": "PRIMARIA0001"}, HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(participantes_por_folio(" primaria0001 ").get(), p)
+
+
+# =======================
+# Importación masiva
+# =======================
+
+class ImportParticipantsTests(MediaTempMixin, TestCase):
+    def test_json_con_errores_por_fila(self):
+        Participant.objects.create(full_name="Previo", plantel="Primaria", role="ABUELITO")
+        filas = [
+            {"full_name": "Uno", "plantel": "primaria", "role": "abuelito"},
+            {"full_name": "", "plantel": "Primaria", "role": "ABUELITO"},
+            {"full_name": "Dos", "plantel": "Secundaria", "role": "ABUELITA"},
+            {"full_name": "Tres", "plantel": "Primaria", "role": "ABUELITA"},
+        ]
+        r = self.client.post(reverse("import_participants"), filas, content_type="application/json")
+        self.assertEqual(r.status_code, 201)
+        data = r.json()
+        self.assertEqual(data["creados"], 3)
+        self.assertEqual([e["fila"] for e in data["errores"]], [2])
+        self.assertEqual([p["clave"] for p in data["participantes"]],
+                         ["Primaria0002", "Secundaria0001", "Primaria0003"])
+        self.assertEqual(asignar_folio("Primaria"), "Primaria0004")
+        self.assertEqual(reconciliar(aplicar=False), {})
+
+    def test_csv_multipart_con_pdfs_diferidos(self):
+        contenido = "Nombre participante;Plantel;Nombre alumno;Grado;Rol\nAna;Preparatoria;Luis;1A;ABUELITA\n"
+        archivo = SimpleUploadedFile("grupo.csv", contenido.encode("utf-8"), content_type="text/csv")
+        with self.captureOnCommitCallbacks(execute=False):
+            r = self.client.post(reverse("import_participants") + "?pdfs=1", {"archivo": archivo})
+        self.assertEqual(r.status_code, 201)
+        p = Participant.objects.get(clave="Preparatoria0001")
+        self.assertEqual((p.child_name, p.grado), ("Luis", "1A"))
+        self.assertEqual(BadgeJob.objects.get().participant, p)
+
+    def test_5000_filas_en_lotes(self):
+        planteles = ["Primaria", "Secundaria", "Preparatoria"]
+        filas = [{"full_name": f"Papá {i}", "plantel": planteles[i % 3], "role": "ACOMPAÑANTE HOMBRE"}
+                 for i in range(5000)]
+        with CaptureQueriesContext(connection) as consultas:
+            r = importar(filas)
+        self.assertEqual(r["creados"], 5000)
+        self.assertEqual(Participant.objects.values("clave").distinct().count(), 5000)
+        # Folios por plantel e INSERT por lotes, nunca una consulta por fila
+        self.assertLess(len(consultas), len(filas) // 20)
+
+
+# =======================
+# Idempotencia / duplicados
+# =======================
+
+class IdempotentRegisterTests(MediaTempMixin, TestCase):
+    def _post(self, datos=DATOS_REGISTRO, **headers):
+        return self.client.post(reverse("register"), datos, content_type="application/json", headers=headers)
+
+    @override_settings(MARATON_PDF_WORKERS=0)
+    def test_reintento_devuelve_mismo_folio_sin_render(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            r1 = self._post(**{"Idempotency-Key": "abc"})
+        self.assertEqual(r1.status_code, 200)
+        with mock.patch("registro.pdf_cache.generar_credencial_bytes") as render, \
+             mock.patch("registro.views.generar_clave") as folio:
+            r2 = self._post(**{"Idempotency-Key": "abc"})
+        render.assert_not_called()
+        folio.assert_not_called()
+        self.assertEqual(r2["Idempotent-Replay"], "true")
+        self.assertEqual(r2["Content-Disposition"], r1["Content-Disposition"])
+        self.assertEqual(Participant.objects.count(), 1)
+
+    def test_misma_llave_con_otros_datos(self):
+        self._post(**{"Idempotency-Key": "abc"})
+        r = self._post({**DATOS_REGISTRO, "full_name": "Otra"}, **{"Idempotency-Key": "abc"})
+        self.assertEqual(r.status_code, 422)
+
+    def test_marca_posible_duplicado(self):
+        self.assertNotIn("X-Posible-Duplicado", self._post())
+        r = self._post({**DATOS_REGISTRO, "full_name": "  MARIA   perez ", "child_name": "luis PÉREZ"})
+        self.assertEqual(r["X-Posible-Duplicado"], "Primaria0001")
+        self.assertEqual(Participant.objects.get(clave="Primaria0002").nombre_clave,
+                         clave_duplicado("María Pérez", "Luis Pérez", "Primaria"))
+
+
+# =======================
+# Check-in
+# =======================
+
+class CheckInTests(TestCase):
+    def setUp(self):
+        checkin._cache.clear()
+        self.p = Participant.objects.create(full_name="Ana", plantel="Primaria", role="ABUELITA")
+
+    def test_lookup_una_consulta_y_luego_cache(self):
+        with self.assertNumQueries(1):
+            r = self.client.get(reverse("checkin_lookup"), {"folio": " primaria0001"})
+        self.assertEqual(r.json()["full_name"], "Ana")
+        with self.assertNumQueries(0):
+            self.client.get(reverse("checkin_lookup"), {"folio": "PRIMARIA0001"})
+        self.assertEqual(self.client.get(reverse("checkin_lookup"), {"folio": "X1"}).status_code, 404)
+
+    def test_lookup_con_qr_firmado(self):
+        with override_settings(MARATON_QR_FIRMADO=True):
+            payload = payload_qr(self.p.clave)
+        self.assertNotEqual(payload, self.p.clave)
+        r = self.client.get(reverse("checkin_lookup"), {"folio": payload})
+        self.assertEqual(r.json()["clave"], self.p.clave)
+        r = self.client.get(reverse("checkin_lookup"), {"folio": payload[:-1] + "x"})
+        self.assertEqual(r.status_code, 404)
+        # Con la firma activa, un folio sin firma no encuentra a nadie
+        checkin._cache.clear()
+        with override_settings(MARATON_QR_FIRMADO=True):
+            r = self.client.get(reverse("checkin_lookup"), {"folio": self.p.clave})
+            self.assertEqual(r.status_code, 404)
+            r = self.client.get(reverse("checkin_lookup"), {"folio": payload})
+            self.assertEqual(r.json()["clave"], self.p.clave)
+
+    def test_editar_participante_refresca_cache(self):
+        checkin.buscar("Primaria0001")
+        self.p.full_name = "Ana María"
+        self.p.save()
+        self.assertEqual(checkin.buscar("Primaria0001")["full_name"], "Ana María")
+
+    @override_settings(MARATON_QR_FIRMADO=True)
+    def test_con_qr_firmado_editar_y_borrar_refrescan_cache(self):
+        payload = payload_qr(self.p.clave)
+        self.assertEqual(checkin.buscar(payload)["full_name"], "Ana")
+        self.p.full_name = "Ana María"
+        self.p.save()
+        self.assertEqual(checkin.buscar(payload)["full_name"], "Ana María")
+
+        self.p.delete()
+        self.assertIsNone(checkin.buscar(payload))
+        r = self.client.post(reverse("checkin"), {"folio": payload, "estacion": "meta"},
+                             content_type="application/json")
+        self.assertEqual(r.status_code, 404)
+
+    def test_checkin_conserva_primera_llegada(self):
+        r1 = self.client.post(reverse("checkin"), {"folio": "primaria0001", "estacion": "meta"},
+                              content_type="application/json")
+        self.assertEqual(r1.status_code, 201)
+        r2 = self.client.post(reverse("checkin"), {"folio": "Primaria0001", "estacion": "meta"},
+                              content_type="application/json")
+        self.assertEqual(r2.status_code, 200)
+        self.assertFalse(r2.json()["nuevo"])
+        self.assertEqual(CheckIn.objects.count(), 1)
+
+    def test_sync_en_lote(self):
+        Participant.objects.create(full_name="Beto", plantel="Secundaria", role="ABUELITO")
+        scans = [
+            {"folio": "primaria0001", "llegada": "2025-11-20T08:05:00-06:00"},
+            {"folio": "PRIMARIA0001", "llegada": "2025-11-20T08:01:00-06:00"},
+            {"folio": "secundaria0001"},
+            {"folio": "nadie"},
+        ]
+        with self.assertNumQueries(3):  # resolver folios + un INSERT + leer las filas del lote
+            r = self.client.post(reverse("checkin_sync"), {"estacion": "salida", "scans": scans},
+                                 content_type="application/json")
+        self.assertEqual(r.json()["registrados"], 2)
+        self.assertEqual([x.get("nuevo") for x in r.json()["resultados"]], [False, True, True, None])
+        self.assertFalse(r.json()["resultados"][3]["ok"])
+        self.assertEqual(CheckIn.objects.filter(estacion="salida").count(), 2)
+        self.assertEqual(CheckIn.objects.get(participant=self.p).llegada.minute, 1)
+
+    def test_sync_conserva_la_llegada_mas_temprana(self):
+        # Otra estación sincronizó antes una llegada posterior
+        self.client.post(reverse("checkin_sync"), {"estacion": "meta", "scans": [
+            {"folio": "primaria0001", "llegada": "2025-11-20T09:30:00-06:00"}]}, content_type="application/json")
+        r = self.client.post(reverse("checkin_sync"), {"estacion": "meta", "scans": [
+            {"folio": "primaria0001", "llegada": "2025-11-20T09:10:00-06:00"}]}, content_type="application/json")
+        self.assertEqual(r.json()["registrados"], 0)
+        self.assertTrue(r.json()["resultados"][0]["ok"])
+        self.assertFalse(r.json()["resultados"][0]["nuevo"])
+        self.assertEqual(CheckIn.objects.get(participant=self.p, estacion="meta").llegada.minute, 10)
+        # Una posterior no la mueve
+        self.client.post(reverse("checkin_sync"), {"estacion": "meta", "scans": [
+            {"folio": "primaria0001", "llegada": "2025-11-20T09:50:00-06:00"}]}, content_type="application/json")
+        self.assertEqual(CheckIn.objects.get(participant=self.p, estacion="meta").llegada.minute, 10)
+
+
+# =======================
+# Métricas
+# =======================
+
+class MetricasTests(MediaTempMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        metricas.limpiar()
+
+    def test_endpoint_metrics(self):
+        self.client.post(reverse("register"), DATOS_REGISTRO, content_type="application/json")
+        self.client.get(reverse("participants_list"))
+        b"".join(self.client.get(reverse("export_csv")).streaming_content)
+
+        texto = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('maraton_http_request_duration_seconds_count{endpoint="register",method="POST",status="2xx"} 1',
+                      texto)
+        self.assertRegex(texto, r'maraton_http_db_queries_sum\{endpoint="participants_list"\} [1-9]')
+        self.assertRegex(texto, r'maraton_http_response_size_bytes_sum\{endpoint="export_csv"\} [1-9]')
+        for fase in ("imagenes", "dibujo", "guardado"):
+            self.assertIn(f'maraton_pdf_render_duration_seconds_count{{fase="{fase}"}} 1', texto)
+
+        with override_settings(MARATON_METRICAS_TOKEN="s3creto"):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+            r = self.client.get(reverse("metrics"), headers={"Authorization": "Bearer s3creto"})
+            self.assertEqual(r.status_code, 200)
+
+    @override_settings(MARATON_SLOW_REQUEST_MS=1)
+    def test_log_de_requests_lentos_con_sql(self):
+        with self.assertLogs("registro.lentos", "WARNING") as logs:
+            self.client.post(reverse("register"), DATOS_REGISTRO, content_type="application/json")
+        self.assertIn("SLOW_REQUEST POST /api/register/", logs.output[0])
+        self.assertIn("INSERT INTO", logs.output[0])
+        self.assertIn('maraton_http_slow_requests_total{endpoint="register"} 1', metricas.exponer())
+
+    @solo_con_tiempos
+    def test_costo_por_observacion(self):
+        n = 50_000
+        inicio = time.perf_counter()
+        for i in range(n):
+            metricas.LATENCIA.observar(i / n, "bench", "GET", "2xx")
+        por_obs = (time.perf_counter() - inicio) / n
+        self.assertLess(por_obs, 20e-6)
+
+
+# =======================
+# Benchmarks
+# =======================
+
+class MedirRendimientoTests(MediaTempMixin, LiveServerTestCase):
+    def test_micro_y_carga_a_json(self):
+        salida = os.path.join(self._media, "bench.json")
+        out = io.StringIO()
+        # Ya estamos en la BD de pruebas: no hace falta otra desechable
+        call_command("medir_rendimiento", repeticiones=2, lectura_filas=40, url=self.live_server_url, sembrar=30,
+                     requests=40, concurrencia=4, json_path=salida, en_esta_bd=True, stdout=out)
+
+        with open(salida, encoding="utf-8") as f:
+            r = json.load(f)
+        self.assertIn("pdf_memoria", r["micro"])
+        self.assertIn("p95_ms", r["micro"]["generar_clave"])
+        self.assertTrue(r["lectura"]["identico"])
+        self.assertGreater(r["lectura"]["rapida"]["filas_por_seg"], 0)
+        self.assertEqual(r["carga"]["total"]["n"], 40)
+        self.assertEqual(r["carga"]["total"]["errores"], 0)
+        self.assertEqual(set(r["carga"]["endpoints"]), {"register", "participants", "export_csv", "reprint"})
+        self.assertGreaterEqual(r["carga"]["folios"], 30)
+        # los folios de los microbenchmarks se revierten
+        self.assertFalse(Participant.objects.filter(clave__startswith="Bench").exists())
+        self.assertIn("req/s", out.getvalue())
+
+    def test_micro_y_lectura_en_bd_desechable_por_default(self):
+        usada = []
+
+        @contextmanager
+        def desechable():
+            usada.append(True)
+            yield
+
+        with mock.patch("registro.benchmarks.bd_desechable", desechable), \
+             mock.patch("registro.benchmarks.micro", return_value={}) as micro:
+            call_command("medir_rendimiento", solo="micro", stdout=io.StringIO())
+        self.assertEqual(usada, [True])
+        micro.assert_called_once()
+
+    def test_folios_de_la_carga_vienen_del_servidor(self):
+        semilla.sembrar(3, seed=2)
+        claves = set(Participant.objects.values_list("clave", flat=True))
+        # La BD local no se consulta: los folios salen del listado de --url
+        with mock.patch.object(Participant.objects, "values_list", side_effect=AssertionError):
+            self.assertEqual(set(benchmarks.folios_del_servidor(self.live_server_url)), claves)
+
+    def test_comparar_sync_contra_async(self):
+        salida = os.path.join(self._media, "comparacion.json")
+        call_command("medir_rendimiento", solo="carga", url=self.live_server_url, sembrar=5, requests=12,
+                     concurrencia=3, mezcla="register=1,reprint=2", comparar_async=True,
+                     json_path=salida, stdout=io.StringIO())
+
+        with open(salida, encoding="utf-8") as f:
+            r = json.load(f)["comparacion"]
+        self.assertEqual(set(r["sync"]["endpoints"]), {"register", "reprint"})
+        self.assertEqual(set(r["async"]["endpoints"]), {"register_async", "reprint_async"})
+        for modo in ("sync", "async"):
+            self.assertEqual(r[modo]["total"]["n"], 12)
+            self.assertEqual(r[modo]["total"]["errores"], 0)
+
+
+# =======================
+# Datos de prueba (semilla)
+# =======================
+
+class GenerarParticipantesTests(TestCase):
+    def _filas(self):
+        return list(Participant.objects.order_by("id").values_list(
+            "full_name", "child_name", "grado", "plantel", "role"))
+
+    def test_datos_realistas_y_deterministas(self):
+        out = io.StringIO()
+        call_command("generar_participantes", 300, seed=5, chunk_size=120, dias=10, stdout=out)
+        self.assertIn("300 participante(s) generados", out.getvalue())
+
+        qs = Participant.objects.all()
+        self.assertEqual(qs.count(), 300)
+        self.assertEqual(set(qs.values_list("plantel", flat=True)), {"Primaria", "Secundaria", "Preparatoria"})
+        roles_validos = {r for r, _ in ROLE_CHOICES}
+        roles = set(qs.values_list("role", flat=True))
+        self.assertLessEqual(roles, roles_validos)
+        self.assertTrue(any(r.startswith("ALUMNOS") for r in roles))
+        self.assertTrue(qs.filter(full_name__regex=r"[áéíóúñÁÉÍÓÚÑ]").exists())
+
+        for p in qs:
+            self.assertTrue(p.clave.startswith(p.plantel))
+            self.assertEqual(p.nombre_clave, clave_duplicado(p.full_name, p.child_name, p.plantel))
+        fechas = sorted(qs.values_list("created_at", flat=True))
+        self.assertGreater((fechas[-1] - fechas[0]).days, 8)
+        # bulk_create no dispara señales: los contadores se suman por bloque
+        self.assertEqual(reconciliar(aplicar=False), {})
+        self.assertTrue(Participant._meta.get_field("created_at").auto_now_add)
+
+        filas = self._filas()
+        Participant.objects.all().delete()
+        call_command("generar_participantes", 300, seed=5, chunk_size=50, dias=10, stdout=io.StringIO())
+        self.assertEqual(self._filas(), filas)
+
+    def test_altas_normales_durante_la_siembra(self):
+        # La siembra no toca la definición del modelo: un alta de otro hilo a media
+        # siembra sigue recibiendo su created_at de auto_now_add
+        en_vivo = []
+
+        def progreso(hechos):
+            en_vivo.append(Participant.objects.create(full_name=f"En vivo {hechos}", plantel="Primaria",
+                                                      role="TUTOR"))
+
+        antes = timezone.now()
+        semilla.sembrar(20, seed=3, chunk_size=10, dias=10, progreso=progreso)
+        self.assertEqual(len(en_vivo), 2)
+        for p in en_vivo:
+            p.refresh_from_db()
+            self.assertGreaterEqual(p.created_at, antes)
+        sembrados = Participant.objects.exclude(pk__in=[p.pk for p in en_vivo])
+        # ...y los sembrados conservan las fechas del padrón, no la del INSERT
+        self.assertLess(min(sembrados.values_list("created_at", flat=True)), antes - datetime.timedelta(days=8))
+
+
+# =======================
+# Vistas async (ASGI)
+# =======================
+
+@override_settings(MARATON_PDF_WORKERS=0)
+class AsyncViewsTests(MediaTempMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        metricas.limpiar()
+
+    async def _registrar(self, datos=DATOS_REGISTRO, **headers):
+        return await self.async_client.post(reverse("register_async"), datos,
+                                            content_type="application/json", headers=headers)
+
+    async def test_registro_devuelve_pdf_y_lo_guarda(self):
+        r = await self._registrar()
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "application/pdf")
+        self.assertTrue(r.content.startswith(b"%PDF"))
+        p = await Participant.objects.aget()
+        self.assertEqual(p.clave, "Primaria0001")
+        self.assertEqual(await ParticipantStat.objects.aget(plantel="Primaria"), await ParticipantStat.objects.afirst())
+
+        # Ya en la caché de reimpresión: la versión async la sirve como HIT
+        r = await self.async_client.get(reverse("reprint_pdf_async"), {"q": "primaria0001"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["X-Cache"], "HIT")
+        self.assertTrue(b"".join([b async for b in r.streaming_content]).startswith(b"%PDF"))
+        r = await self.async_client.get(reverse("reprint_pdf_async"), {"q": "primaria0001"},
+                                        headers={"If-None-Match": r["ETag"]})
+        self.assertEqual(r.status_code, 304)
+
+    async def test_errores_idempotencia_y_duplicados(self):
+        r = await self._registrar({**DATOS_REGISTRO, "plantel": ""})
+        self.assertEqual(r.status_code, 400)
+        self.assertIn("plantel", r.json())
+
+        r1 = await self._registrar(Idempotency_Key="llave-1")
+        r2 = await self._registrar(Idempotency_Key="llave-1")
+        self.assertEqual(r2["Idempotent-Replay"], "true")
+        self.assertEqual(b"".join([b async for b in r2.streaming_content]), r1.content)
+        r3 = await self._registrar({**DATOS_REGISTRO, "grado": "4B"}, Idempotency_Key="llave-1")
+        self.assertEqual(r3.status_code, 422)
+
+        r4 = await self._registrar()
+        self.assertEqual(r4["X-Posible-Duplicado"], "Primaria0001")
+        self.assertEqual(await Participant.objects.acount(), 2)
+
+        r = await self.async_client.get(reverse("reprint_pdf_async"), {"q": "Secundaria0009"})
+        self.assertEqual(r.status_code, 404)
+
+    @override_settings(MARATON_PDF_ASYNC=True)
+    async def test_modo_trabajo_en_segundo_plano(self):
+        r = await self._registrar()
+        self.assertEqual(r.status_code, 202)
+        self.assertEqual(r.json()["clave"], "Primaria0001")
+        self.assertEqual(await BadgeJob.objects.filter(participant__clave="Primaria0001").acount(), 1)
+
+    @override_settings(MARATON_PDF_WORKERS=0, MARATON_PDF_EN_MEMORIA=True, MARATON_PDF_PERSISTIR=True)
+    async def test_sin_workers_la_subida_no_bloquea_el_event_loop(self):
+        hilos = []
+
+        def guardar(nombre, data):
+            try:
+                asyncio.get_running_loop()
+                hilos.append("event loop")
+            except RuntimeError:
+                hilos.append("otro hilo")
+
+        with mock.patch("registro.pdf_cache.guardar", guardar):
+            r = await self._registrar()
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(hilos, ["otro hilo"])
+
+    async def test_middleware_async_mide_y_transmite(self):
+        await self._registrar()
+        r = await self.async_client.get(reverse("export_csv"))
+        # El CSV de la vista síncrona llega como iterador async, bloque por bloque
+        self.assertTrue(r.is_async)
+        csv_bytes = b"".join([b async for b in r.streaming_content])
+        self.assertIn("Primaria0001", csv_bytes.decode("utf-8"))
+
+        texto = metricas.exponer()
+        # Las consultas de la vista async corren en otro hilo y también se cuentan
+        self.assertRegex(texto, r'maraton_http_db_queries_sum\{endpoint="register_async"\} [1-9]')
+        self.assertRegex(texto, r'maraton_http_response_size_bytes_sum\{endpoint="export_csv"\} [1-9]')
+
+    @override_settings(MARATON_PDF_POOL="process", MARATON_PDF_POOL_WORKERS=1)
+    def test_pool_de_procesos(self):
+        pdf_pool.cerrar()
+        self.addCleanup(pdf_pool.cerrar)
+        p = Participant.objects.create(full_name="Ana", plantel="Primaria", role="ABUELITA", clave="Primaria0042")
+        data = async_to_sync(pdf_pool.ejecutar)(generar_credencial_bytes, p)
+        self.assertTrue(data.startswith(b"%PDF"))
+
+
+# =======================
+# Control de admisión
+# =======================
+
+BACKENDS_ADMISION = ("registro.admision.BackendLocal", "registro.admision.BackendCache")
+
+
+@override_settings(MARATON_ADMISION=True, MARATON_ADMISION_RENDERS=1, MARATON_ADMISION_TASA=0,
+                   MARATON_ADMISION_RETRY_AFTER=3)
+class AdmisionTests(MediaTempMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        metricas.limpiar()
+        cache.clear()
+        admision._compuerta = None
+
+    def _reprint(self, **kw):
+        return self.client.get(reverse("reprint_pdf"), {"q": "Primaria0404"}, **kw)
+
+    @override_settings(MARATON_ADMISION_TASA=1, MARATON_ADMISION_RAFAGA=2)
+    def test_token_bucket_por_cliente(self):
+        for backend in BACKENDS_ADMISION:
+            with self.subTest(backend=backend), override_settings(MARATON_ADMISION_BACKEND=backend):
+                cache.clear()
+                self.assertEqual(self._reprint().status_code, 404)
+                self.assertEqual(self._reprint().status_code, 404)
+                r = self._reprint()
+                self.assertEqual(r.status_code, 429)
+                self.assertEqual(r["Retry-After"], "1")
+                # Sin proxies configurados, X-Forwarded-For no cambia de cliente
+                self.assertEqual(self._reprint(HTTP_X_FORWARDED_FOR="10.0.0.8").status_code, 429)
+                # Detrás de un proxy, la IP que agrega el proxy tiene su propia ráfaga
+                with override_settings(MARATON_PROXIES_CONFIABLES=1):
+                    self.assertEqual(self._reprint(HTTP_X_FORWARDED_FOR="1.2.3.4, 10.0.0.8").status_code, 404)
+                    self.assertEqual(self._reprint(HTTP_X_FORWARDED_FOR="5.6.7.8, 10.0.0.8").status_code, 404)
+                # Las rutas fuera de MARATON_ADMISION_RUTAS no cuentan
+                self.assertEqual(self.client.get(reverse("participants_list")).status_code, 200)
+        self.assertIn('maraton_admision_rechazos_total{motivo="cliente"} 4', metricas.exponer())
+
+    def test_cupo_y_cola_acotada(self):
+        for backend in BACKENDS_ADMISION:
+            with self.subTest(backend=backend), override_settings(MARATON_ADMISION_BACKEND=backend):
+                compuerta = admision.compuerta()
+                self.assertTrue(compuerta.entrar_sin_esperar())  # otro request ocupa el único lugar
+                try:
+                    with override_settings(MARATON_ADMISION_COLA=0):
+                        r = self._reprint()
+                    self.assertEqual(r.status_code, 503)
+                    self.assertEqual(r["Retry-After"], "3")
+
+                    with override_settings(MARATON_ADMISION_COLA=1, MARATON_ADMISION_ESPERA_MS=50):
+                        inicio = time.perf_counter()
+                        r = self.client.post(reverse("register"), DATOS_REGISTRO, content_type="application/json")
+                    self.assertEqual(r.status_code, 503)
+                    self.assertLess(time.perf_counter() - inicio, 1)
+                finally:
+                    compuerta.salir()
+                self.assertEqual(self._reprint().status_code, 404)
+        self.assertFalse(Participant.objects.exists())
+
+        texto = metricas.exponer()
+        self.assertIn('maraton_admision_rechazos_total{motivo="cola_llena"} 2', texto)
+        self.assertIn('maraton_admision_rechazos_total{motivo="espera"} 2', texto)
+        self.assertIn("maraton_admision_en_curso 0", texto)
+        self.assertIn("maraton_admision_cola 0", texto)
+        # El rechazo se mide con el nombre de la ruta
+        self.assertIn('maraton_http_request_duration_seconds_count{endpoint="register",method="POST",status="5xx"} 2',
+                      texto)
+
+    @override_settings(MARATON_ADMISION_COLA=1, MARATON_ADMISION_ESPERA_MS=5000)
+    def test_en_cola_pasa_al_liberarse_el_lugar(self):
+        for backend in BACKENDS_ADMISION:
+            with self.subTest(backend=backend), override_settings(MARATON_ADMISION_BACKEND=backend):
+                metricas.limpiar()
+                compuerta = admision.compuerta()
+                self.assertTrue(compuerta.entrar_sin_esperar())
+                resultado = {}
+                hilo = threading.Thread(target=lambda: resultado.update(r=self._reprint()))
+                hilo.start()
+                while "maraton_admision_cola 1" not in metricas.exponer():
+                    time.sleep(0.005)
+                time.sleep(0.05)
+                compuerta.salir()
+                hilo.join(5)
+                self.assertEqual(resultado["r"].status_code, 404)
+                self.assertRegex(metricas.exponer(), r"maraton_admision_espera_seconds_sum 0\.0[5-9]")
+
+    async def test_ruta_async(self):
+        compuerta = admision.compuerta()
+        self.assertTrue(compuerta.entrar_sin_esperar())
+        try:
+            with override_settings(MARATON_ADMISION_COLA=1, MARATON_ADMISION_ESPERA_MS=20):
+                r = await self.async_client.get(reverse("reprint_pdf_async"), {"q": "Primaria0404"})
+            self.assertEqual(r.status_code, 503)
+        finally:
+            compuerta.salir()
+        r = await self.async_client.get(reverse("reprint_pdf_async"), {"q": "Primaria0404"})
+        self.assertEqual(r.status_code, 404)
+        self.assertIn('maraton_admision_rechazos_total{motivo="espera"} 1', metricas.exponer())
+
+    @override_settings(MARATON_ADMISION_COLA=1, MARATON_ADMISION_ESPERA_MS=5000)
+    async def test_cancelar_en_cola_no_deja_lugar_tomado(self):
+        for backend in BACKENDS_ADMISION:
+            with self.subTest(backend=backend), override_settings(MARATON_ADMISION_BACKEND=backend):
+                compuerta = admision.compuerta()
+                self.assertTrue(compuerta.entrar_sin_esperar())
+                # El cliente se desconecta mientras espera en la cola
+                espera = asyncio.ensure_future(
+                    self.async_client.get(reverse("reprint_pdf_async"), {"q": "Primaria0404"}))
+                while compuerta._en_cola == 0:
+                    await asyncio.sleep(0.005)
+                espera.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await espera
+                self.assertEqual(compuerta._en_cola, 0)
+                compuerta.salir()
+                # Con RENDERS=1 el único lugar vuelve a estar libre
+                self.assertTrue(compuerta.entrar_sin_esperar())
+                compuerta.salir()
+        self.assertIn("maraton_admision_en_curso 0", metricas.exponer())
+
+    @override_settings(MARATON_PDF_ASYNC=True, MARATON_PDF_WORKERS=0)
+    def test_gafetes_en_segundo_plano_ocupan_lugar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.client.post(reverse("register"), DATOS_REGISTRO, content_type="application/json")
+        self.assertEqual(r.status_code, 202)
+        job = BadgeJob.objects.get()
+
+        compuerta = admision.compuerta()
+        self.assertTrue(compuerta.entrar_sin_esperar())
+        # El gafete espera a que se libere el lugar, sin rechazo
+        threading.Timer(0.1, compuerta.salir).start()
+        inicio = time.perf_counter()
+        self.assertTrue(jobs.procesar_job(job.pk))
+        self.assertGreaterEqual(time.perf_counter() - inicio, 0.1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, BadgeJob.LISTO)
+        self.assertIn("maraton_admision_en_curso 0", metricas.exponer())
+
+    @override_settings(MARATON_ADMISION=False, MARATON_ADMISION_COLA=0)
+    def test_desactivado(self):
+        compuerta = admision.compuerta()
+        self.assertTrue(compuerta.entrar_sin_esperar())
+        self.addCleanup(compuerta.salir)
+        self.assertEqual(self._reprint().status_code, 404)
+
+
+# =======================
+# Réplica de lectura
+# =======================
+# Las pruebas con dos bases necesitan una réplica configurada; el resto de
+# la suite supone una sola base, así que se corren aparte:
+#   REPLICA_DATABASE_URL=sqlite:////tmp/replica.sqlite3 python manage.py test registro.tests.ReplicaTests
+
+class RouterReplicaTests(TestCase):
+    def setUp(self):
+        self.router = replica.RouterReplica()
+        disponible = mock.patch.object(replica, "disponible", return_value=True)
+        disponible.start()
+        self.addCleanup(disponible.stop)
+
+    def test_decide_por_request(self):
+        self.assertIsNone(self.router.db_for_read(Participant))  # fuera de un request
+        with replica.lectura(True):
+            self.assertEqual(self.router.db_for_read(Participant), "replica")
+            self.assertIsNone(self.router.db_for_read(FolioCounter))
+            self.assertEqual(self.router.db_for_write(Participant), "default")
+            self.assertIsNone(self.router.db_for_read(Participant))  # ya escribió
+        with replica.lectura(False):
+            self.assertIsNone(self.router.db_for_read(Participant))
+        with replica.lectura(True, fijada=True):
+            self.assertIsNone(self.router.db_for_read(Participant))
+        with replica.lectura(True):
+            replica.disponible.return_value = False
+            self.assertIsNone(self.router.db_for_read(Participant))
+
+    @override_settings(MARATON_REPLICA_RUTAS={"participants_list", "export_csv"})
+    def test_csv_transmitido_nunca_lee_de_la_replica(self):
+        # Un fallo de la réplica a media descarga no se puede repetir: 200 truncado
+        with mock.patch.object(replica, "configurada", return_value=True), \
+                mock.patch.object(replica, "lectura", wraps=replica.lectura) as lectura:
+            b"".join(self.client.get(reverse("export_csv")).streaming_content)
+        self.assertEqual([c.args[0] for c in lectura.call_args_list], [False])
+
+    def test_sin_replica_el_middleware_no_marca_nada(self):
+        with mock.patch.object(replica, "configurada", return_value=False), \
+                mock.patch.object(replica, "lectura") as lectura:
+            self.assertEqual(self.client.get(reverse("participants_list")).status_code, 200)
+        lectura.assert_not_called()
+
+
+CON_REPLICA = "replica" in settings.DATABASES
+
+
+@skipUnless(CON_REPLICA, "sin REPLICA_DATABASE_URL")
+class ReplicaTests(TestCase):
+    databases = {"default", "replica"} if CON_REPLICA else {"default"}
+
+    def setUp(self):
+        replica._caida_hasta = replica._revisada = 0.0
+        metricas.limpiar()
+        # Las dos bases de prueba están separadas: la réplica "va atrasada"
+        Participant.objects.using("replica").create(full_name="En réplica", plantel="Primaria",
+                                                    role="ABUELITO", clave="Primaria0900")
+
+    def _nombres(self, **kw):
+        return [p["full_name"] for p in self.client.get(reverse("participants_list"), **kw).json()["results"]]
+
+    def test_lecturas_de_la_replica_y_escrituras_a_la_primaria(self):
+        r = self.client.post(reverse("register"), DATOS_REGISTRO, content_type="application/json")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(Participant.objects.using("default").get().clave, "Primaria0001")
+        self.assertFalse(Participant.objects.using("replica").filter(clave="Primaria0001").exists())
+
+        # Quien acaba de escribir lee de la primaria mientras dure la cookie
+        self.assertIn(replica.COOKIE_FIJAR, r.cookies)
+        self.assertEqual(self._nombres(), ["María Pérez"])
+        self.client.cookies.clear()
+        self.assertEqual(self._nombres(), ["En réplica"])
+        # El CSV se transmite: siempre de la primaria
+        csv_texto = b"".join(self.client.get(reverse("export_csv")).streaming_content).decode("utf-8")
+        self.assertNotIn("Primaria0900", csv_texto)
+        # Reimpresión no está en MARATON_REPLICA_RUTAS: primaria
+        self.assertEqual(self.client.get(reverse("reprint_pdf"), {"q": "Primaria0900"}).status_code, 404)
+
+    def test_replica_caida_lee_de_la_primaria(self):
+        Participant.objects.create(full_name="En primaria", plantel="Primaria", role="ABUELITO")
+        with connections["replica"].cursor() as cursor:
+            cursor.execute("DROP TABLE registro_participant")  # se revierte con la prueba
+        self.assertEqual(self._nombres(), ["En primaria"])
+        self.assertIn("maraton_replica_fallas_total 1", metricas.exponer())
+        # Mientras está marcada caída ni se intenta
+        self.assertEqual(self._nombres(), ["En primaria"])
+        self.assertIn("maraton_replica_fallas_total 1", metricas.exponer())
+
+
+# =======================
+# Estadísticas en vivo (SSE)
+# =======================
+
+def _evento_sse(bloque: bytes):
+    lineas = dict(linea.split(": ", 1) for linea in bloque.decode("utf-8").strip().split("\n"))
+    return lineas["event"], json.loads(lineas["data"])
+
+
+@override_settings(MARATON_SSE_AGRUPAR_MS=0, MARATON_SSE_LATIDO_S=30, MARATON_SSE_RESYNC_S=3600)
+class EstadisticasEnVivoTests(TestCase):
+    def setUp(self):
+        metricas.limpiar()
+        Participant.objects.create(full_name="Antes", plantel="Primaria", role="ABUELITA")
+
+    def _alta(self, **kw):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Participant.objects.create(**{"full_name": "Ana", "plantel": "Primaria", "role": "ABUELITA", **kw})
+
+    def _baja(self, p):
+        with self.captureOnCommitCallbacks(execute=True):
+            p.delete()
+
+    async def _conectar(self):
+        r = await self.async_client.get(reverse("participants_stats_stream"))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "text/event-stream; charset=utf-8")
+        flujo = aiter(r.streaming_content)
+        self.assertEqual(await anext(flujo), b"retry: 3000\n\n")
+        return flujo
+
+    async def _desconectar(self, flujo):
+        # Como el servidor ASGI cuando el cliente cierra: cancela la lectura en curso
+        tarea = asyncio.ensure_future(anext(flujo))
+        await asyncio.sleep(0.01)
+        tarea.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await tarea
+
+    async def test_inicio_y_deltas_agrupados(self):
+        flujo = await self._conectar()
+        nombre, datos = _evento_sse(await anext(flujo))
+        self.assertEqual(nombre, "estadisticas")
+        self.assertEqual(datos["total"], 1)
+        self.assertIn("maraton_sse_clientes 1", metricas.exponer())
+
+        # Tres altas antes de que el tablero lea: un solo evento
+        await sync_to_async(self._alta)()
+        ana = await sync_to_async(self._alta)(full_name="Ana 2")
+        await sync_to_async(self._alta)(full_name="Beto", plantel="Secundaria", role="ABUELITO")
+        nombre, datos = _evento_sse(await anext(flujo))
+        self.assertEqual(nombre, "cambios")
+        self.assertEqual(datos["totales"], [
+            {"plantel": "Primaria", "role": "ABUELITA", "delta": 2},
+            {"plantel": "Secundaria", "role": "ABUELITO", "delta": 1},
+        ])
+        self.assertEqual([n["clave"] for n in datos["nuevos"]], ["Primaria0002", "Primaria0003", "Secundaria0001"])
+        # Misma forma que las filas del listado
+        self.assertEqual(datos["nuevos"][1], json.loads(json.dumps(ParticipantSerializer(ana).data)))
+
+        await sync_to_async(self._baja)(ana)
+        nombre, datos = _evento_sse(await anext(flujo))
+        self.assertEqual(datos, {"totales": [{"plantel": "Primaria", "role": "ABUELITA", "delta": -1}],
+                                 "nuevos": [], "omitidos": 0})
+
+        await self._desconectar(flujo)
+        self.assertFalse(difusion.hay_suscriptores())
+        self.assertIn("maraton_sse_clientes 0", metricas.exponer())
+
+    @override_settings(MARATON_SSE_LATIDO_S=0.05, MARATON_SSE_RESYNC_S=3600)
+    async def test_latido_y_resincronizacion(self):
+        # El ciclo lo decide la prueba, no el reloj (un resync a media prueba tapaba el latido)
+        ciclo = [0]
+        with mock.patch("registro.difusion._ciclo", lambda: ciclo[0]):
+            flujo = await self._conectar()
+            await anext(flujo)
+            self.assertEqual(await anext(flujo), b": latido\n\n")
+            await sync_to_async(Participant.objects.create)(full_name="Sin señal", plantel="Secundaria", role="TUTOR")
+            ciclo[0] = 1
+            bloque = await anext(flujo)
+        nombre, datos = _evento_sse(bloque)
+        self.assertEqual(nombre, "estadisticas")
+        self.assertEqual(datos["total"], 2)
+        await self._desconectar(flujo)
+
+    async def test_inicial_no_cuenta_dos_veces(self):
+        # Un alta que se confirma mientras se lee la instantánea inicial ya viene en ella
+        from .stats import leer_estadisticas
+
+        def leer_con_alta():
+            datos = leer_estadisticas()
+            difusion.publicar([(("Primaria", "ABUELITA"), 1)])
+            return datos
+
+        with mock.patch("registro.stats.leer_estadisticas", leer_con_alta), \
+             override_settings(MARATON_SSE_LATIDO_S=0.05, MARATON_SSE_RESYNC_S=3600):
+            flujo = await self._conectar()
+            nombre, _ = _evento_sse(await anext(flujo))
+            self.assertEqual(nombre, "estadisticas")
+            self.assertEqual(await anext(flujo), b": latido\n\n")
+        await self._desconectar(flujo)
+
+    def test_limite_de_clientes_atomico(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        a, b = difusion.Suscriptor(loop), difusion.Suscriptor(loop)
+        with override_settings(MARATON_SSE_MAX_CLIENTES=1):
+            self.assertTrue(difusion._alta(a))
+            self.addCleanup(difusion._baja, a)
+            self.assertFalse(difusion._alta(b))
+        self.assertEqual(len(difusion._suscriptores), 1)
+
+    @override_settings(MARATON_SSE_LATIDO_S=0.05, MARATON_SSE_RESYNC_S=1)
+    async def test_resincronizacion_con_el_reloj(self):
+        flujo = await self._conectar()
+        await anext(flujo)
+        await sync_to_async(Participant.objects.create)(full_name="Sin señal", plantel="Secundaria", role="TUTOR")
+        while (bloque := await anext(flujo)) == b": latido\n\n":
+            pass
+        nombre, datos = _evento_sse(bloque)
+        self.assertEqual(nombre, "estadisticas")
+        self.assertEqual(datos["total"], 2)
+        await self._desconectar(flujo)
+
+    def test_cliente_lento_y_alta_masiva(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        lento = difusion.Suscriptor(loop)
+        for i in range(difusion.MAX_NUEVOS + 5):
+            lento.agregar([(("Primaria", "TUTOR"), 1)], {"id": i})
+        cambios = lento.tomar()
+        self.assertEqual(cambios["totales"], [{"plantel": "Primaria", "role": "TUTOR", "delta": 105}])
+        self.assertEqual(len(cambios["nuevos"]), difusion.MAX_NUEVOS)
+        self.assertEqual(cambios["nuevos"][-1], {"id": 104})
+        self.assertEqual(cambios["omitidos"], 5)
+        self.assertIsNone(lento.tomar())
+
+        difusion._alta(lento)
+        self.addCleanup(difusion._baja, lento)
+        with self.captureOnCommitCallbacks(execute=True):
+            semilla.sembrar(6, seed=3)
+        self.assertEqual(sum(t["delta"] for t in lento.tomar()["totales"]), 6)
+
+    def test_sin_tableros_no_cuesta_nada(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Participant.objects.create(full_name="Nadie mira", plantel="Primaria", role="TUTOR")
+        self.assertEqual(callbacks, [])
+
+        with mock.patch("registro.stats.leer_estadisticas", return_value={"total": 0}) as leer:
+            difusion.instantanea(7)
+            difusion.instantanea(7)
+            difusion.instantanea(8)
+        self.assertEqual(leer.call_count, 2)
+
+    def test_solo_asgi_y_limite_de_clientes(self):
+        self.assertEqual(self.client.get(reverse("participants_stats_stream")).status_code, 501)
+        with override_settings(MARATON_SSE_MAX_CLIENTES=0):
+            r = async_to_sync(self.async_client.get)(reverse("participants_stats_stream"))
+        self.assertEqual(r.status_code, 503)
+        self.assertEqual(r["Retry-After"], "30")
@@ -1,8 +1,17 @@
+from django.conf import settings
 from django.urls import path
 from .views import RegisterParticipantView, ParticipantListView, ExportParticipantsCSV, ReprintPdfView, ParticipantsStats
+from .views import BadgeJobStatusView, BadgeJobPdfView, BatchBadgesView
+from .views import ImportParticipantsView
+from .views import CheckInLookupView, CheckInView, CheckInSyncView
+from .views import RegisterParticipantAsyncView, ReprintPdfAsyncView, EstadisticasEnVivoView
+
+# Bajo ASGI (MARATON_VISTAS_ASYNC=1) las rutas de siempre usan las vistas async
+RegisterView = RegisterParticipantAsyncView if settings.MARATON_VISTAS_ASYNC else RegisterParticipantView
+ReprintView = ReprintPdfAsyncView if settings.MARATON_VISTAS_ASYNC else ReprintPdfView
 
 urlpatterns = [
-    path("register/", RegisterParticipantView.as_view(), name="register"),
+    path("register/", RegisterView.as_view(), name="register"),
 
     # LISTA
     path("participants/", ParticipantListView.as_view(), name="participants_list"),
@@ -11,10 +20,31 @@ urlpatterns = [
     path("participants/export_csv/", ExportParticipantsCSV.as_view(), name="export_csv"),
 
     # REIMPRIMIR
-    path("participants/reprint/", ReprintPdfView.as_view(), name="reprint_pdf"),
+    path("participants/reprint/", ReprintView.as_view(), name="reprint_pdf"),
+
+    # IMPORTACIÓN MASIVA (CSV/JSON)
+    path("participants/import/", ImportParticipantsView.as_view(), name="import_participants"),
+
+    # LOTE DE GAFETES (un PDF con filtros)
+    path("participants/badges/", BatchBadgesView.as_view(), name="batch_badges"),
+
+    # CHECK-IN DEL EVENTO
+    path("checkin/", CheckInView.as_view(), name="checkin"),
+    path("checkin/lookup/", CheckInLookupView.as_view(), name="checkin_lookup"),
+    path("checkin/sync/", CheckInSyncView.as_view(), name="checkin_sync"),
 
     # ESTADÍSTICAS (si la usas)
     path("participants/stats/", ParticipantsStats.as_view(), name="participants_stats"),
+    # ... y en vivo (SSE, servidor ASGI)
+    path("participants/stats/stream/", EstadisticasEnVivoView.as_view(), name="participants_stats_stream"),
+
+    # GAFETES EN SEGUNDO PLANO (MARATON_PDF_ASYNC)
+    path("participants/jobs/<int:pk>/", BadgeJobStatusView.as_view(), name="badge_job"),
+    path("participants/jobs/<int:pk>/pdf/", BadgeJobPdfView.as_view(), name="badge_job_pdf"),
+
+    # VERSIONES ASYNC (para comparar con las síncronas en el mismo servidor)
+    path("async/register/", RegisterParticipantAsyncView.as_view(), name="register_async"),
+    path("async/participants/reprint/", ReprintPdfAsyncView.as_view(), name="reprint_pdf_async"),
 ]
 
 
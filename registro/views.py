@@ -1,24 +1,48 @@
 import csv
+import hashlib
+import io
+import json
 import re
 import os
 import logging, traceback
+import tempfile
+import zlib
 
-from django.http import FileResponse, HttpResponse, Http404
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Count
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.db.models import Sum
 from django.conf import settings
-from django.db import transaction
+from django.db import IntegrityError, transaction
 # arriba
 from django.utils import timezone
 
 
 from rest_framework.views import APIView
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework import status
 
-from .models import Participant
-from .serializers import ParticipantSerializer
-from .pdf_generator import generar_credencial_pdf
+from .models import Participant, BadgeJob, ParticipantStat, RegistrationKey, clave_duplicado
+from .serializers import ParticipantSerializer, campos_lectura, consulta_lectura, representar_filas
+from .renderers import ORJSONRenderer
+from .folios import asignar_folio, participantes_por_folio
+from .jobs import aen_segundo_plano, en_segundo_plano, encolar_gafete
+from . import pdf_cache, pdf_storage
+from .filters import FiltroInvalido, filtrar_participantes
+from .pdf_lote import generar_lote_pdf
+from .pagination import ParticipantCursorPagination
+from .stats import leer_estadisticas
+from .importacion import ArchivoInvalido, importar, leer_filas
+from . import checkin, difusion, metricas
 
 logger = logging.getLogger(__name__)
 
@@ -26,63 +50,139 @@ logger = logging.getLogger(__name__)
 # Generación de folio
 # =======================
 def generar_clave(plantel: str) -> str:
-    prefix = (plantel or "").strip().title()  # Primaria|Secundaria|Preparatoria
-    existentes = (Participant.objects
-                  .filter(plantel=plantel)
-                  .exclude(clave__isnull=True)
-                  .exclude(clave__exact="")
-                  .values_list("clave", flat=True))
-    max_n = 0
-    for clave in existentes:
-        import re
-        m = re.search(r'(\d+)$', clave or "")
-        if m:
-            n = int(m.group(1))
-            if n > max_n:
-                max_n = n
-    return f"{prefix}{max_n+1:04d}"
+    # Contador por plantel (O(1), sin escanear la tabla): ver registro/folios.py
+    return asignar_folio(plantel)
+
+def _job_payload(request, job):
+    return {
+        "id": job.participant_id,
+        "clave": job.participant.clave,
+        "job": job.pk,
+        "status": job.status,
+        "error": job.error or None,
+        "status_url": request.build_absolute_uri(reverse("badge_job", args=[job.pk])),
+        "pdf_url": request.build_absolute_uri(reverse("badge_job_pdf", args=[job.pk])),
+    }
+
+def _huella_solicitud(campos: dict) -> str:
+    base = "\x1f".join(f"{k}={campos[k]}" for k in sorted(campos))
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+def _reclamar_llave(llave: str, huella: str):
+    """
+    Devuelve (previa, nueva). Si otra solicitud con la misma llave está en
+    curso, el INSERT espera a que termine y después se lee la suya.
+    """
+    try:
+        with transaction.atomic():
+            return None, RegistrationKey.objects.create(key=llave, request_hash=huella)
+    except IntegrityError:
+        return RegistrationKey.objects.select_related("participant").get(key=llave), None
+
+
+class LlaveReusada(Exception):
+    """La Idempotency-Key ya se usó con otros datos."""
+
+
+def _campos_registro(data: dict) -> dict:
+    return {
+        "full_name": (data.get("full_name") or "").strip(),
+        "plantel": (data.get("plantel") or "").strip(),
+        "child_name": (data.get("child_name") or "").strip(),
+        "grado": (data.get("grado") or "").strip(),
+        "role": (data.get("role") or "").strip().upper(),
+    }
+
+
+def _llave_idempotencia(request) -> str:
+    return (request.headers.get("Idempotency-Key") or "").strip()[:100]
+
+
+def _posibles_duplicados(campos: dict):
+    """Folios con el mismo adulto + alumno + plantel (consultar antes del alta)."""
+    return (Participant.objects
+            .filter(nombre_clave=clave_duplicado(campos["full_name"], campos["child_name"], campos["plantel"]))
+            .values_list("clave", flat=True)[:5])
+
+
+def _alta_participante(campos: dict, llave: str):
+    """
+    Crea el participante con su folio; llamar dentro de una transacción.
+    Devuelve (participant, nuevo): con una Idempotency-Key repetida y los
+    mismos datos es el de la primera vez (nuevo=False).
+    """
+    nueva_llave = None
+    if llave:
+        huella = _huella_solicitud(campos)
+        previa, nueva_llave = _reclamar_llave(llave, huella)
+        if previa is not None:
+            if previa.request_hash != huella or previa.participant is None:
+                raise LlaveReusada
+            return previa.participant, False
+
+    clave_generada = generar_clave(campos["plantel"])  # ← SIEMPRE
+    participant = Participant.objects.create(**campos, clave=clave_generada)
+    if nueva_llave is not None:
+        nueva_llave.participant = participant
+        nueva_llave.save(update_fields=["participant"])
+    return participant, True
+
+
+def _job_gafete(participant, nuevo: bool):
+    """BadgeJob del participante; uno nuevo se encola al hacer commit."""
+    job = None if nuevo else participant.badge_jobs.order_by("-id").first()
+    if job is None:
+        job = BadgeJob.objects.create(participant=participant)
+        transaction.on_commit(lambda: encolar_gafete(job.pk))
+    return job
+
+
+def _marcar_registro(resp, participant, nuevo: bool, duplicados: list):
+    if not nuevo:
+        resp["Idempotent-Replay"] = "true"
+    elif duplicados:
+        logger.info("REGISTER_DUPLICATE? %s ~ %s", participant.clave, duplicados)
+        resp["X-Posible-Duplicado"] = ",".join(d for d in duplicados if d)
+    return resp
+
 
 class RegisterParticipantView(APIView):
-    @transaction.atomic
+    """
+    POST /api/register/
+    Header opcional Idempotency-Key: un reintento con la misma llave y los
+    mismos datos devuelve el mismo folio y PDF (sin nuevo folio ni render).
+
+    Solo el alta va en la transacción: el gafete se dibuja después del
+    commit para no tener tomado el contador de folios (en SQLite, toda la
+    base) mientras dura el render. Si el render falla la respuesta es 500
+    pero el folio queda; un reintento con la misma llave lo recupera.
+    """
     def post(self, request):
         try:
             s = ParticipantSerializer(data=request.data)
             if not s.is_valid():
                 return Response(s.errors, status=status.HTTP_400_BAD_REQUEST)
-            data = s.validated_data
-
-            plantel = (data.get("plantel") or "").strip()
-            clave_generada = generar_clave(plantel)  # ← SIEMPRE
-
-            participant = Participant.objects.create(
-                full_name=(data.get("full_name") or "").strip(),
-                plantel=plantel,
-                child_name=(data.get("child_name") or "").strip(),
-                grado=(data.get("grado") or "").strip(),
-                role=(data.get("role") or "").strip().upper(),
-                clave=clave_generada,
-            )
+            campos = _campos_registro(s.validated_data)
+            llave = _llave_idempotencia(request)
 
-            pdf_out = generar_credencial_pdf(participant)
-
-            # --- Devolver PDF (acepta bytes o ruta en disco) ---
-            if isinstance(pdf_out, (bytes, bytearray)):
-                resp = HttpResponse(bytes(pdf_out), content_type="application/pdf")
-                resp["Content-Disposition"] = (
-                    f'attachment; filename="{participant.clave or "credencial"}.pdf"'
-                )
-                return resp
-
-            if isinstance(pdf_out, str) and os.path.exists(pdf_out):
-                return FileResponse(
-                    open(pdf_out, "rb"),
-                    as_attachment=True,
-                    filename=f'{participant.clave or "credencial"}.pdf',
-                    content_type="application/pdf",
+            # --- Posibles duplicados (mismo adulto + alumno + plantel) ---
+            duplicados = list(_posibles_duplicados(campos))
+            try:
+                if settings.MARATON_PDF_ASYNC:
+                    # El PDF se genera fuera de la transacción y del request
+                    participant, nuevo, payload = _alta_con_job(request, campos, llave)
+                    resp = Response(payload, status=status.HTTP_202_ACCEPTED)
+                else:
+                    with transaction.atomic():
+                        participant, nuevo = _alta_participante(campos, llave)
+                    resp = self._responder(participant, nuevo)
+            except LlaveReusada:
+                return Response(
+                    {"error": "Idempotency-Key ya usada con otros datos"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 )
-
-            # Si llegó aquí, no hubo PDF válido
-            return Response({"error": "No se pudo generar el PDF"}, status=500)
+            return _marcar_registro(resp, participant, nuevo, duplicados)
 
         except Exception as e:
             logger.error("REGISTER_ERROR: %s", e)
@@ -91,55 +191,161 @@ class RegisterParticipantView(APIView):
                 {"error": "Server error", "detail": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
-      
+
+    def _responder(self, participant, nuevo: bool):
+        filename = f'{participant.clave or "credencial"}.pdf'
+        if nuevo and settings.MARATON_PDF_EN_MEMORIA:
+            # Folio recién creado: no puede estar en caché. Se dibuja en
+            # memoria, se responde con esos bytes y se sube a la caché en
+            # segundo plano (un reintento o reimpresión ya no redibuja)
+            data = pdf_cache.generar(participant)
+            if settings.MARATON_PDF_PERSISTIR:
+                nombre = pdf_cache.nombre_pdf(participant, pdf_cache.huella(participant))
+                en_segundo_plano(pdf_cache.guardar, nombre, data)
+            return _pdf_en_memoria(data, filename)
+
+        # Se genera directo en la caché de reimpresión: un reintento o una
+        # reimpresión posterior ya no vuelve a dibujar
+        nombre, _, _ = pdf_cache.obtener_pdf(participant)
+        return pdf_storage.respuesta_pdf(nombre, filename)
+
+
+def _pdf_en_memoria(data: bytes, filename: str) -> HttpResponse:
+    resp = HttpResponse(data, content_type="application/pdf")
+    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
+
 
 # =======================
 # 2) Listado de participantes (panel admin)
 # =======================
 
 class ParticipantListView(APIView):
+    """
+    GET /api/participants/?cursor=...&page_size=100&plantel=...&role=...&q=...&fields=id,clave
+    Paginado por cursor; responde 304 si la tabla no cambió desde el ETag del cliente.
+    Lee dicts con .values() y los escribe con orjson (serializers.py, renderers.py):
+    mismos bytes que ParticipantSerializer + JSONRenderer.
+    """
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer] if settings.DEBUG else [ORJSONRenderer]
+
     def get(self, request):
-        qs = Participant.objects.all().order_by("-created_at", "-id")
-        serializer = ParticipantSerializer(qs, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            qs = filtrar_participantes(Participant.objects.all(), request.query_params)
+        except FiltroInvalido as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # ETag barato: contadores + índice de updated_at + la query string
+        etag = quote_etag(_version_participantes(request))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        fields = [f.strip() for f in (request.query_params.get("fields") or "").split(",") if f.strip()]
+        campos = campos_lectura(fields)
+        paginator = ParticipantCursorPagination()
+        page = paginator.paginate_queryset(consulta_lectura(qs, campos), request, view=self)
+        resp = paginator.get_paginated_response(representar_filas(page, campos))
+        resp["ETag"] = etag
+        resp["Cache-Control"] = "no-cache"
+        return resp
+
+
+def _version_participantes(request) -> str:
+    """
+    Versión del listado sin recorrer la tabla: el total de los contadores
+    (stats.py, cambia con altas y bajas) y el updated_at más reciente, que
+    sale del índice part_updated_idx (cambia con cada alta o edición).
+    """
+    total = ParticipantStat.objects.aggregate(n=Sum("total"))["n"]
+    cambio = Participant.objects.order_by("-updated_at").values_list("updated_at", flat=True).first()
+    base = "|".join([
+        str(total or 0),
+        cambio.isoformat() if cambio else "",
+        request.GET.urlencode(),
+    ])
+    return hashlib.md5(base.encode("utf-8")).hexdigest()
 
 # =======================
 # 3) Exportar CSV
 # =======================
 
-class ExportParticipantsCSV(APIView):
+CSV_ENCABEZADO = [
+    "ID",
+    "Folio",
+    "Nombre participante",
+    "Plantel",
+    "Nombre alumno",
+    "Grado",
+    "Rol",
+    "Fecha registro",
+]
+CSV_CAMPOS = ("id", "clave", "full_name", "plantel", "child_name", "grado", "role", "created_at")
+CSV_CHUNK = 2000
+
+
+def _filas_csv(qs):
     """
-    GET /api/participants/export_csv/
+    Genera el CSV en bloques de texto. Lee tuplas con values_list + iterator
+    (cursor del lado del servidor en Postgres), sin instanciar modelos.
     """
-    def get(self, request, *args, **kwargs):
-        qs = Participant.objects.all().order_by("plantel", "role", "full_name")
-        response = HttpResponse(content_type="text/csv; charset=utf-8")
-        response["Content-Disposition"] = 'attachment; filename="participantes_maraton.csv"'
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CSV_ENCABEZADO)
 
-        writer = csv.writer(response)
+    filas = qs.values_list(*CSV_CAMPOS).iterator(chunk_size=CSV_CHUNK)
+    for n, (pk, clave, nombre, plantel, alumno, grado, role, creado) in enumerate(filas, 1):
         writer.writerow([
-            "ID",
-            "Folio",
-            "Nombre participante",
-            "Plantel",
-            "Nombre alumno",
-            "Grado",
-            "Rol",
-            "Fecha registro",
+            pk,
+            clave or "",
+            nombre or "",
+            plantel or "",
+            alumno or "",
+            grado or "",
+            role or "",
+            # str(datetime) = "AAAA-MM-DD HH:MM:SS..." → mismo formato que strftime("%Y-%m-%d %H:%M")
+            str(creado)[:16] if creado else "",
         ])
+        if n % CSV_CHUNK == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def _gzip_stream(bloques):
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 → formato gzip
+    for bloque in bloques:
+        datos = z.compress(bloque.encode("utf-8"))
+        if datos:
+            yield datos
+    yield z.flush()
 
-        for p in qs:
-            writer.writerow([
-                p.id,
-                p.clave or "",
-                p.full_name or "",   # 🔄 corrige el orden con el encabezado
-                p.plantel or "",
-                p.child_name or "",
-                p.grado or "",
-                p.role or "",
-                p.created_at.strftime("%Y-%m-%d %H:%M") if getattr(p, "created_at", None) else "",
-            ])
 
+class ExportParticipantsCSV(APIView):
+    """
+    GET /api/participants/export_csv/?plantel=...&role=...&q=...&gzip=1
+    Se transmite por bloques: la memoria no crece con el número de participantes.
+    """
+    def get(self, request, *args, **kwargs):
+        try:
+            qs = filtrar_participantes(Participant.objects.all(), request.query_params)
+        except FiltroInvalido as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # El CSV se lee después de que la vista regresa, siempre de la
+        # primaria (replica.SOLO_PRIMARIA_RUTAS)
+        qs = qs.order_by("plantel", "role", "full_name")
+
+        if request.query_params.get("gzip") in ("1", "true"):
+            response = StreamingHttpResponse(_gzip_stream(_filas_csv(qs)), content_type="application/gzip")
+            response["Content-Disposition"] = 'attachment; filename="participantes_maraton.csv.gz"'
+            return response
+
+        response = StreamingHttpResponse(
+            (bloque.encode("utf-8") for bloque in _filas_csv(qs)),
+            content_type="text/csv; charset=utf-8",
+        )
+        response["Content-Disposition"] = 'attachment; filename="participantes_maraton.csv"'
         return response
 
 # =======================
@@ -147,12 +353,12 @@ class ExportParticipantsCSV(APIView):
 # =======================
 
 class ParticipantsStats(APIView):
+    """
+    GET /api/participants/stats/
+    Lee los contadores (stats.py), no escanea la tabla de participantes.
+    """
     def get(self, request):
-        total = Participant.objects.count()
-        por_plantel = list(Participant.objects.values("plantel").annotate(total=Count("id")).order_by("plantel"))
-        por_role    = list(Participant.objects.values("role").annotate(total=Count("id")).order_by("role"))
-        data = {"total": total, "por_plantel": por_plantel, "por_role": por_role}
-        return Response(data, status=status.HTTP_200_OK)
+        return Response(leer_estadisticas(), status=status.HTTP_200_OK)
 
 # =======================
 # 5) Reimpresión de gafete
@@ -167,23 +373,344 @@ class ReprintPdfView(APIView):
         if not q:
             return Response({"detail": "Falta parámetro q"}, status=400)
 
-        qs = Participant.objects.all()
-        participant = None
         try:
-            participant = qs.get(clave__iexact=q)
+            participant = participantes_por_folio(q).get()
         except Participant.DoesNotExist:
             try:
-                participant = qs.get(pk=int(q))
+                participant = Participant.objects.get(pk=int(q))
             except (ValueError, Participant.DoesNotExist):
                 raise Http404("Participante no encontrado")
 
-        pdf_out = generar_credencial_pdf(participant)
-        if isinstance(pdf_out, (bytes, bytearray)):
-            resp = HttpResponse(bytes(pdf_out), content_type="application/pdf")
-        elif isinstance(pdf_out, str) and os.path.exists(pdf_out):
-            resp = FileResponse(open(pdf_out, "rb"), content_type="application/pdf")
-        else:
-            return Response({"error": "PDF inválido"}, status=500)
+        # Caché por contenido: misma huella → mismo PDF (ETag)
+        etag = quote_etag(pdf_cache.huella(participant))
+        resp = get_conditional_response(request, etag=etag)
+        if resp is None:
+            nombre, _, hit = pdf_cache.obtener_pdf(participant)
+            resp = _entregar_reimpresion(request, participant, nombre, etag, hit)
+        return _cabeceras_reimpresion(resp, participant, etag)
+
 
+def _entregar_reimpresion(request, participant, nombre: str, etag: str, hit: bool):
+    """304 por fecha o el PDF ya en caché (lee metadatos del storage)."""
+    last_modified = int(pdf_storage.storage().get_modified_time(nombre).timestamp())
+    resp = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if resp is None:
+        resp = pdf_storage.respuesta_pdf(nombre, f'{participant.clave or "credencial"}.pdf')
+    resp["Last-Modified"] = http_date(last_modified)
+    resp["X-Cache"] = "HIT" if hit else "MISS"
+    return resp
+
+
+def _cabeceras_reimpresion(resp, participant, etag: str):
+    resp["ETag"] = etag
+    resp["Cache-Control"] = "no-cache"  # siempre revalidar con ETag
+
+    if resp.status_code != 302:
         resp["Content-Disposition"] = f'attachment; filename="{participant.clave or "credencial"}.pdf"'
+    return resp
+
+# =======================
+# 6) Gafetes en segundo plano (MARATON_PDF_ASYNC)
+# =======================
+
+class BadgeJobStatusView(APIView):
+    """
+    GET /api/participants/jobs/<id>/  → estado del gafete
+    """
+    def get(self, request, pk):
+        job = get_object_or_404(BadgeJob.objects.select_related("participant"), pk=pk)
+        return Response(_job_payload(request, job), status=status.HTTP_200_OK)
+
+
+class BadgeJobPdfView(APIView):
+    """
+    GET /api/participants/jobs/<id>/pdf/  → PDF cuando el estado es LISTO
+    """
+    def get(self, request, pk):
+        job = get_object_or_404(BadgeJob.objects.select_related("participant"), pk=pk)
+        if job.status != BadgeJob.LISTO:
+            code = 500 if job.status == BadgeJob.ERROR else status.HTTP_409_CONFLICT
+            return Response(_job_payload(request, job), status=code)
+
+        # El job dejó el PDF en la caché; si ya se purgó, se vuelve a generar
+        nombre = job.pdf_path
+        if not pdf_storage.existe(nombre):
+            nombre, _, _ = pdf_cache.obtener_pdf(job.participant)
+        return pdf_storage.respuesta_pdf(nombre, f'{job.participant.clave or "credencial"}.pdf')
+
+# =======================
+# 7) Lote de gafetes (un solo PDF)
+# =======================
+
+class BatchBadgesView(APIView):
+    """
+    GET /api/participants/badges/?plantel=Primaria&role=...&desde=AAAA-MM-DD&hasta=...&folios=A,B
+    """
+    def get(self, request, *args, **kwargs):
+        try:
+            qs = filtrar_participantes(Participant.objects.all(), request.query_params)
+        except FiltroInvalido as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        qs = qs.order_by("plantel", "clave", "id")
+        if not qs.exists():
+            return Response({"detail": "Sin participantes para esos filtros"}, status=404)
+
+        # Se escribe a un temporal y se envía por bloques; se borra al cerrar
+        tmp = tempfile.TemporaryFile()
+        generar_lote_pdf(qs, tmp)
+        tmp.seek(0)
+        return FileResponse(
+            tmp,
+            as_attachment=True,
+            filename="gafetes_maraton.pdf",
+            content_type="application/pdf",
+        )
+
+# =======================
+# 8) Importación masiva
+# =======================
+
+class ImportParticipantsView(APIView):
+    """
+    POST /api/participants/import/?pdfs=1
+    Cuerpo JSON (lista de participantes) o multipart con `archivo` (.csv/.json).
+    Las filas inválidas se devuelven en "errores" sin detener el resto.
+    """
+    def post(self, request, *args, **kwargs):
+        try:
+            archivo = request.FILES.get("archivo")
+            if archivo is not None:
+                formato = "json" if archivo.name.lower().endswith(".json") else "csv"
+                filas = leer_filas(archivo.read(), formato)
+            elif isinstance(request.data, list):
+                filas = leer_filas(json.dumps(request.data), "json")
+            else:
+                filas = leer_filas(json.dumps(request.data.get("rows") or []), "json")
+        except ArchivoInvalido as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not filas:
+            return Response({"detail": "Sin filas para importar"}, status=status.HTTP_400_BAD_REQUEST)
+
+        generar_pdfs = request.query_params.get("pdfs") in ("1", "true")
+        resultado = importar(filas, generar_pdfs=generar_pdfs)
+        code = status.HTTP_201_CREATED if resultado["creados"] else status.HTTP_400_BAD_REQUEST
+        return Response(resultado, status=code)
+
+# =======================
+# 9) Check-in del evento
+# =======================
+
+def _fecha_llegada(valor):
+    if not valor:
+        return None
+    dt = parse_datetime(str(valor))
+    if dt is None:
+        raise ValueError(f"Fecha inválida: {valor}")
+    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+
+class CheckInLookupView(APIView):
+    """
+    GET /api/checkin/lookup/?folio=Primaria0007
+    """
+    def get(self, request):
+        resumen = checkin.buscar(request.query_params.get("folio"))
+        if resumen is None:
+            return Response({"detail": "Folio no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(resumen, status=status.HTTP_200_OK)
+
+
+class CheckInView(APIView):
+    """
+    POST /api/checkin/  {"folio": "Primaria0007", "estacion": "meta", "llegada": "ISO opcional"}
+    """
+    def post(self, request):
+        estacion = (request.data.get("estacion") or "").strip()[:50] or "general"
+        try:
+            llegada = _fecha_llegada(request.data.get("llegada"))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        r = checkin.registrar(request.data.get("folio"), estacion, llegada)
+        if r is None:
+            return Response({"detail": "Folio no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+        resumen, registro, nuevo = r
+        return Response(
+            {"participant": resumen, "estacion": estacion, "llegada": registro.llegada, "nuevo": nuevo},
+            status=status.HTTP_201_CREATED if nuevo else status.HTTP_200_OK,
+        )
+
+
+class CheckInSyncView(APIView):
+    """
+    POST /api/checkin/sync/  {"estacion": "meta", "scans": [{"folio": "...", "llegada": "ISO"}, ...]}
+    Para estaciones que guardaron escaneos sin conexión.
+    """
+    def post(self, request):
+        estacion = (request.data.get("estacion") or "").strip()[:50] or "general"
+        scans = request.data.get("scans")
+        if not isinstance(scans, list):
+            return Response({"detail": "scans debe ser una lista"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            escaneos = [{"folio": (e or {}).get("folio"), "llegada": _fecha_llegada((e or {}).get("llegada"))}
+                        for e in scans]
+        except (ValueError, AttributeError) as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        resultados = checkin.sincronizar(estacion, escaneos)
+        return Response(
+            {"estacion": estacion, "recibidos": len(resultados),
+             "registrados": sum(1 for r in resultados if r.get("nuevo")), "resultados": resultados},
+            status=status.HTTP_200_OK,
+        )
+
+
+# =======================
+# 10) Registro y reimpresión async (servidor ASGI)
+# =======================
+
+def _json(data, status_code: int = 200) -> JsonResponse:
+    # Mismo formato que el JSONRenderer de DRF (UTF-8, compacto)
+    return JsonResponse(data, status=status_code, safe=False,
+                        json_dumps_params={"ensure_ascii": False, "separators": (",", ":")})
+
+
+def _datos_request(request):
+    """request.data de DRF para JSON y formularios. ValueError si el JSON es inválido."""
+    if request.content_type == "application/json":
+        return json.loads(request.body or b"{}")
+    return request.POST.dict()
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class RegisterParticipantAsyncView(View):
+    """
+    POST /api/async/register/  (o /api/register/ con MARATON_VISTAS_ASYNC)
+    Misma entrada y respuestas que RegisterParticipantView. Las lecturas van
+    por el ORM async; el alta (Idempotency-Key + folio + INSERT) es una sola
+    transacción en un hilo (el ORM async no mantiene transacciones entre
+    awaits) y el gafete se dibuja en pdf_pool después del commit. Mientras
+    tanto el proceso sigue atendiendo otros requests.
+    """
+    async def post(self, request):
+        try:
+            try:
+                datos = _datos_request(request)
+            except ValueError as e:
+                return _json({"detail": f"JSON parse error - {e}"}, status.HTTP_400_BAD_REQUEST)
+            s = ParticipantSerializer(data=datos)
+            if not s.is_valid():
+                return _json(s.errors, status.HTTP_400_BAD_REQUEST)
+            campos = _campos_registro(s.validated_data)
+            llave = _llave_idempotencia(request)
+
+            duplicados = [c async for c in _posibles_duplicados(campos)]
+            try:
+                if settings.MARATON_PDF_ASYNC:
+                    participant, nuevo, payload = await sync_to_async(_alta_con_job)(request, campos, llave)
+                    resp = _json(payload, status.HTTP_202_ACCEPTED)
+                else:
+                    participant, nuevo = await sync_to_async(transaction.atomic(_alta_participante))(campos, llave)
+                    resp = await self._responder(participant, nuevo)
+            except LlaveReusada:
+                return _json({"error": "Idempotency-Key ya usada con otros datos"},
+                             status.HTTP_422_UNPROCESSABLE_ENTITY)
+            return _marcar_registro(resp, participant, nuevo, duplicados)
+
+        except Exception as e:
+            logger.error("REGISTER_ERROR: %s", e)
+            logger.error("TRACE:\n%s", traceback.format_exc())
+            return _json({"error": "Server error", "detail": str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def _responder(self, participant, nuevo: bool):
+        filename = f'{participant.clave or "credencial"}.pdf'
+        if nuevo and settings.MARATON_PDF_EN_MEMORIA:
+            data = await pdf_cache.agenerar(participant)
+            if settings.MARATON_PDF_PERSISTIR:
+                nombre = pdf_cache.nombre_pdf(participant, pdf_cache.huella(participant))
+                await aen_segundo_plano(pdf_cache.guardar, nombre, data)
+            return _pdf_en_memoria(data, filename)
+
+        nombre, _, _ = await pdf_cache.aobtener_pdf(participant)
+        return await sync_to_async(pdf_storage.respuesta_pdf, thread_sensitive=False)(nombre, filename)
+
+
+@transaction.atomic
+def _alta_con_job(request, campos: dict, llave: str):
+    participant, nuevo = _alta_participante(campos, llave)
+    return participant, nuevo, _job_payload(request, _job_gafete(participant, nuevo))
+
+
+class ReprintPdfAsyncView(View):
+    """
+    GET /api/async/participants/reprint/?q=...  (o la ruta normal con MARATON_VISTAS_ASYNC)
+    Como ReprintPdfView: búsqueda con el ORM async y, si no está en caché,
+    el gafete se dibuja en pdf_pool.
+    """
+    async def get(self, request):
+        q = request.GET.get("q")
+        if not q:
+            return _json({"detail": "Falta parámetro q"}, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            participant = await participantes_por_folio(q).aget()
+        except Participant.DoesNotExist:
+            try:
+                participant = await Participant.objects.aget(pk=int(q))
+            except (ValueError, Participant.DoesNotExist):
+                return _json({"detail": "Participante no encontrado"}, status.HTTP_404_NOT_FOUND)
+
+        etag = quote_etag(pdf_cache.huella(participant))
+        resp = get_conditional_response(request, etag=etag)
+        if resp is None:
+            nombre, _, hit = await pdf_cache.aobtener_pdf(participant)
+            resp = await sync_to_async(_entregar_reimpresion, thread_sensitive=False)(
+                request, participant, nombre, etag, hit)
+        return _cabeceras_reimpresion(resp, participant, etag)
+
+
+# =======================
+# 11) Estadísticas en vivo (SSE)
+# =======================
+
+class EstadisticasEnVivoView(View):
+    """
+    GET /api/participants/stats/stream/  (text/event-stream; EventSource en el navegador)
+
+    En lugar de consultar stats/ y participants/ cada tanto: al conectar
+    llega "estadisticas" (lo mismo que stats/), luego "cambios" con deltas
+    por plantel/rol y los participantes nuevos conforme se registran, y
+    "estadisticas" completo cada MARATON_SSE_RESYNC_S. Ver difusion.py.
+    Solo con servidor ASGI: bajo WSGI cada tablero ocuparía un worker.
+    """
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return _json({"detail": "Requiere el servidor ASGI; usa /api/participants/stats/"},
+                         status.HTTP_501_NOT_IMPLEMENTED)
+        suscriptor = difusion.suscribir()
+        if suscriptor is None:
+            resp = _json({"detail": "Demasiados tableros conectados"}, status.HTTP_503_SERVICE_UNAVAILABLE)
+            resp["Retry-After"] = "30"
+            return resp
+        resp = StreamingHttpResponse(difusion.eventos(suscriptor), content_type="text/event-stream; charset=utf-8")
+        resp["Cache-Control"] = "no-cache"
+        resp["X-Accel-Buffering"] = "no"  # que el proxy no junte los eventos
         return resp
+
+
+# =======================
+# Métricas (Prometheus)
+# =======================
+
+class MetricsView(APIView):
+    """
+    GET /metrics  → métricas en formato de texto de Prometheus.
+    Con MARATON_METRICAS_TOKEN se exige Authorization: Bearer <token>.
+    """
+    def get(self, request):
+        token = settings.MARATON_METRICAS_TOKEN
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            return HttpResponse(status=403)
+        return HttpResponse(metricas.exponer(), content_type="text/plain; version=0.0.4; charset=utf-8")